@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='journalaudit',
+            index=models.Index(fields=['date_heure', 'id'], name='audit_date_heure_idx'),
+        ),
+    ]
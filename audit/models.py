@@ -22,3 +22,6 @@ class JournalAudit(models.Model):
         verbose_name = "Journal d'Audit"
         verbose_name_plural = "Journaux d'Audit"
         ordering = ['-date_heure']
+        indexes = [
+            models.Index(fields=['date_heure', 'id'], name='audit_date_heure_idx'),
+        ]
@@ -1,8 +1,9 @@
 # payment/serializers.py
 from rest_framework import serializers
 from .models import JournalAudit
+from transit.sparse import SparseFieldsetMixin
 
-class JournalAuditSerializer(serializers.ModelSerializer):
+class JournalAuditSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = JournalAudit
         fields = '__all__'
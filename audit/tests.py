@@ -1,3 +1,40 @@
-from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from users.models import Utilisateur
+from .models import JournalAudit
+
+
+class JournalAuditPaginationTests(APITestCase):
+    """Les pages profondes du journal d'audit coûtent autant que la première."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = Utilisateur.objects.create_user(
+            email='admin@transit241.com', password='x', nom='Admin', prenoms='Test', is_staff=True
+        )
+        JournalAudit.objects.bulk_create([
+            JournalAudit(utilisateur=cls.admin, action_type='LOGIN_SUCCESS', ressource_affectee='Utilisateur',
+                         ressource_id=str(cls.admin.id), adresse_ip='192.168.1.1')
+            for _ in range(120)
+        ])
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.admin)
+
+    def test_pages_profondes_a_cout_constant(self):
+        url = reverse('audit-log-list') + '?page_size=20'
+        ids, requetes = [], []
+        while url:
+            with CaptureQueriesContext(connection) as contexte:
+                data = self.client.get(url).data
+            requetes.append([q['sql'] for q in contexte.captured_queries])
+            ids.extend(item['id'] for item in data['results'])
+            url = data['next']
+
+        self.assertEqual(sorted(ids, reverse=True), ids)
+        self.assertEqual(len(set(ids)), 120)
+        self.assertTrue(all(len(sql) == 1 for sql in requetes))
+        self.assertTrue(all('OFFSET' not in sql[0] for sql in requetes))
@@ -4,10 +4,12 @@ from .models import JournalAudit
 from .serializers import JournalAuditSerializer
 
 from rest_framework.permissions import IsAuthenticated
+from transit.sparse import SparseFieldsetViewMixin
 
 
-class JournalAuditViewSet(viewsets.ReadOnlyModelViewSet):
+class JournalAuditViewSet(SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     """Consultation des logs d'audit (Lecture Seule, Admin seul)."""
     queryset = JournalAudit.objects.all().order_by('-date_heure')
+    ordering = '-date_heure'
     serializer_class = JournalAuditSerializer
     permission_classes = [IsAuthenticated]
\ No newline at end of file
@@ -1,7 +1,12 @@
 # logistics/admin.py
 
-from django.contrib import admin
-from .models import Colis, SuiviStatut, RetraitColis
+from django.contrib import admin, messages
+from .models import Colis, SuiviStatut, RetraitColis, Voyage
+from django.db import transaction
+from django.db.models import Q
+from .search import rechercher_colis
+from .statuts import appliquer_statut_en_masse
+from .voyages import recompter_voyages
 
 # --- Inlines (Pour afficher les relations dans le parent) ---
 
@@ -29,16 +34,37 @@ class RetraitColisInline(admin.StackedInline):
 @admin.register(Colis)
 class ColisAdmin(admin.ModelAdmin):
     list_display = ('numero_bl', 'client', 'statut_actuel', 'poids_kg', 'date_arrivee')
-    list_filter = ('statut_actuel', 'date_arrivee', 'client__role')
+    list_filter = ('statut_actuel', 'date_arrivee', 'client__role', 'voyage')
     search_fields = ('numero_bl', 'description', 'client__email', 'client__nom')
     readonly_fields = ('date_arrivee',)
     inlines = [SuiviStatutInline, RetraitColisInline]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Index de recherche (trigrammes du B/L, plein texte) au lieu de LIKE '%...%' sur chaque champ ;
+        # l'e-mail du client n'est pas indexé : cherché sur la table des utilisateurs
+        if not search_term.strip():
+            return queryset, False
+        ids = [pk for pk, _ in rechercher_colis(search_term, limite=500)]
+        return queryset.filter(Q(pk__in=ids) | Q(client__email__icontains=search_term.strip())), False
     
     # Action pour mettre à jour le statut en masse
     @admin.action(description='Marquer comme Prêt au Retrait')
     def make_ready_for_pickup(self, request, queryset):
-        queryset.update(statut_actuel='PRET_RETRAIT')
-        self.message_user(request, f"{queryset.count()} colis marqués Prêt au Retrait.")
+        with transaction.atomic():
+            # Transition conditionnelle (les colis dont le statut l'interdit, ex: livrés, sont laissés)
+            # et suivi dans l'historique, rejoué par logistics.evenements
+            resultats = appliquer_statut_en_masse(
+                [str(pk) for pk in queryset.values_list('pk', flat=True)], 'PRET_RETRAIT', '', request.user,
+                notes="Marqué Prêt au Retrait depuis l'administration.",
+            )
+        marques = sum(1 for resultat in resultats if resultat['succes'])
+        message = f"{marques} colis marqués Prêt au Retrait."
+        refuses = len(resultats) - marques
+        if refuses:
+            message += f" {refuses} colis ignorés (transition de statut non autorisée)."
+            self.message_user(request, message, messages.WARNING)
+        else:
+            self.message_user(request, message)
 
     actions = [make_ready_for_pickup]
 
@@ -54,4 +80,20 @@ class SuiviStatutAdmin(admin.ModelAdmin):
 class RetraitColisAdmin(admin.ModelAdmin):
     list_display = ('colis', 'agent_validation', 'date_heure_retrait')
     search_fields = ('colis__numero_bl',)
-    readonly_fields = ('colis', 'date_heure_retrait', 'agent_validation', 'preuve_identite_url', 'signature_client')
\ No newline at end of file
+    readonly_fields = ('colis', 'date_heure_retrait', 'agent_validation', 'preuve_identite_url', 'signature_client')
+
+
+@admin.register(Voyage)
+class VoyageAdmin(admin.ModelAdmin):
+    list_display = ('numero_voyage', 'navire', 'date_arrivee_prevue', 'nombre_colis', 'poids_total_kg',
+                    'colis_dedouanes')
+    search_fields = ('numero_voyage', 'navire')
+    readonly_fields = ('date_creation', *Voyage.CHAMPS_STATUT.values(), 'poids_total_kg', 'colis_dedouanes')
+
+    @admin.action(description='Recalculer les compteurs')
+    def recalculer_compteurs(self, request, queryset):
+        # Contrôle ou réparation : recomptage complet des colis de chaque voyage
+        recompter_voyages(queryset.values_list('pk', flat=True))
+        self.message_user(request, f"Compteurs recalculés pour {queryset.count()} voyage(s).")
+
+    actions = [recalculer_compteurs]
@@ -0,0 +1,103 @@
+# logistics/async_views.py
+
+import uuid
+
+from django.utils.cache import get_conditional_response
+from rest_framework.request import Request
+
+from transit.asynchrone import Deleguer, lecture_asynchrone, reponse_json
+from transit.cache import alecture_cache
+from transit.conditional import ajouter_validateurs, calculer_validateurs
+from transit.fastpath import constructeur_pour
+from transit.fragments import aassembler, champs_version, prefixe_fragments
+from transit.renderers import ORJSONRenderer
+from .cache import DUREE_CACHE_SUIVI, acle_suivi
+from .models import Colis
+from .serializers import ColisSerializer
+from .views import ColisViewSet
+
+# Vues de lecture asynchrones (ASGI) des chemins les plus sollicités de
+# ColisViewSet : même JSON, mêmes validateurs et même cache que les vues DRF,
+# lus par l'ORM asynchrone et le chemin rapide (transit.fastpath). Une requête
+# en attente de la base ou du cache ne retient aucun thread du worker.
+# Routées par transit/urls_asgi.py ; sous WSGI, les vues DRF restent utilisées.
+
+
+def _constructeur(serializer):
+    constructeur = constructeur_pour(serializer) if ColisViewSet.fast_read else None
+    if constructeur is None:
+        raise Deleguer
+    return constructeur
+
+
+def _validateurs(request, lignes, avec_date=True):
+    etag_fields = ColisViewSet.etag_fields
+    marqueurs = [{'pk': ligne.pk, **{f: getattr(ligne, f) for f in etag_fields}} for ligne in lignes]
+    return calculer_validateurs(marqueurs, etag_fields, ORJSONRenderer.format, request.user.pk, avec_date)
+
+
+@lecture_asynchrone(parametres=('id',))
+async def track_colis(request):
+    """GET colis/track/?id= (voir ColisViewSet.track_colis)."""
+    try:
+        colis_id = uuid.UUID(request.GET.get('id', ''))
+    except ValueError:
+        raise Deleguer  # Id absent ou invalide : réponse d'erreur de la vue DRF
+    constructeur = _constructeur(ColisSerializer(fields=ColisViewSet.champs_suivi))
+
+    async def construire():
+        lignes = [ligne async for ligne in constructeur.requete(Colis.objects.filter(pk=colis_id))]
+        if not lignes:
+            raise Deleguer
+        return (await constructeur.aconstruire(lignes))[0]
+
+    # Génération lue avant la base (voir logistics.cache.cles_suivi)
+    cle = await acle_suivi(colis_id)
+    return reponse_json(await alecture_cache(cle, construire, DUREE_CACHE_SUIVI))
+
+
+@lecture_asynchrone()
+async def detail_colis(request, pk):
+    """GET colis/{id}/ : une seule requête pour les validateurs et le colis, 304 sans construction."""
+    constructeur = _constructeur(ColisSerializer())
+    requete = constructeur.requete(Colis.objects.filter(pk=pk), *ColisViewSet.etag_fields)
+    lignes = [ligne async for ligne in requete]
+    if not lignes:
+        raise Deleguer
+
+    etag, last_modified = _validateurs(request, lignes)
+    reponse = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if reponse is None:
+        reponse = reponse_json((await constructeur.aconstruire(lignes))[0])
+    return ajouter_validateurs(reponse, etag, last_modified)
+
+
+@lecture_asynchrone(parametres=('cursor', 'page_size'))
+async def liste_colis(request):
+    """GET colis/ : page keyset, validateurs de la page et fragments en cache, en une requête principale."""
+    serializer = ColisSerializer()
+    constructeur = _constructeur(serializer)
+    pagination = ColisViewSet.pagination_class()
+    if not hasattr(pagination, 'apaginate_queryset'):
+        raise Deleguer
+
+    chemins = champs_version(serializer) or ()
+    extra = [ColisViewSet.ordering.lstrip('-'), *ColisViewSet.etag_fields, *chemins]
+    requete = constructeur.requete(Colis.objects.all(), *extra)
+    page = await pagination.apaginate_queryset(requete, Request(request), ColisViewSet)
+    if page is None:
+        raise Deleguer
+
+    etag, last_modified = _validateurs(request, page, avec_date=False)
+    reponse = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if reponse is None:
+        if chemins:
+            donnees = await aassembler(
+                prefixe_fragments(serializer), page,
+                lambda ligne: (ligne.pk, [getattr(ligne, chemin) for chemin in chemins]),
+                constructeur.aconstruire,
+            )
+        else:
+            donnees = await constructeur.aconstruire(page)
+        reponse = reponse_json(pagination.get_paginated_response(donnees).data)
+    return ajouter_validateurs(reponse, etag, last_modified)
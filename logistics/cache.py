@@ -0,0 +1,65 @@
+# logistics/cache.py
+
+import uuid
+
+from django.db import transaction
+
+from transit.cache import cache
+
+# Durée de vie (s) du payload de suivi d'un colis (colis/track/)
+DUREE_CACHE_SUIVI = 300
+# Durée de vie (s) de la génération d'un colis ; une génération expirée est remplacée
+# par une nouvelle, jamais par une ancienne : au pire un raté de cache
+DUREE_GENERATION = 24 * 3600
+
+
+def cle_generation(colis_id):
+    return f"colis:suivi:generation:{colis_id}"
+
+
+def cle_suivi(colis_id, generation):
+    """Clé de cache du payload de suivi d'un colis, à une génération donnée."""
+    return f"colis:suivi:{colis_id}:{generation}"
+
+
+def cles_suivi(colis_ids):
+    """
+    {colis_id: clé du payload de suivi à la génération courante}, en une
+    lecture du cache. À lire AVANT la base : un payload construit pendant
+    qu'une écriture est validée est rangé sous l'ancienne génération, que
+    l'invalidation a déjà remplacée, et n'est donc jamais relu.
+    """
+    colis_ids = list(colis_ids)
+    generations = cache.get_many([cle_generation(colis_id) for colis_id in colis_ids])
+    cles = {}
+    for colis_id in colis_ids:
+        generation = generations.get(cle_generation(colis_id))
+        if generation is None:
+            generation = uuid.uuid4().hex
+            if not cache.add(cle_generation(colis_id), generation, DUREE_GENERATION):
+                generation = cache.get(cle_generation(colis_id)) or generation
+        cles[colis_id] = cle_suivi(colis_id, generation)
+    return cles
+
+
+async def acle_suivi(colis_id):
+    """Variante asynchrone de cles_suivi() pour un colis."""
+    generation = await cache.aget(cle_generation(colis_id))
+    if generation is None:
+        generation = uuid.uuid4().hex
+        if not await cache.aadd(cle_generation(colis_id), generation, DUREE_GENERATION):
+            generation = await cache.aget(cle_generation(colis_id)) or generation
+    return cle_suivi(colis_id, generation)
+
+
+def invalider_suivi(*colis_ids):
+    """
+    Invalide le payload de suivi des colis donnés en changeant leur
+    génération, après validation de la transaction en cours (une lecture
+    concurrente ne peut pas remettre en cache un état non commité, ni une
+    reconstruction commencée avant l'écriture écraser l'invalidation).
+    """
+    if colis_ids:
+        transaction.on_commit(lambda: cache.set_many(
+            {cle_generation(colis_id): uuid.uuid4().hex for colis_id in colis_ids}, DUREE_GENERATION
+        ))
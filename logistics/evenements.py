@@ -0,0 +1,193 @@
+# logistics/evenements.py
+
+from django.db import transaction
+
+from .cache import invalider_suivi
+from .models import Colis, InstantaneColis, SuiviStatut
+from .read_models import synchroniser_resumes
+from .statuts import LIEU_MAX, transition_autorisee
+from .voyages import reporter_statuts
+
+STATUT_INITIAL = Colis._meta.get_field('statut_actuel').default
+# Suivis rejoués depuis le dernier instantané au-delà desquels rejouer() en enregistre un nouveau
+INTERVALLE_INSTANTANE = 50
+TAILLE_LECTURE = 5000
+
+CHAMPS_SUIVI = ('colis_id', 'pk', 'statut', 'localisation', 'date_heure')
+
+
+def appliquer(statut_actuel, lieu_stockage, statut, localisation):
+    """
+    État (statut, lieu de stockage) d'un colis après un suivi, selon les
+    mêmes règles que les écritures en direct : le statut ne change que si
+    TRANSITIONS l'autorise, une localisation déplace le colis.
+    """
+    if transition_autorisee(statut_actuel, statut):
+        statut_actuel = statut
+    if localisation:
+        lieu_stockage = localisation[:LIEU_MAX]
+    return statut_actuel, lieu_stockage
+
+
+class _Rejeu:
+    """État d'un colis pendant le rejeu (reprise d'un instantané ou état initial)."""
+    __slots__ = ('statut', 'lieu_stockage', 'position', 'suivi_max', 'evenements', 'depuis_instantane')
+
+    def __init__(self, statut, lieu_stockage, position=None, suivi_max=0, evenements=0):
+        self.statut = statut
+        self.lieu_stockage = lieu_stockage
+        self.position = position  # (date_heure, id) du dernier suivi rejoué
+        self.suivi_max = suivi_max
+        self.evenements = evenements
+        self.depuis_instantane = 0
+
+    def rejouer(self, pk, statut, localisation, date_heure):
+        self.statut, self.lieu_stockage = appliquer(self.statut, self.lieu_stockage, statut, localisation)
+        self.position = (date_heure, pk)
+        self.suivi_max = max(self.suivi_max, pk)
+        self.evenements += 1
+        self.depuis_instantane += 1
+
+
+def rejouer(colis_ids, depuis_zero=False, corriger=True, intervalle=INTERVALLE_INSTANTANE):
+    """
+    Reconstruit statut_actuel et lieu_stockage des colis donnés à partir de
+    leur historique SuiviStatut (voir replier), corrige les colis dont l'état
+    diverge et enregistre les instantanés (voir enregistrer_rejeu).
+
+    Retourne {'colis', 'evenements', 'divergents', 'corriges'}.
+    """
+    resultat = replier(colis_ids, depuis_zero)
+    corriges = enregistrer_rejeu(resultat, intervalle) if corriger else 0
+    return {'colis': resultat['colis'], 'evenements': resultat['evenements'],
+            'divergents': len(resultat['divergents']), 'corriges': corriges}
+
+
+def replier(colis_ids, depuis_zero=False):
+    """
+    Rejoue l'historique des colis donnés, en lecture seule. Chaque colis
+    reprend de son instantané (seuls les suivis insérés depuis sont lus), sauf
+    `depuis_zero` ou si un suivi daté d'avant l'instantané a été inséré depuis
+    (envoi tardif) : son historique est alors rejoué en entier.
+
+    Retourne un dict sérialisable (transmis entre processus par la commande
+    rejouer_evenements) : 'colis', 'evenements' (suivis lus), 'divergents'
+    ({pk: (statut, lieu, version lue)}) et 'instantanes' ({pk: (statut, lieu,
+    dernier_suivi, date_dernier_suivi, suivi_max, evenements, rejoues)}).
+    """
+    actuels = {
+        pk: (statut, lieu_stockage, version)
+        for pk, statut, lieu_stockage, version in Colis.objects.filter(pk__in=colis_ids)
+        .values_list('pk', 'statut_actuel', 'lieu_stockage', 'version')
+    }
+    instantanes = {} if depuis_zero else {
+        instantane.colis_id: instantane for instantane in InstantaneColis.objects.filter(colis_id__in=actuels)
+    }
+    rejeux = {}
+    for pk, (_, lieu_stockage, _) in actuels.items():
+        instantane = instantanes.get(pk)
+        rejeux[pk] = _Rejeu(STATUT_INITIAL, lieu_stockage) if instantane is None else _Rejeu(
+            instantane.statut, instantane.lieu_stockage, (instantane.date_dernier_suivi, instantane.dernier_suivi),
+            instantane.suivi_max, instantane.evenements,
+        )
+
+    suivis = SuiviStatut.objects.filter(colis_id__in=actuels)
+    if instantanes and len(instantanes) == len(actuels):
+        suivis = suivis.filter(pk__gt=min(instantane.suivi_max for instantane in instantanes.values()))
+    evenements, a_refaire = 0, set()
+    for colis_id, pk, statut, localisation, date_heure in _lire(suivis):
+        if colis_id in instantanes:
+            instantane = instantanes[colis_id]
+            if pk <= instantane.suivi_max or colis_id in a_refaire:
+                continue
+            if (date_heure, pk) < (instantane.date_dernier_suivi, instantane.dernier_suivi):
+                a_refaire.add(colis_id)  # Suivi tardif : l'instantané ne vaut plus
+                continue
+        rejeux[colis_id].rejouer(pk, statut, localisation, date_heure)
+        evenements += 1
+
+    if a_refaire:
+        for colis_id in a_refaire:
+            rejeux[colis_id] = _Rejeu(STATUT_INITIAL, actuels[colis_id][1])
+        for colis_id, pk, statut, localisation, date_heure in _lire(SuiviStatut.objects.filter(colis_id__in=a_refaire)):
+            rejeux[colis_id].rejouer(pk, statut, localisation, date_heure)
+            evenements += 1
+
+    return {
+        'colis': len(actuels),
+        'evenements': evenements,
+        'divergents': {
+            pk: (rejeu.statut, rejeu.lieu_stockage, actuels[pk][2]) for pk, rejeu in rejeux.items()
+            if (rejeu.statut, rejeu.lieu_stockage) != actuels[pk][:2]
+        },
+        'instantanes': {
+            pk: (rejeu.statut, rejeu.lieu_stockage, rejeu.position[1], rejeu.position[0], rejeu.suivi_max,
+                 rejeu.evenements, rejeu.depuis_instantane)
+            for pk, rejeu in rejeux.items() if rejeu.depuis_instantane
+        },
+    }
+
+
+def enregistrer_rejeu(resultat, intervalle=INTERVALLE_INSTANTANE):
+    """
+    Applique un résultat de replier() en une transaction : colis divergents
+    corrigés (résumés et cache de suivi compris), sauf s'ils ont changé depuis
+    la lecture (version), et instantanés enregistrés pour les colis dont au
+    moins `intervalle` suivis ont été rejoués (0 : dès qu'un suivi l'a été).
+    Retourne le nombre de colis corrigés.
+    """
+    with transaction.atomic():
+        divergents = resultat['divergents']
+        lus = {
+            pk: (version, voyage_id, statut_actuel)
+            for pk, version, voyage_id, statut_actuel in Colis.objects.select_for_update()
+            .filter(pk__in=divergents).values_list('pk', 'version', 'voyage_id', 'statut_actuel')
+        } if divergents else {}
+        a_corriger = {
+            pk: (statut, lieu_stockage) for pk, (statut, lieu_stockage, version) in divergents.items()
+            if pk in lus and lus[pk][0] == version
+        }
+        _corriger(a_corriger)
+        reporter_statuts(
+            {pk: lus[pk][1:] for pk in a_corriger if lus[pk][1] is not None},
+            {pk: statut for pk, (statut, _) in a_corriger.items()},
+        )
+        InstantaneColis.objects.bulk_create([
+            InstantaneColis(
+                colis_id=pk, statut=statut, lieu_stockage=lieu_stockage, dernier_suivi=dernier_suivi,
+                date_dernier_suivi=date_dernier_suivi, suivi_max=suivi_max, evenements=evenements,
+            )
+            for pk, (statut, lieu_stockage, dernier_suivi, date_dernier_suivi, suivi_max, evenements, rejoues)
+            in resultat['instantanes'].items()
+            if rejoues >= max(intervalle, 1)
+        ], update_conflicts=True, unique_fields=['colis'], update_fields=[
+            'statut', 'lieu_stockage', 'dernier_suivi', 'date_dernier_suivi', 'suivi_max', 'evenements',
+            'date_instantane',
+        ])
+    return len(a_corriger)
+
+
+def rejouer_colis(colis_id):
+    """Rejoue un colis depuis son instantané (O(suivis insérés depuis)) ; retourne (statut, lieu de stockage)."""
+    rejouer([colis_id])
+    return Colis.objects.filter(pk=colis_id).values_list('statut_actuel', 'lieu_stockage').first()
+
+
+def _lire(suivis):
+    # Ordre chronologique de chaque colis : index suivi_colis_date_idx parcouru à l'envers
+    return suivis.order_by('-colis_id', 'date_heure', 'pk').values_list(*CHAMPS_SUIVI).iterator(
+        chunk_size=TAILLE_LECTURE
+    )
+
+
+def _corriger(divergents):
+    """Applique les états rejoués : un UPDATE par état distinct (les divergences sont rares)."""
+    par_etat = {}
+    for pk, etat in divergents.items():
+        par_etat.setdefault(etat, []).append(pk)
+    for (statut, lieu_stockage), ids in par_etat.items():
+        # VersionedQuerySet.update() : version incrémentée, journal de synchronisation
+        Colis.objects.filter(pk__in=ids).update(statut_actuel=statut, lieu_stockage=lieu_stockage)
+    if divergents:
+        synchroniser_resumes(divergents)
+        invalider_suivi(*divergents)
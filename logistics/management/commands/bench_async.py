@@ -0,0 +1,167 @@
+# logistics/management/commands/bench_async.py
+
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import BytesIO
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from logistics.models import Colis, SuiviStatut
+from users.models import Utilisateur
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare, à concurrence égale, les lectures de colis servies par un worker ASGI "
+        "(transit/asgi.py, vues asynchrones) et par un worker WSGI à threads (transit/wsgi.py, vues DRF), "
+        "sur un jeu de données temporaire (supprimé en fin de mesure)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--colis', type=int, default=200, help="Nombre de colis générés.")
+        parser.add_argument('--requetes', type=int, default=1000, help="Requêtes par mesure.")
+        parser.add_argument('--concurrence', type=int, default=50, help="Requêtes simultanées.")
+        parser.add_argument('--threads', type=int, default=4, help="Threads du worker WSGI.")
+
+    def handle(self, *args, **options):
+        # Les deux serveurs lisent la base depuis d'autres threads : le jeu de
+        # données est validé, puis supprimé
+        agent = self._generer(options['colis'])
+        try:
+            jeton = str(AccessToken.for_user(agent))
+            ids = list(Colis.objects.filter(numero_bl__startswith='ASYNC').values_list('pk', flat=True))
+            cas = [
+                ('track', [('/api/v1/colis/track/', f'id={pk}') for pk in ids]),
+                ('détail', [(f'/api/v1/colis/{pk}/', '') for pk in ids]),
+                ('liste', [('/api/v1/colis/', 'page_size=20')]),
+            ]
+            for libelle, urls in cas:
+                cibles = [urls[i % len(urls)] for i in range(options['requetes'])]
+                asgi = async_to_sync(self._mesurer_asgi)(cibles, jeton, options['concurrence'])
+                wsgi = self._mesurer_wsgi(cibles, jeton, options['concurrence'], options['threads'])
+                for mode, (duree, latences, threads) in (('ASGI', asgi), ('WSGI', wsgi)):
+                    self.stdout.write(
+                        f"{libelle:<7} {mode} | {len(cibles) / duree:>8.0f} req/s"
+                        f" | p50 {statistics.median(latences) * 1000:>7.1f} ms"
+                        f" | p99 {statistics.quantiles(latences, n=100)[-1] * 1000:>7.1f} ms"
+                        f" | {threads:>3} threads"
+                    )
+        finally:
+            Colis.objects.filter(numero_bl__startswith='ASYNC').delete()
+            Utilisateur.objects.filter(email__startswith='bench.async.').delete()
+
+    def _generer(self, nombre):
+        client = Utilisateur.objects.create_user(
+            email='bench.async.client@transit241.com', password=None, nom='Bench', prenoms='Client',
+            telephone='+24100000096',
+        )
+        agent = Utilisateur.objects.create_user(
+            email='bench.async.agent@transit241.com', password=None, nom='Bench', prenoms='Agent',
+            telephone='+24100000097', is_staff=True,
+        )
+        colis_list = Colis.objects.bulk_create([
+            Colis(numero_bl=f"ASYNC{i:07d}", description=f"Colis de mesure n°{i}", poids_kg=Decimal('812.250'),
+                  client=client, lieu_stockage='Zone B')
+            for i in range(nombre)
+        ])
+        SuiviStatut.objects.bulk_create([
+            SuiviStatut(colis=colis, statut='EN_TRANSIT', localisation=f'Quai {n}', agent_operationnel=agent)
+            for colis in colis_list
+            for n in range(3)
+        ])
+        return agent
+
+    async def _mesurer_asgi(self, cibles, jeton, concurrence):
+        from transit.asgi import application
+
+        latences = []
+        clients = asyncio.Semaphore(concurrence)
+        # Threads ouverts par le worker (ORM et cache asynchrones), en plus de la boucle
+        initial = maximum = threading.active_count()
+
+        async def appeler(chemin, query):
+            nonlocal maximum
+            async with clients:
+                debut = time.perf_counter()
+                statut = await self._appel_asgi(application, chemin, query, jeton)
+                latences.append(time.perf_counter() - debut)
+                maximum = max(maximum, threading.active_count())
+            if statut != 200:
+                raise CommandError(f"ASGI {chemin}?{query} : statut {statut}.")
+
+        debut = time.perf_counter()
+        await asyncio.gather(*(appeler(chemin, query) for chemin, query in cibles))
+        return time.perf_counter() - debut, latences, maximum - initial + 1
+
+    @staticmethod
+    async def _appel_asgi(application, chemin, query, jeton):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': chemin, 'raw_path': chemin.encode(), 'root_path': '',
+            'query_string': query.encode(), 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+            'headers': [(b'host', b'localhost'), (b'authorization', f'Bearer {jeton}'.encode())],
+        }
+        corps_envoye = False
+        statut = None
+
+        async def receive():
+            nonlocal corps_envoye
+            if not corps_envoye:
+                corps_envoye = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Future()  # Pas de déconnexion : annulé par Django en fin de réponse
+
+        async def send(message):
+            nonlocal statut
+            if message['type'] == 'http.response.start':
+                statut = message['status']
+
+        await application(scope, receive, send)
+        return statut
+
+    def _mesurer_wsgi(self, cibles, jeton, concurrence, threads):
+        from transit.wsgi import application
+
+        latences = []
+        # Worker à `threads` threads (gunicorn --threads) : au-delà, les clients attendent
+        # un thread libre, attente comprise dans leur latence
+        worker = threading.BoundedSemaphore(threads)
+
+        def appeler(cible):
+            chemin, query = cible
+            debut = time.perf_counter()
+            with worker:
+                statut = self._appel_wsgi(application, chemin, query, jeton)
+            latences.append(time.perf_counter() - debut)
+            if statut != 200:
+                raise CommandError(f"WSGI {chemin}?{query} : statut {statut}.")
+
+        debut = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrence) as clients:
+            list(clients.map(appeler, cibles))
+        return time.perf_counter() - debut, latences, threads
+
+    @staticmethod
+    def _appel_wsgi(application, chemin, query, jeton):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': chemin, 'QUERY_STRING': query, 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost', 'HTTP_AUTHORIZATION': f'Bearer {jeton}',
+            'wsgi.input': BytesIO(), 'wsgi.url_scheme': 'http', 'wsgi.errors': BytesIO(),
+            'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        statut = []
+        resultat = application(environ, lambda s, entetes, exc_info=None: statut.append(s))
+        try:
+            for _ in resultat:
+                pass
+        finally:
+            if hasattr(resultat, 'close'):
+                resultat.close()
+        return int(statut[0].split()[0])
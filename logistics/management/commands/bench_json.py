@@ -0,0 +1,104 @@
+# logistics/management/commands/bench_json.py
+
+import time
+import tracemalloc
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from audit.models import JournalAudit
+from audit.serializers import JournalAuditSerializer
+from logistics.models import Colis, SuiviStatut
+from logistics.serializers import ColisSerializer
+from transit.renderers import ORJSONRenderer, orjson
+from users.models import Utilisateur
+
+
+class _Annulation(Exception):
+    """Annule la transaction du jeu de données de mesure."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le temps d'encodage et les allocations du JSONRenderer de DRF et de "
+        "ORJSONRenderer sur des pages réalistes de colis et du journal d'audit (données annulées)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-page', type=int, default=200, help="Nombre de lignes par page.")
+        parser.add_argument('--repetitions', type=int, default=20, help="Nombre d'encodages mesurés.")
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError("orjson n'est pas installé : ORJSONRenderer utilise le rendu DRF.")
+        try:
+            with transaction.atomic():
+                pages = self._generer(options['taille_page'])
+                self._mesurer(pages, options['repetitions'])
+                raise _Annulation
+        except _Annulation:
+            pass
+
+    def _generer(self, taille):
+        client = Utilisateur.objects.create_user(
+            email='bench.client@transit241.com', password=None, nom='Bench', prenoms='Client', telephone='+24100000098'
+        )
+        agent = Utilisateur.objects.create_user(
+            email='bench.agent@transit241.com', password=None, nom='Bench', prenoms='Agent', telephone='+24100000099'
+        )
+        colis_list = Colis.objects.bulk_create([
+            Colis(numero_bl=f"BENCH{i:07d}", description=f"Colis de mesure n°{i}", poids_kg=Decimal('812.250'),
+                  client=client, lieu_stockage='Zone B')
+            for i in range(taille)
+        ])
+        SuiviStatut.objects.bulk_create([
+            SuiviStatut(colis=colis, statut='EN_TRANSIT', localisation=f'Quai {n}', agent_operationnel=agent)
+            for colis in colis_list
+            for n in range(3)
+        ])
+        JournalAudit.objects.bulk_create([
+            JournalAudit(utilisateur=agent, action_type='MODIF_STATUT', ressource_affectee='Colis',
+                         ressource_id=str(colis.id), adresse_ip='10.0.0.5', details='{"statut": "EN_TRANSIT"}')
+            for colis in colis_list
+        ])
+
+        colis = (
+            Colis.objects.filter(client=client).select_related('client')
+            .prefetch_related(Prefetch('historique_statuts',
+                                       queryset=SuiviStatut.objects.select_related('agent_operationnel')))
+        )
+        audit = JournalAudit.objects.filter(utilisateur=agent)
+        return [
+            ('colis (sérialiseur)', ColisSerializer(colis, many=True).data),
+            ('audit (sérialiseur)', JournalAuditSerializer(audit, many=True).data),
+            # Types Python bruts : UUID, Decimal et datetime encodés par le renderer
+            ('colis (valeurs brutes)', list(Colis.objects.filter(client=client).values())),
+        ]
+
+    def _mesurer(self, pages, repetitions):
+        renderers = [('DRF json', JSONRenderer()), ('orjson', ORJSONRenderer())]
+        for libelle, donnees in pages:
+            rendus = [renderer.render(donnees) for _, renderer in renderers]
+            if rendus[0] != rendus[1]:
+                raise CommandError(f"{libelle} : les deux renderers ne produisent pas les mêmes octets.")
+
+            resultats = []
+            for nom, renderer in renderers:
+                durees = []
+                for _ in range(repetitions):
+                    debut = time.perf_counter()
+                    renderer.render(donnees)
+                    durees.append(time.perf_counter() - debut)
+                tracemalloc.start()
+                renderer.render(donnees)
+                _, pic = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                resultats.append((nom, min(durees), pic))
+
+            self.stdout.write(f"{libelle} — {len(donnees)} lignes, {len(rendus[0]) / 1024:.0f} Ko")
+            for nom, duree, pic in resultats:
+                self.stdout.write(f"  {nom:<9} {duree * 1000:>8.2f} ms  pic alloué {pic / 1024:>8.0f} Ko")
+            self.stdout.write(f"  gain x{resultats[0][1] / resultats[1][1]:.1f}")
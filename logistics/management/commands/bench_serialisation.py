@@ -0,0 +1,100 @@
+# logistics/management/commands/bench_serialisation.py
+
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer
+
+from logistics.models import Colis, SuiviStatut
+from logistics.serializers import ColisSerializer, SuiviStatutSerializer
+from transit.fastpath import constructeur_pour
+from users.models import Utilisateur
+
+
+class _Annulation(Exception):
+    """Annule la transaction du jeu de données de mesure."""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le débit de sérialisation DRF et du chemin de lecture rapide (transit.fastpath) "
+        "sur un jeu de données temporaire (annulé en fin de mesure)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--colis', type=int, default=500, help="Nombre de colis générés.")
+        parser.add_argument('--suivis', type=int, default=5, help="Nombre de suivis par colis.")
+        parser.add_argument('--repetitions', type=int, default=5, help="Nombre de mesures (la meilleure est gardée).")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._generer(options['colis'], options['suivis'])
+                self._mesurer(options['repetitions'])
+                raise _Annulation
+        except _Annulation:
+            pass
+
+    def _generer(self, nombre, suivis):
+        client = Utilisateur.objects.create_user(
+            email='bench.client@transit241.com', password=None, nom='Bench', prenoms='Client', telephone='+24100000098'
+        )
+        agent = Utilisateur.objects.create_user(
+            email='bench.agent@transit241.com', password=None, nom='Bench', prenoms='Agent', telephone='+24100000099'
+        )
+        colis_list = Colis.objects.bulk_create([
+            Colis(numero_bl=f"BENCH{i:07d}", description=f"Colis de mesure n°{i}", poids_kg=Decimal('812.250'),
+                  client=client, lieu_stockage='Zone B')
+            for i in range(nombre)
+        ])
+        SuiviStatut.objects.bulk_create([
+            SuiviStatut(colis=colis, statut='EN_TRANSIT', localisation=f'Quai {n}', agent_operationnel=agent)
+            for colis in colis_list
+            for n in range(suivis)
+        ])
+
+    def _mesurer(self, repetitions):
+        renderer = JSONRenderer()
+        colis = Colis.objects.filter(numero_bl__startswith='BENCH')
+        suivis = SuiviStatut.objects.filter(colis__numero_bl__startswith='BENCH')
+        cas = [
+            ('colis (+ historique)', ColisSerializer,
+             colis.select_related('client').prefetch_related(
+                 Prefetch('historique_statuts', queryset=SuiviStatut.objects.select_related('agent_operationnel'))
+             ), colis),
+            ('suivis', SuiviStatutSerializer, suivis.select_related('agent_operationnel'), suivis),
+        ]
+
+        for libelle, serializer_class, requete_drf, requete_rapide in cas:
+            constructeur = constructeur_pour(serializer_class())
+            if constructeur is None:
+                raise CommandError(f"{serializer_class.__name__} n'est pas pris en charge par le chemin rapide.")
+
+            def drf():
+                # ListSerializer simple : la mesure ne doit pas lire le cache de fragments
+                serializer = ListSerializer(list(requete_drf), child=serializer_class())
+                return renderer.render(serializer.data)
+
+            def rapide():
+                return renderer.render(constructeur.construire(constructeur.requete(requete_rapide)))
+
+            if drf() != rapide():
+                raise CommandError(f"{libelle} : les deux chemins ne produisent pas le même JSON.")
+
+            lignes = requete_rapide.count()
+            duree_drf = min(self._chronometrer(drf) for _ in range(repetitions))
+            duree_rapide = min(self._chronometrer(rapide) for _ in range(repetitions))
+            self.stdout.write(
+                f"{libelle:<22} {lignes:>6} lignes | DRF {lignes / duree_drf:>10.0f} lignes/s"
+                f" | rapide {lignes / duree_rapide:>10.0f} lignes/s | gain x{duree_drf / duree_rapide:.1f}"
+            )
+
+    @staticmethod
+    def _chronometrer(fonction):
+        debut = time.perf_counter()
+        fonction()
+        return time.perf_counter() - debut
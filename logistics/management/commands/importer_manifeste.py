@@ -0,0 +1,39 @@
+# logistics/management/commands/importer_manifeste.py
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from logistics.manifestes import TAILLE_LOT, TYPES_MANIFESTE, ManifesteInvalide, importer_manifeste, type_depuis_nom
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe le manifeste d'un navire (CSV ou NDJSON) en flux et par lots : "
+        "les lignes invalides et les B/L déjà connus sont signalés sans interrompre l'import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('chemin', help="Fichier du manifeste.")
+        parser.add_argument('--type', choices=TYPES_MANIFESTE, help="Type du manifeste (par défaut : extension).")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Colis insérés par transaction.")
+
+    def handle(self, *args, **options):
+        type_manifeste = options['type'] or type_depuis_nom(options['chemin'])
+        try:
+            with open(options['chemin'], encoding='utf-8-sig', newline='') as flux:
+                rapport = importer_manifeste(flux, type_manifeste, options['taille_lot'])
+        except (OSError, ManifesteInvalide, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+
+        for erreur in rapport.erreurs:
+            self.stderr.write(
+                f"Ligne {erreur['ligne']} ({erreur['numero_bl'] or '?'}) : "
+                f"{json.dumps(erreur['erreurs'], ensure_ascii=False)}"
+            )
+        if rapport.en_erreur > len(rapport.erreurs):
+            self.stderr.write(f"... et {rapport.en_erreur - len(rapport.erreurs)} autres lignes en erreur.")
+        self.stdout.write(self.style.SUCCESS(
+            f"-> {rapport.lignes} lignes : {rapport.crees} colis créés, {rapport.doublons} doublons, "
+            f"{rapport.en_erreur} en erreur."
+        ))
@@ -0,0 +1,36 @@
+# logistics/management/commands/indexer_recherche.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from logistics.models import Colis
+from logistics.search import indexer_colis
+
+
+class Command(BaseCommand):
+    help = (
+        "(Ré)indexe les colis pour la recherche (trigrammes du B/L, plein texte FTS5) : "
+        "à lancer après des imports en masse (bulk_create) qui ne déclenchent pas les signaux."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=1000, help="Nombre de colis par lot.")
+
+    def handle(self, *args, **options):
+        taille_lot = options['taille_lot']
+        ids = Colis.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=taille_lot)
+        total, lot = 0, []
+        for colis_id in ids:
+            lot.append(colis_id)
+            if len(lot) == taille_lot:
+                total += self._indexer(lot)
+                lot = []
+        total += self._indexer(lot)
+        self.stdout.write(self.style.SUCCESS(f"-> {total} colis indexés."))
+
+    @staticmethod
+    def _indexer(lot):
+        # Une transaction par lot : les écritures SQLite restent courtes
+        with transaction.atomic():
+            indexer_colis(lot)
+        return len(lot)
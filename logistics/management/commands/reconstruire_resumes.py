@@ -0,0 +1,64 @@
+# logistics/management/commands/reconstruire_resumes.py
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, transaction
+
+from logistics.models import Colis, ColisResume
+from logistics.read_models import calculer_resumes, enregistrer_resumes
+
+
+def _calculer_lot(colis_ids):
+    """Calcule les résumés d'un lot (lecture seule) dans sa propre connexion."""
+    try:
+        return calculer_resumes(colis_ids)
+    finally:
+        connection.close()
+
+
+def _lots(taille_lot):
+    lot = []
+    for colis_id in Colis.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=taille_lot):
+        lot.append(colis_id)
+        if len(lot) == taille_lot:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+class Command(BaseCommand):
+    help = ("Reconstruit le résumé dénormalisé des colis (ColisResume) par lots calculés en parallèle "
+            "et enregistrés un à un.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=1000, help="Nombre de colis par lot.")
+        parser.add_argument('--workers', type=int, default=4, help="Nombre de lots calculés en parallèle.")
+        parser.add_argument('--vider', action='store_true', help="Supprime tous les résumés avant reconstruction.")
+
+    def handle(self, *args, **options):
+        if options['vider']:
+            ColisResume.objects.all().delete()
+
+        # Les lectures (calcul des résumés) sont réparties sur les threads ; les écritures restent
+        # dans ce thread, un lot par transaction : un seul écrivain (SQLite n'en accepte qu'un), et
+        # au plus deux lots calculés d'avance par thread en mémoire.
+        total, en_cours = 0, set()
+        # Identifiants lus d'avance : pas de curseur ouvert sur la connexion qui écrit
+        lots = iter(list(_lots(options['taille_lot'])))
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                for lot in lots:
+                    en_cours.add(executor.submit(_calculer_lot, lot))
+                    if len(en_cours) >= 2 * options['workers']:
+                        break
+                if not en_cours:
+                    break
+                termines, en_cours = wait(en_cours, return_when=FIRST_COMPLETED)
+                for future in termines:
+                    with transaction.atomic():
+                        total += len(enregistrer_resumes(future.result()))
+        close_old_connections()
+
+        self.stdout.write(self.style.SUCCESS(f"-> {total} résumés de colis reconstruits."))
@@ -0,0 +1,81 @@
+# logistics/management/commands/rejouer_evenements.py
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from logistics.evenements import enregistrer_rejeu, replier
+from logistics.models import Colis
+
+
+def _replier_lot(colis_ids, depuis_zero):
+    """Rejoue un lot (lecture seule) dans un processus de travail, avec sa propre connexion."""
+    try:
+        return replier(colis_ids, depuis_zero)
+    finally:
+        connection.close()
+
+
+def _lots(taille_lot):
+    lot = []
+    for colis_id in Colis.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=taille_lot):
+        lot.append(colis_id)
+        if len(lot) == taille_lot:
+            yield lot
+            lot = []
+    if lot:
+        yield lot
+
+
+class Command(BaseCommand):
+    help = ("Reconstruit statut_actuel et lieu_stockage de tous les colis en rejouant leur historique "
+            "SuiviStatut (depuis les instantanés), par lots répartis sur plusieurs processus.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--taille-lot', type=int, default=2000, help="Nombre de colis par lot.")
+        parser.add_argument('--processus', type=int, default=os.cpu_count() or 1,
+                            help="Nombre de processus de travail (1 : dans le processus courant ; "
+                                 "par défaut, un par CPU).")
+        parser.add_argument('--depuis-zero', action='store_true',
+                            help="Ignore les instantanés et rejoue tout l'historique.")
+        parser.add_argument('--verifier', action='store_true',
+                            help="Compte les colis divergents sans les corriger ni enregistrer d'instantané.")
+
+    def handle(self, *args, **options):
+        depuis_zero, corriger = options['depuis_zero'], not options['verifier']
+        totaux = {'colis': 0, 'evenements': 0, 'divergents': 0, 'corriges': 0}
+
+        def totaliser(resultat):
+            totaux['colis'] += resultat['colis']
+            totaux['evenements'] += resultat['evenements']
+            totaux['divergents'] += len(resultat['divergents'])
+            if corriger:
+                totaux['corriges'] += enregistrer_rejeu(resultat, intervalle=0)
+
+        if options['processus'] <= 1:
+            for lot in _lots(options['taille_lot']):
+                totaliser(replier(lot, depuis_zero))
+        else:
+            # Le repli de l'historique (Python, lié au CPU) est réparti sur des processus plutôt que des
+            # threads ; les écritures restent dans ce processus, un lot à la fois (un seul écrivain
+            # SQLite, transactions courtes ailleurs). Démarrage 'spawn' : chaque processus configure
+            # Django et ouvre sa propre connexion.
+            lots = list(_lots(options['taille_lot']))
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=options['processus'], initializer=django.setup,
+                                     mp_context=multiprocessing.get_context('spawn')) as executor:
+                futures = [executor.submit(_replier_lot, lot, depuis_zero) for lot in lots]
+                for future in as_completed(futures):
+                    totaliser(future.result())
+
+        if corriger:
+            bilan = f"{totaux['corriges']} corrigés"
+        else:
+            bilan = f"{totaux['divergents']} divergents (non corrigés)"
+        self.stdout.write(self.style.SUCCESS(
+            f"-> {totaux['colis']} colis rejoués ({totaux['evenements']} événements), {bilan}."
+        ))
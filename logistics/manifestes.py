@@ -0,0 +1,157 @@
+# logistics/manifestes.py
+
+import csv
+import re
+
+from django.db import IntegrityError, transaction
+from rest_framework.exceptions import ValidationError
+
+from transit.parsers import lire_ndjson
+
+from users.models import Utilisateur
+from .models import Colis
+from .read_models import synchroniser_resumes
+from .search import indexer_colis
+from .serializers import ManifesteLigneSerializer
+from .sync import enregistrer_changements
+from .voyages import compter_nouveaux
+
+TYPES_MANIFESTE = ('csv', 'ndjson')
+COLONNES_REQUISES = ('numero_bl', 'description', 'poids_kg')
+# Colis validés puis insérés par transaction
+TAILLE_LOT = 1000
+# Erreurs détaillées gardées dans le rapport (les suivantes sont seulement comptées)
+ERREURS_MAX = 1000
+
+_SEPARATEURS_TELEPHONE = re.compile(r'[\s.\-()]')
+
+
+class ManifesteInvalide(ValueError):
+    """Manifeste illisible dans son ensemble (type inconnu, colonnes manquantes)."""
+
+
+def normaliser_telephone(valeur):
+    return _SEPARATEURS_TELEPHONE.sub('', valeur or '')
+
+
+def annuaire_clients():
+    """Table de correspondance email (minuscules) / téléphone (normalisé) -> id du client, en une requête."""
+    annuaire = {}
+    for pk, email, telephone in Utilisateur.objects.values_list('pk', 'email', 'telephone').iterator():
+        annuaire[('email', email.lower())] = pk
+        if telephone:
+            annuaire[('telephone', normaliser_telephone(telephone))] = pk
+    return annuaire
+
+
+def type_depuis_nom(nom_fichier):
+    """Type du manifeste déduit de l'extension (.csv, .ndjson, .jsonl), ou None."""
+    extension = nom_fichier.rsplit('.', 1)[-1].lower() if '.' in nom_fichier else ''
+    return {'csv': 'csv', 'ndjson': 'ndjson', 'jsonl': 'ndjson'}.get(extension)
+
+
+def lire_lignes(flux, type_manifeste):
+    """
+    Lit le manifeste (flux texte) ligne à ligne, sans le charger en mémoire.
+    Produit (numéro de ligne, données, erreur) ; `données` est None si la
+    ligne elle-même est illisible.
+    """
+    if type_manifeste == 'csv':
+        lecteur = csv.DictReader(flux)
+        manquantes = [c for c in COLONNES_REQUISES if c not in (lecteur.fieldnames or ())]
+        if manquantes:
+            raise ManifesteInvalide(f"Colonnes manquantes : {', '.join(manquantes)}.")
+        for donnees in lecteur:
+            if None in donnees:
+                yield lecteur.line_num, None, "Trop de colonnes."
+            else:
+                yield lecteur.line_num, donnees, None
+    elif type_manifeste == 'ndjson':
+        yield from lire_ndjson(flux)
+    else:
+        raise ManifesteInvalide(f"Type de manifeste inconnu (attendu : {', '.join(TYPES_MANIFESTE)}).")
+
+
+class RapportImport:
+    """Compteurs de l'import et erreurs par ligne (les ERREURS_MAX premières)."""
+
+    def __init__(self):
+        self.lignes = self.crees = self.doublons = self.en_erreur = 0
+        self.erreurs = []
+
+    def erreur(self, numero, numero_bl, detail):
+        self.en_erreur += 1
+        if len(self.erreurs) < ERREURS_MAX:
+            self.erreurs.append({'ligne': numero, 'numero_bl': numero_bl, 'erreurs': detail})
+
+    def en_dict(self):
+        return {
+            'lignes': self.lignes, 'crees': self.crees, 'doublons': self.doublons,
+            'en_erreur': self.en_erreur, 'erreurs': self.erreurs,
+        }
+
+
+def importer_manifeste(flux, type_manifeste, taille_lot=TAILLE_LOT, voyage=None):
+    """
+    Crée les colis d'un manifeste de navire (CSV ou NDJSON) en mémoire
+    constante : lecture en flux, validation ligne par ligne, clients résolus
+    par email ou téléphone via une table préchargée, B/L déjà connus écartés
+    par lot, puis bulk_create d'un lot par transaction. Une ligne en erreur
+    n'interrompt pas l'import. Les colis sont rattachés au `voyage` s'il est
+    donné. Retourne le RapportImport.
+    """
+    rapport = RapportImport()
+    # Un seul sérialiseur pour toutes les lignes : ses champs ne sont construits qu'une fois
+    validateur = ManifesteLigneSerializer(context={'clients': annuaire_clients()})
+    lot = []
+    for numero, donnees, erreur in lire_lignes(flux, type_manifeste):
+        rapport.lignes += 1
+        if donnees is None:
+            rapport.erreur(numero, None, {'non_field_errors': [erreur]})
+            continue
+        try:
+            lot.append(validateur.run_validation(donnees))
+        except ValidationError as e:
+            rapport.erreur(numero, donnees.get('numero_bl'), e.detail)
+            continue
+        if len(lot) >= taille_lot:
+            _inserer(lot, rapport, voyage)
+            lot = []
+    _inserer(lot, rapport, voyage)
+    return rapport
+
+
+def _inserer(lot, rapport, voyage):
+    if not lot:
+        return
+    for tentative in range(2):
+        try:
+            with transaction.atomic():
+                crees, doublons = _inserer_lot(lot, voyage)
+        except IntegrityError:
+            # B/L inséré entre-temps par un import concurrent : dédoublonnage refait une fois
+            if tentative:
+                raise
+        else:
+            rapport.crees += crees
+            rapport.doublons += doublons
+            return
+
+
+def _inserer_lot(lot, voyage):
+    numeros = {donnees['numero_bl'] for donnees in lot}
+    connus = set(Colis.objects.filter(numero_bl__in=numeros).values_list('numero_bl', flat=True))
+    nouveaux = []
+    for donnees in lot:
+        if donnees['numero_bl'] in connus:
+            continue
+        connus.add(donnees['numero_bl'])  # Doublon à l'intérieur du manifeste
+        nouveaux.append(Colis(**donnees, voyage=voyage))
+    Colis.objects.bulk_create(nouveaux)
+    # bulk_create n'émet pas post_save : résumés, index et journal mis à jour par lot
+    ids = [colis.pk for colis in nouveaux]
+    synchroniser_resumes(ids)
+    indexer_colis(ids)
+    enregistrer_changements(Colis, ids)
+    compter_nouveaux(nouveaux)
+    return len(nouveaux), len(lot) - len(nouveaux)
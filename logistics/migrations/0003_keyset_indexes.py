@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:58
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0002_declarationdouaniere_facture'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='declarationdouaniere',
+            name='douanier',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='declarations_traitees', to=settings.AUTH_USER_MODEL, verbose_name='Douanier Traitant'),
+        ),
+        migrations.AddIndex(
+            model_name='colis',
+            index=models.Index(fields=['date_arrivee', 'id'], name='colis_date_arrivee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='declarationdouaniere',
+            index=models.Index(fields=['date_soumission', 'id'], name='declaration_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facture',
+            index=models.Index(fields=['date_emission', 'id'], name='facture_date_emission_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='retraitcolis',
+            index=models.Index(fields=['date_heure_retrait', 'id'], name='retrait_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='suivistatut',
+            index=models.Index(fields=['date_heure', 'id'], name='suivi_date_heure_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0003_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='colis',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, verbose_name='Dernière Modification'),
+        ),
+        migrations.AddField(
+            model_name='colis',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Version'),
+        ),
+        migrations.AddField(
+            model_name='declarationdouaniere',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, verbose_name='Dernière Modification'),
+        ),
+        migrations.AddField(
+            model_name='declarationdouaniere',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Version'),
+        ),
+        migrations.AddField(
+            model_name='facture',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, verbose_name='Dernière Modification'),
+        ),
+        migrations.AddField(
+            model_name='facture',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Version'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0004_row_versions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColisResume',
+            fields=[
+                ('colis', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resume', serialize=False, to='logistics.colis')),
+                ('numero_bl', models.CharField(max_length=150)),
+                ('statut_actuel', models.CharField(choices=[('EN_ATTENTE_DECHARGE', 'En Attente de Déchargement'), ('EN_TRANSIT', 'En Transit'), ('DEDOUANEMENT', 'En Dédouanement'), ('PRET_RETRAIT', 'Prêt au Retrait'), ('LIVRE', 'Livré/Retiré'), ('LITIGE', 'Litige/Problème')], max_length=30)),
+                ('lieu_stockage', models.CharField(blank=True, max_length=100)),
+                ('poids_kg', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('date_arrivee', models.DateTimeField()),
+                ('client_nom', models.CharField(max_length=201)),
+                ('derniere_localisation', models.CharField(blank=True, max_length=255)),
+                ('dernier_agent_nom', models.CharField(blank=True, max_length=201)),
+                ('date_dernier_suivi', models.DateTimeField(blank=True, null=True)),
+                ('facture_statut', models.CharField(blank=True, max_length=20)),
+                ('declaration_statut', models.CharField(blank=True, max_length=30)),
+                ('date_retrait', models.DateTimeField(blank=True, null=True)),
+                ('total_paye', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('client', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Résumé de Colis',
+                'verbose_name_plural': 'Résumés de Colis',
+                'indexes': [models.Index(fields=['date_arrivee', 'colis'], name='resume_date_arrivee_idx'), models.Index(fields=['statut_actuel', 'date_arrivee'], name='resume_statut_idx'), models.Index(fields=['client', 'date_arrivee'], name='resume_client_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:09
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0005_colis_resume'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='suivistatut',
+            options={'ordering': ['-date_heure', '-id'], 'verbose_name': 'Suivi de Statut', 'verbose_name_plural': 'Suivis de Statut'},
+        ),
+    ]
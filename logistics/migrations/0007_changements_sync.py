@@ -0,0 +1,54 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def initialiser_changements(apps, schema_editor):
+    """Un changement par objet existant, pour que la première synchronisation les transmette."""
+    ChangementSync = apps.get_model('logistics', 'ChangementSync')
+    sources = [
+        ('colis', apps.get_model('logistics', 'Colis'), 'client'),
+        ('suivi', apps.get_model('logistics', 'SuiviStatut'), 'colis__client'),
+        ('facture', apps.get_model('logistics', 'Facture'), 'colis__client'),
+        ('declaration', apps.get_model('logistics', 'DeclarationDouaniere'), 'colis__client'),
+    ]
+    for type_objet, model, chemin_client in sources:
+        lignes = model.objects.order_by('pk').values_list('pk', chemin_client).iterator(chunk_size=2000)
+        lot = []
+        for pk, client in lignes:
+            lot.append(ChangementSync(type_objet=type_objet, objet_id=str(pk), client_id=client))
+            if len(lot) == 2000:
+                ChangementSync.objects.bulk_create(lot)
+                lot = []
+        ChangementSync.objects.bulk_create(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0006_suivi_ordering_stable'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangementSync',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('type_objet', models.CharField(choices=[('colis', 'Colis'), ('suivi', 'Suivi de Statut'), ('facture', 'Facture'), ('declaration', 'Déclaration Douanière')], max_length=20)),
+                ('objet_id', models.CharField(max_length=36, verbose_name="UUID ou PK de l'Objet")),
+                ('supprime', models.BooleanField(default=False, verbose_name='Supprimé (Tombstone)')),
+                ('date_changement', models.DateTimeField(auto_now=True)),
+                ('client', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Changement Synchronisé',
+                'verbose_name_plural': 'Changements Synchronisés',
+                'indexes': [models.Index(fields=['client', 'id'], name='changement_client_idx')],
+                'constraints': [models.UniqueConstraint(fields=('type_objet', 'objet_id'), name='changement_objet_unique')],
+            },
+        ),
+        migrations.RunPython(initialiser_changements, migrations.RunPython.noop),
+    ]
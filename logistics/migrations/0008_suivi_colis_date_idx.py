@@ -0,0 +1,19 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0007_changements_sync'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='suivistatut',
+            index=models.Index(fields=['colis', '-date_heure', '-id'], name='suivi_colis_date_idx'),
+        ),
+    ]
@@ -0,0 +1,114 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:40
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLE_FTS = 'logistics_colis_fts'
+
+# Copies figées de logistics.search (une migration ne dépend pas du code courant)
+_CONFUSIONS = str.maketrans({'O': '0', 'Q': '0', 'I': '1', 'L': '1'})
+_NON_ALPHANUMERIQUE = re.compile(r'[^0-9A-Z]')
+
+
+def normaliser_bl(valeur):
+    """Majuscules, alphanumérique uniquement, confusions OCR unifiées : 'bl-0O1 gab' -> 'B1001GAB'."""
+    return _NON_ALPHANUMERIQUE.sub('', valeur.upper()).translate(_CONFUSIONS)
+
+
+def trigrammes(valeur):
+    """Trigrammes d'un B/L normalisé, bornés comme pg_trgm (deux espaces avant, un après)."""
+    borne = f'  {valeur} '
+    return {borne[i:i + 3] for i in range(len(borne) - 2)} if valeur else set()
+
+
+def creer_table_fts(apps, schema_editor):
+    """Table plein texte FTS5 (SQLite uniquement) ; son rowid est l'id de ColisRecherche."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE {TABLE_FTS} USING fts5("
+        "description, client, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+    )
+
+
+def supprimer_table_fts(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {TABLE_FTS}")
+
+
+def indexer_colis_existants(apps, schema_editor):
+    """Indexe les colis existants, par lots de 2000."""
+    Colis = apps.get_model('logistics', 'Colis')
+    ColisRecherche = apps.get_model('logistics', 'ColisRecherche')
+    TrigrammeBL = apps.get_model('logistics', 'TrigrammeBL')
+    fts = schema_editor.connection.vendor == 'sqlite'
+    lignes = (
+        Colis.objects.order_by('pk')
+        .values_list('pk', 'numero_bl', 'description', 'client__prenoms', 'client__nom')
+        .iterator(chunk_size=2000)
+    )
+    lot = []
+
+    def enregistrer(lot):
+        entrees = ColisRecherche.objects.bulk_create([
+            ColisRecherche(colis_id=pk, bl_normalise=normaliser_bl(numero_bl)) for pk, numero_bl, *_ in lot
+        ])
+        TrigrammeBL.objects.bulk_create([
+            TrigrammeBL(trigramme=trigramme, entree=entree)
+            for entree in entrees
+            for trigramme in sorted(trigrammes(entree.bl_normalise))
+        ])
+        if fts:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {TABLE_FTS} (rowid, description, client) VALUES (%s, %s, %s)",
+                    [(entree.pk, description, f"{prenoms or ''} {nom or ''}".strip())
+                     for entree, (_, _, description, prenoms, nom) in zip(entrees, lot)],
+                )
+
+    for ligne in lignes:
+        lot.append(ligne)
+        if len(lot) == 2000:
+            enregistrer(lot)
+            lot = []
+    if lot:
+        enregistrer(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0008_suivi_colis_date_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ColisRecherche',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bl_normalise', models.CharField(db_index=True, max_length=150)),
+                ('colis', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='recherche', to='logistics.colis')),
+            ],
+            options={
+                'verbose_name': 'Entrée de Recherche',
+                'verbose_name_plural': 'Entrées de Recherche',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrigrammeBL',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigramme', models.CharField(max_length=3)),
+                ('entree', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrammes', to='logistics.colisrecherche')),
+            ],
+            options={
+                'verbose_name': 'Trigramme de B/L',
+                'verbose_name_plural': 'Trigrammes de B/L',
+                'constraints': [models.UniqueConstraint(fields=('trigramme', 'entree'), name='trigramme_entree_unique')],
+            },
+        ),
+        migrations.RunPython(creer_table_fts, supprimer_table_fts),
+        migrations.RunPython(indexer_colis_existants, migrations.RunPython.noop),
+    ]
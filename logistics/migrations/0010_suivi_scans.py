@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0009_recherche_colis'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='suivistatut',
+            name='appareil',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Terminal de Scan'),
+        ),
+        migrations.AddField(
+            model_name='suivistatut',
+            name='evenement_id',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name="ID d'Événement"),
+        ),
+        migrations.AlterField(
+            model_name='suivistatut',
+            name='date_heure',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
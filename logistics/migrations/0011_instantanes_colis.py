@@ -0,0 +1,31 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0010_suivi_scans'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InstantaneColis',
+            fields=[
+                ('colis', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='instantane', serialize=False, to='logistics.colis')),
+                ('statut', models.CharField(choices=[('EN_ATTENTE_DECHARGE', 'En Attente de Déchargement'), ('EN_TRANSIT', 'En Transit'), ('DEDOUANEMENT', 'En Dédouanement'), ('PRET_RETRAIT', 'Prêt au Retrait'), ('LIVRE', 'Livré/Retiré'), ('LITIGE', 'Litige/Problème')], max_length=30)),
+                ('lieu_stockage', models.CharField(blank=True, max_length=100)),
+                ('dernier_suivi', models.BigIntegerField()),
+                ('date_dernier_suivi', models.DateTimeField()),
+                ('suivi_max', models.BigIntegerField()),
+                ('evenements', models.PositiveIntegerField(verbose_name='Événements Rejoués')),
+                ('date_instantane', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Instantané de Colis',
+                'verbose_name_plural': 'Instantanés de Colis',
+            },
+        ),
+    ]
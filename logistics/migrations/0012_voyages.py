@@ -0,0 +1,49 @@
+# Generated by Django 5.2.7 on 2026-10-18 19:32
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0011_instantanes_colis'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Voyage',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('navire', models.CharField(max_length=150, verbose_name='Navire')),
+                ('numero_voyage', models.CharField(max_length=50, unique=True, verbose_name='Numéro de Voyage')),
+                ('date_arrivee_prevue', models.DateTimeField(blank=True, null=True, verbose_name='Arrivée Prévue (ETA)')),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('colis_en_attente_decharge', models.IntegerField(default=0, editable=False)),
+                ('colis_en_transit', models.IntegerField(default=0, editable=False)),
+                ('colis_dedouanement', models.IntegerField(default=0, editable=False)),
+                ('colis_pret_retrait', models.IntegerField(default=0, editable=False)),
+                ('colis_livre', models.IntegerField(default=0, editable=False)),
+                ('colis_litige', models.IntegerField(default=0, editable=False)),
+                ('poids_total_kg', models.DecimalField(decimal_places=3, default=0, editable=False, max_digits=16, verbose_name='Poids Total (kg)')),
+                ('colis_dedouanes', models.IntegerField(default=0, editable=False, verbose_name='Colis Dédouanés')),
+            ],
+            options={
+                'verbose_name': 'Voyage',
+                'verbose_name_plural': 'Voyages',
+                'indexes': [models.Index(fields=['date_creation', 'id'], name='voyage_date_creation_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='colis',
+            name='voyage',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='colis', to='logistics.voyage', verbose_name='Voyage (Navire)'),
+        ),
+        migrations.AddIndex(
+            model_name='colis',
+            index=models.Index(fields=['voyage', 'date_arrivee', 'id'], name='colis_voyage_idx'),
+        ),
+    ]
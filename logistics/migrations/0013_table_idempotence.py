@@ -0,0 +1,46 @@
+# Table du cache 'idempotence' (DatabaseCache, repli de transit/idempotence.py) :
+# créée par migrate, sans étape manuelle createcachetable au déploiement.
+
+from django.apps.registry import Apps
+from django.db import migrations, models
+
+# LOCATION du cache 'idempotence' dans settings.CACHES
+TABLE = 'transit_idempotence'
+
+
+def modele_table():
+    """Modèle non enregistré décrivant la table (schéma de DatabaseCache, voir createcachetable)."""
+    class Meta:
+        apps = Apps()
+        app_label = 'logistics'
+        db_table = TABLE
+
+    return type('TableIdempotence', (models.Model,), {
+        '__module__': __name__,
+        'Meta': Meta,
+        'cache_key': models.CharField(max_length=255, unique=True, primary_key=True),
+        'value': models.TextField(),
+        'expires': models.DateTimeField(db_index=True),
+    })
+
+
+def creer_table(apps, schema_editor):
+    # Déjà créée si createcachetable a été lancé avant migrate
+    if TABLE not in schema_editor.connection.introspection.table_names():
+        schema_editor.create_model(modele_table())
+
+
+def supprimer_table(apps, schema_editor):
+    if TABLE in schema_editor.connection.introspection.table_names():
+        schema_editor.delete_model(modele_table())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0012_voyages'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_table, supprimer_table),
+    ]
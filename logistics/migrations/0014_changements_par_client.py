@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 20:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0013_table_idempotence'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='changementsync',
+            name='changement_objet_unique',
+        ),
+        migrations.AddConstraint(
+            model_name='changementsync',
+            constraint=models.UniqueConstraint(fields=('type_objet', 'objet_id', 'client'), name='changement_objet_client_unique'),
+        ),
+    ]
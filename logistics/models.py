@@ -2,10 +2,60 @@ from django.db import models
 from users.models import Utilisateur # Importation de l'utilisateur personnalisé
 import uuid
 from users.models import Role # <--- AJOUTEZ CET IMPORT !
+from django.utils import timezone
+from django.dispatch import Signal
+
+# --- 0. Versionnement des lignes (GET conditionnels / ETag) ---
+
+# Émis par VersionedQuerySet.update() (qui n'émet pas post_save) avec les pk des lignes
+# modifiées et les champs mis à jour (`champs`, seulement version/date pour toucher())
+lignes_modifiees = Signal()
+
+
+class VersionedQuerySet(models.QuerySet):
+    """QuerySet dont update() incrémente aussi la version des lignes modifiées."""
+
+    def update(self, **kwargs):
+        kwargs.setdefault('version', models.F('version') + 1)
+        kwargs.setdefault('date_modification', timezone.now())
+        if not lignes_modifiees.has_listeners(self.model):
+            return super().update(**kwargs)
+        pks = list(self.values_list('pk', flat=True))
+        lignes = super().update(**kwargs)
+        if pks:
+            lignes_modifiees.send(sender=self.model, pks=pks, champs=frozenset(kwargs))
+        return lignes
+
+    def toucher(self):
+        """Incrémente la version des lignes sans modifier d'autre colonne."""
+        return self.update()
+
+
+class VersionedModel(models.Model):
+    """
+    Ajoute un numéro de version et une date de modification à chaque ligne.
+    Les deux sont mis à jour par save() comme par queryset.update().
+    """
+    version = models.PositiveIntegerField(default=1, editable=False, verbose_name="Version")
+    date_modification = models.DateTimeField(auto_now=True, verbose_name="Dernière Modification")
+
+    objects = VersionedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'version', 'date_modification'}
+        super().save(*args, **kwargs)
+
 
 # --- 1. Colis (Le cœur de l'application) ---
 
-class Colis(models.Model):
+class Colis(VersionedModel):
     """Représente la marchandise physique à gérer au port."""
     STATUT_CHOICES = [
         ('EN_ATTENTE_DECHARGE', 'En Attente de Déchargement'),
@@ -27,10 +77,19 @@ class Colis(models.Model):
     
     lieu_stockage = models.CharField(max_length=100, blank=True, verbose_name="Localisation Physique Actuelle")
     statut_actuel = models.CharField(max_length=30, choices=STATUT_CHOICES, default='EN_ATTENTE_DECHARGE', verbose_name="Statut Actuel")
+    # Index composite colis_voyage_idx plutôt que l'index simple de la clé étrangère
+    voyage = models.ForeignKey('Voyage', on_delete=models.PROTECT, null=True, blank=True, related_name='colis',
+                               db_index=False, verbose_name="Voyage (Navire)")
 
     class Meta:
         verbose_name = "Colis"
         verbose_name_plural = "Colis"
+        indexes = [
+            # Pagination keyset (date_arrivee, id)
+            models.Index(fields=['date_arrivee', 'id'], name='colis_date_arrivee_idx'),
+            # Colis d'un voyage, paginés par date d'arrivée : un seul parcours d'index
+            models.Index(fields=['voyage', 'date_arrivee', 'id'], name='colis_voyage_idx'),
+        ]
 
     def __str__(self):
         return str(self.id)
@@ -42,14 +101,23 @@ class SuiviStatut(models.Model):
     colis = models.ForeignKey(Colis, on_delete=models.CASCADE, related_name='historique_statuts')
     statut = models.CharField(max_length=30, choices=Colis.STATUT_CHOICES, verbose_name="Statut Enregistré")
     localisation = models.CharField(max_length=255, blank=True, verbose_name="Localisation (GPS/Zone)")
-    date_heure = models.DateTimeField(auto_now_add=True)
+    # Heure de l'événement : l'heure du scan pour les terminaux (suivi-statuts/scans/), sinon l'enregistrement
+    date_heure = models.DateTimeField(default=timezone.now)
     agent_operationnel = models.ForeignKey(Utilisateur, on_delete=models.SET_NULL, null=True, related_name='operations_effectuees')
     notes = models.TextField(blank=True, verbose_name="Notes Opérationnelles")
+    # Identifiant attribué par le terminal : un événement renvoyé (reconnexion) n'est enregistré qu'une fois
+    evenement_id = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="ID d'Événement")
+    appareil = models.CharField(max_length=100, blank=True, verbose_name="Terminal de Scan")
 
     class Meta:
         verbose_name = "Suivi de Statut"
         verbose_name_plural = "Suivis de Statut"
-        ordering = ['-date_heure']
+        ordering = ['-date_heure', '-id']  # id : ordre stable entre suivis de même date
+        indexes = [
+            models.Index(fields=['date_heure', 'id'], name='suivi_date_heure_idx'),
+            # Historique d'un colis, du plus récent au plus ancien (timeline, historique imbriqué)
+            models.Index(fields=['colis', '-date_heure', '-id'], name='suivi_colis_date_idx'),
+        ]
 
 # --- 3. Retrait Sécurisé ---
 
@@ -66,13 +134,16 @@ class RetraitColis(models.Model):
     class Meta:
         verbose_name = "Retrait de Colis"
         verbose_name_plural = "Retraits de Colis"
+        indexes = [
+            models.Index(fields=['date_heure_retrait', 'id'], name='retrait_date_idx'),
+        ]
         
         
         
 # logistics/models.py (Ajouter ces classes à la fin du fichier)
 
 # --- 4. Facturation Client ---
-class Facture(models.Model):
+class Facture(VersionedModel):
     """Représente une facture associée à un colis."""
     STATUT_FACTURE_CHOICES = [
         ('PENDING', 'En Attente de Paiement'),
@@ -91,13 +162,16 @@ class Facture(models.Model):
     class Meta:
         verbose_name = "Facture"
         verbose_name_plural = "Factures"
+        indexes = [
+            models.Index(fields=['date_emission', 'id'], name='facture_date_emission_idx'),
+        ]
 
     def __str__(self):
         return f"Facture #{self.id} pour Colis #{self.colis.id}"
 
 
 # --- 5. Déclaration Douanière ---
-class DeclarationDouaniere(models.Model):
+class DeclarationDouaniere(VersionedModel):
     """Enregistre les informations de déclaration douanière liées à un colis."""
     STATUT_DECLARATION_CHOICES = [
         ('DRAFT', 'Brouillon'),
@@ -119,6 +193,191 @@ class DeclarationDouaniere(models.Model):
     class Meta:
         verbose_name = "Déclaration Douanière"
         verbose_name_plural = "Déclarations Douanières"
+        indexes = [
+            models.Index(fields=['date_soumission', 'id'], name='declaration_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Déclaration {self.numero_declaration} pour Colis {self.colis.id}"
+
+
+# --- 6. Résumé dénormalisé des colis (modèle de lecture) ---
+
+class ColisResume(models.Model):
+    """
+    Une ligne par colis regroupant ce qu'affichent les écrans de liste et le
+    tableau de bord (client, dernier suivi, facture, déclaration, retrait,
+    paiements). Maintenue dans la transaction de chaque écriture
+    (voir logistics/read_models.py) et reconstructible via
+    `manage.py reconstruire_resumes`.
+    """
+    colis = models.OneToOneField(Colis, on_delete=models.CASCADE, primary_key=True, related_name='resume')
+    numero_bl = models.CharField(max_length=150)
+    statut_actuel = models.CharField(max_length=30, choices=Colis.STATUT_CHOICES)
+    lieu_stockage = models.CharField(max_length=100, blank=True)
+    poids_kg = models.DecimalField(max_digits=10, decimal_places=3)
+    date_arrivee = models.DateTimeField()
+
+    client = models.ForeignKey(Utilisateur, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    client_nom = models.CharField(max_length=201)
+
+    derniere_localisation = models.CharField(max_length=255, blank=True)
+    dernier_agent_nom = models.CharField(max_length=201, blank=True)
+    date_dernier_suivi = models.DateTimeField(null=True, blank=True)
+
+    facture_statut = models.CharField(max_length=20, blank=True)
+    declaration_statut = models.CharField(max_length=30, blank=True)
+    date_retrait = models.DateTimeField(null=True, blank=True)
+    total_paye = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = "Résumé de Colis"
+        verbose_name_plural = "Résumés de Colis"
+        indexes = [
+            models.Index(fields=['date_arrivee', 'colis'], name='resume_date_arrivee_idx'),
+            models.Index(fields=['statut_actuel', 'date_arrivee'], name='resume_statut_idx'),
+            models.Index(fields=['client', 'date_arrivee'], name='resume_client_idx'),
+        ]
+
+
+# --- 7. Journal des changements (synchronisation mobile) ---
+
+class ChangementSync(models.Model):
+    """
+    Dernier changement connu de chaque objet synchronisé avec les applications
+    mobiles (colis, suivi, facture, déclaration) : une ligne par objet et par
+    client, renumérotée à chaque écriture (un ancien propriétaire garde un
+    tombstone). L'id croissant sert de jeton de synchronisation et `supprime`
+    marque les suppressions (tombstones).
+    Alimenté dans la transaction de chaque écriture (voir logistics/sync.py).
+    """
+    TYPE_CHOICES = [
+        ('colis', 'Colis'),
+        ('suivi', 'Suivi de Statut'),
+        ('facture', 'Facture'),
+        ('declaration', 'Déclaration Douanière'),
+    ]
+
+    id = models.BigAutoField(primary_key=True)
+    type_objet = models.CharField(max_length=20, choices=TYPE_CHOICES)
+    objet_id = models.CharField(max_length=36, verbose_name="UUID ou PK de l'Objet")
+    # Propriétaire du colis concerné : périmètre de synchronisation d'un client
+    client = models.ForeignKey(Utilisateur, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                               related_name='+')
+    supprime = models.BooleanField(default=False, verbose_name="Supprimé (Tombstone)")
+    date_changement = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Changement Synchronisé"
+        verbose_name_plural = "Changements Synchronisés"
+        constraints = [
+            models.UniqueConstraint(fields=['type_objet', 'objet_id', 'client'], name='changement_objet_client_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['client', 'id'], name='changement_client_idx'),
+        ]
+
+
+# --- 8. Index de recherche des colis (plein texte et trigrammes du B/L) ---
+
+class ColisRecherche(models.Model):
+    """
+    Entrée d'index de recherche d'un colis. Son id sert de rowid à la table
+    plein texte SQLite (FTS5) `logistics_colis_fts` (description, nom du
+    client) ; `bl_normalise` est découpé en trigrammes (TrigrammeBL) pour la
+    recherche tolérante aux fautes. Maintenue à chaque écriture de Colis
+    (voir logistics/search.py) et reconstructible via `manage.py indexer_recherche`.
+    """
+    colis = models.OneToOneField(Colis, on_delete=models.CASCADE, related_name='recherche')
+    bl_normalise = models.CharField(max_length=150, db_index=True)
+
+    class Meta:
+        verbose_name = "Entrée de Recherche"
+        verbose_name_plural = "Entrées de Recherche"
+
+
+class TrigrammeBL(models.Model):
+    """Trigramme du numéro de B/L normalisé d'une entrée de recherche."""
+    trigramme = models.CharField(max_length=3)
+    entree = models.ForeignKey(ColisRecherche, on_delete=models.CASCADE, related_name='trigrammes')
+
+    class Meta:
+        verbose_name = "Trigramme de B/L"
+        verbose_name_plural = "Trigrammes de B/L"
+        constraints = [
+            models.UniqueConstraint(fields=['trigramme', 'entree'], name='trigramme_entree_unique'),
+        ]
+
+
+# --- 9. Instantanés de l'historique (rejeu des événements de suivi) ---
+
+class InstantaneColis(models.Model):
+    """
+    État d'un colis (statut, lieu de stockage) obtenu en rejouant son
+    historique SuiviStatut, le flux d'événements de référence, jusqu'à un
+    point donné. Le rejeu reprend à partir de l'instantané : seuls les suivis
+    insérés depuis (id > suivi_max) sont relus (voir logistics/evenements.py).
+    """
+    colis = models.OneToOneField(Colis, on_delete=models.CASCADE, primary_key=True, related_name='instantane')
+    statut = models.CharField(max_length=30, choices=Colis.STATUT_CHOICES)
+    lieu_stockage = models.CharField(max_length=100, blank=True)
+    # Dernier suivi rejoué dans l'ordre chronologique (date_heure, id) : un suivi inséré
+    # depuis mais daté d'avant (envoi tardif d'un terminal) impose un rejeu complet
+    dernier_suivi = models.BigIntegerField()
+    date_dernier_suivi = models.DateTimeField()
+    # Plus grand id de suivi rejoué : les suivis suivants n'ont pas encore été lus
+    suivi_max = models.BigIntegerField()
+    evenements = models.PositiveIntegerField(verbose_name="Événements Rejoués")
+    date_instantane = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Instantané de Colis"
+        verbose_name_plural = "Instantanés de Colis"
+
+
+# --- 10. Voyages (escales de navires) ---
+
+class Voyage(models.Model):
+    """
+    Escale d'un navire, à laquelle les colis de son manifeste sont rattachés.
+    Les compteurs (colis par statut, poids total, colis dédouanés) sont tenus
+    à jour par incréments à chaque changement (voir logistics/voyages.py) : le
+    résumé d'un voyage se lit sur sa seule ligne, sans parcourir ses colis.
+    """
+    # Compteur de chaque statut de colis
+    CHAMPS_STATUT = {statut: f'colis_{statut.lower()}' for statut, _ in Colis.STATUT_CHOICES}
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    navire = models.CharField(max_length=150, verbose_name="Navire")
+    numero_voyage = models.CharField(max_length=50, unique=True, verbose_name="Numéro de Voyage")
+    date_arrivee_prevue = models.DateTimeField(null=True, blank=True, verbose_name="Arrivée Prévue (ETA)")
+    date_creation = models.DateTimeField(auto_now_add=True)
+
+    colis_en_attente_decharge = models.IntegerField(default=0, editable=False)
+    colis_en_transit = models.IntegerField(default=0, editable=False)
+    colis_dedouanement = models.IntegerField(default=0, editable=False)
+    colis_pret_retrait = models.IntegerField(default=0, editable=False)
+    colis_livre = models.IntegerField(default=0, editable=False)
+    colis_litige = models.IntegerField(default=0, editable=False)
+    poids_total_kg = models.DecimalField(max_digits=16, decimal_places=3, default=0, editable=False,
+                                         verbose_name="Poids Total (kg)")
+    colis_dedouanes = models.IntegerField(default=0, editable=False, verbose_name="Colis Dédouanés")
+
+    class Meta:
+        verbose_name = "Voyage"
+        verbose_name_plural = "Voyages"
+        indexes = [
+            # Pagination keyset (date_creation, id)
+            models.Index(fields=['date_creation', 'id'], name='voyage_date_creation_idx'),
+        ]
 
     def __str__(self):
-        return f"Déclaration {self.numero_declaration} pour Colis {self.colis.id}"
\ No newline at end of file
+        return f"{self.navire} ({self.numero_voyage})"
+
+    @property
+    def colis_par_statut(self):
+        return {statut: getattr(self, champ) for statut, champ in self.CHAMPS_STATUT.items()}
+
+    @property
+    def nombre_colis(self):
+        return sum(getattr(self, champ) for champ in self.CHAMPS_STATUT.values())
@@ -0,0 +1,99 @@
+# logistics/read_models.py
+
+from decimal import Decimal
+
+from django.db.models import OuterRef, Subquery, Sum
+
+from payments.models import TransactionPaiement
+from .models import Colis, ColisResume, SuiviStatut
+
+CHAMPS_RESUME = [
+    'numero_bl', 'statut_actuel', 'lieu_stockage', 'poids_kg', 'date_arrivee', 'client', 'client_nom',
+    'derniere_localisation', 'dernier_agent_nom', 'date_dernier_suivi',
+    'facture_statut', 'declaration_statut', 'date_retrait', 'total_paye',
+]
+
+
+def calculer_resumes(colis_ids):
+    """Calcule (sans les enregistrer) les ColisResume des colis donnés, en deux requêtes."""
+    dernier_suivi = SuiviStatut.objects.filter(colis=OuterRef('pk')).order_by('-date_heure', '-pk')
+    total_paye = (
+        TransactionPaiement.objects.filter(colis=OuterRef('pk'), statut_paiement='REUSSI')
+        .values('colis').annotate(total=Sum('montant_total')).values('total')
+    )
+    colis_list = list(
+        Colis.objects.filter(pk__in=colis_ids)
+        .select_related('client', 'facture', 'declaration_douaniere', 'retrait_final')
+        .annotate(dernier_suivi_id=Subquery(dernier_suivi.values('pk')[:1]),
+                  total_paye=Subquery(total_paye))
+    )
+    suivis = SuiviStatut.objects.select_related('agent_operationnel').in_bulk(
+        [c.dernier_suivi_id for c in colis_list if c.dernier_suivi_id]
+    )
+
+    resumes = []
+    for colis in colis_list:
+        suivi = suivis.get(colis.dernier_suivi_id)
+        facture = getattr(colis, 'facture', None)
+        declaration = getattr(colis, 'declaration_douaniere', None)
+        retrait = getattr(colis, 'retrait_final', None)
+        agent = suivi.agent_operationnel if suivi else None
+        resumes.append(ColisResume(
+            colis_id=colis.pk,
+            numero_bl=colis.numero_bl,
+            statut_actuel=colis.statut_actuel,
+            lieu_stockage=colis.lieu_stockage,
+            poids_kg=colis.poids_kg,
+            date_arrivee=colis.date_arrivee,
+            client_id=colis.client_id,
+            client_nom=colis.client.get_full_name(),
+            derniere_localisation=suivi.localisation if suivi else '',
+            dernier_agent_nom=agent.get_full_name() if agent else '',
+            date_dernier_suivi=suivi.date_heure if suivi else None,
+            facture_statut=facture.statut if facture else '',
+            declaration_statut=declaration.statut if declaration else '',
+            date_retrait=retrait.date_heure_retrait if retrait else None,
+            total_paye=colis.total_paye or Decimal('0'),
+        ))
+    return resumes
+
+
+def synchroniser_resumes(colis_ids):
+    """
+    Recalcule et enregistre (upsert) les résumés des colis donnés.
+    Doit être appelé dans la transaction de l'écriture qui les modifie.
+    """
+    colis_ids = set(colis_ids)
+    if not colis_ids:
+        return []
+    return enregistrer_resumes(calculer_resumes(colis_ids))
+
+
+def enregistrer_resumes(resumes):
+    """Enregistre (upsert, une requête) des résumés calculés par calculer_resumes()."""
+    ColisResume.objects.bulk_create(
+        resumes, update_conflicts=True, unique_fields=['colis'], update_fields=CHAMPS_RESUME
+    )
+    return resumes
+
+
+def enregistrer_dernier_suivi(colis_ids, statut, localisation, agent):
+    """
+    Reporte sur les résumés un même suivi (le plus récent) ajouté à plusieurs
+    colis, en un UPDATE au lieu d'un recalcul complet ; les résumés absents
+    sont calculés. Doit être appelé dans la transaction de l'écriture.
+    """
+    colis_ids = set(colis_ids)
+    presents = set(ColisResume.objects.filter(colis_id__in=colis_ids).values_list('colis_id', flat=True))
+    dernier_suivi = SuiviStatut.objects.filter(colis=OuterRef('colis')).order_by('-date_heure', '-pk')
+    # La localisation devient le lieu de stockage (voir logistics.statuts.transitionner)
+    lieu_max = ColisResume._meta.get_field('lieu_stockage').max_length
+    valeurs = {'lieu_stockage': localisation[:lieu_max]} if localisation else {}
+    ColisResume.objects.filter(colis_id__in=presents).update(
+        **valeurs,
+        statut_actuel=statut,
+        derniere_localisation=localisation,
+        dernier_agent_nom=agent.get_full_name() if agent else '',
+        date_dernier_suivi=Subquery(dernier_suivi.values('date_heure')[:1]),
+    )
+    synchroniser_resumes(colis_ids - presents)
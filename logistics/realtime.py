@@ -0,0 +1,74 @@
+# logistics/realtime.py
+
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from transit.events import get_bus
+from transit.sse import FluxSSE, RequeteFluxInvalide
+from .models import Colis
+
+CHEMIN_FLUX_COLIS = '/api/v1/stream/colis/'
+
+
+def canal_colis(colis_id):
+    return f'colis:{colis_id}'
+
+
+def publier_colis(colis, evenement, **details):
+    """
+    Publie un changement du colis aux clients abonnés (voir FluxColis), une
+    fois la transaction de l'écriture validée.
+    """
+    message = _message(colis, evenement, details)
+    transaction.on_commit(lambda: get_bus().publier(canal_colis(colis.pk), message))
+
+
+def publier_colis_lot(colis_list, evenement, **details):
+    """Comme publier_colis pour un lot de colis : une seule publication groupée après validation."""
+    messages = [(canal_colis(colis.pk), _message(colis, evenement, details)) for colis in colis_list]
+    if messages:
+        transaction.on_commit(lambda: get_bus().publier_plusieurs(messages))
+
+
+def _message(colis, evenement, details):
+    return {
+        'colis': str(colis.pk),
+        'evenement': evenement,
+        'numero_bl': colis.numero_bl,
+        'statut_actuel': colis.statut_actuel,
+        'date': timezone.now().isoformat(),
+        **details,
+    }
+
+
+class FluxColis(FluxSSE):
+    """
+    GET /api/v1/stream/colis/?ids=<uuid>,<uuid>[&jeton=<JWT>] : flux SSE des
+    changements des colis donnés (suivi, retrait, dédouanement). Un client ne
+    peut suivre que ses propres colis ; le personnel peut suivre tous les colis.
+    Après une reconnexion, l'état courant se relit via colis/track-batch/.
+    """
+    colis_max = 50
+
+    async def canaux(self, utilisateur, parametres):
+        brut = ','.join(parametres.get('ids', []))
+        try:
+            ids = {uuid.UUID(valeur.strip()) for valeur in brut.split(',') if valeur.strip()}
+        except ValueError:
+            raise RequeteFluxInvalide("Paramètre 'ids' invalide : UUID de colis attendus.")
+        if not ids:
+            raise RequeteFluxInvalide("Fournir au moins un colis dans 'ids'.")
+        if len(ids) > self.colis_max:
+            raise RequeteFluxInvalide(f"Au plus {self.colis_max} colis par flux.")
+
+        colis = Colis.objects.filter(pk__in=ids)
+        if not utilisateur.is_staff:
+            colis = colis.filter(client=utilisateur)
+        trouves = await sync_to_async(lambda: set(colis.values_list('pk', flat=True)))()
+        if trouves != ids:
+            # Colis inexistant ou d'un autre client : indiscernables
+            raise RequeteFluxInvalide("Colis introuvable.", statut=404)
+        return [canal_colis(pk) for pk in ids]
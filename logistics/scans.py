@@ -0,0 +1,193 @@
+# logistics/scans.py
+
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Max, Q, Value, When
+from rest_framework.exceptions import ValidationError
+
+from .cache import invalider_suivi
+from .evenements import appliquer
+from .models import Colis, SuiviStatut
+from .read_models import synchroniser_resumes
+from .realtime import publier_colis_lot
+from .serializers import EvenementScanSerializer
+from .statuts import transition_autorisee
+from .sync import enregistrer_changements
+from .tasks import envoyer_notifications_statut
+from .voyages import reporter_statuts
+
+# Un même scan (colis, statut, localisation) répété dans cet intervalle n'est enregistré qu'une fois
+FENETRE_REPETITION = timedelta(minutes=2)
+
+
+def ingerer_scans(lignes, agent):
+    """
+    Enregistre un lot d'événements de scan des terminaux, lus par
+    transit.parsers.lire_ndjson ((numéro de ligne, objet, erreur)).
+
+    Les événements déjà reçus (`evenement_id` connu, ex: renvoi après perte
+    de réseau) et les scans répétés du même colis au même statut et au même
+    endroit dans FENETRE_REPETITION sont écartés. Les autres sont insérés
+    par bulk_create avec l'heure du scan. Les événements d'un colis plus
+    récents que son dernier suivi sont appliqués dans l'ordre des heures,
+    chacun depuis l'état laissé par le précédent et selon TRANSITIONS, comme
+    au rejeu de l'historique (logistics.evenements.appliquer) ; un envoi
+    tardif complète l'historique sans revenir en arrière.
+
+    Retourne un résultat par ligne, dans l'ordre : {'ligne', 'evenement_id',
+    'resultat'} où `resultat` vaut 'enregistre' (avec 'suivi' et 'applique'),
+    'deja_recu', 'repetition' ou 'rejete' (avec 'erreurs').
+    """
+    # Un seul sérialiseur pour tous les événements : ses champs ne sont construits qu'une fois
+    validateur = EvenementScanSerializer()
+    resultats, valides = [], []
+    for numero, donnees, erreur in lignes:
+        if donnees is None:
+            resultats.append({'ligne': numero, 'evenement_id': None, 'resultat': 'rejete',
+                              'erreurs': {'non_field_errors': [erreur]}})
+            continue
+        resultat = {'ligne': numero, 'evenement_id': donnees.get('evenement_id')}
+        try:
+            valides.append((len(resultats), validateur.run_validation(donnees)))
+        except ValidationError as e:
+            resultat.update(resultat='rejete', erreurs=e.detail)
+        resultats.append(resultat)
+
+    for tentative in range(2):
+        try:
+            with transaction.atomic():
+                etats = _enregistrer(valides, agent)
+        except IntegrityError:
+            # Même événement inséré entre-temps par un envoi concurrent : dédoublonnage refait une fois
+            if tentative:
+                raise
+        else:
+            break
+    for index, etat in etats.items():
+        resultats[index].update(etat)
+    return resultats
+
+
+def _enregistrer(valides, agent):
+    resultats = {}
+    recus = set(SuiviStatut.objects.filter(
+        evenement_id__in={donnees['evenement_id'] for _, donnees in valides}
+    ).values_list('evenement_id', flat=True))
+    colis_ids = {donnees['colis'] for _, donnees in valides if 'colis' in donnees}
+    numeros_bl = {donnees['numero_bl'] for _, donnees in valides if 'numero_bl' in donnees}
+    connus, numeros, lus, voyages = {}, {}, {}, {}
+    # Lignes verrouillées : les états lus sont ceux que l'UPDATE remplacera (compteurs des voyages)
+    for pk, numero_bl, statut_actuel, lieu_stockage, voyage_id in Colis.objects.filter(
+        Q(pk__in=colis_ids) | Q(numero_bl__in=numeros_bl)
+    ).select_for_update().values_list('pk', 'numero_bl', 'statut_actuel', 'lieu_stockage', 'voyage_id'):
+        connus[pk] = connus[numero_bl] = pk
+        numeros[pk], lus[pk], voyages[pk] = numero_bl, (statut_actuel, lieu_stockage), voyage_id
+
+    candidats = []
+    for index, donnees in valides:
+        if donnees['evenement_id'] in recus:
+            resultats[index] = {'resultat': 'deja_recu'}
+            continue
+        recus.add(donnees['evenement_id'])  # Doublon à l'intérieur du lot
+        colis_id = connus.get(donnees.get('colis', donnees.get('numero_bl')))
+        if colis_id is None:
+            resultats[index] = {'resultat': 'rejete', 'erreurs': {'non_field_errors': ["Colis introuvable."]}}
+            continue
+        candidats.append((index, colis_id, donnees))
+    if not candidats:
+        return resultats
+
+    # Répétitions : comparées aux scans connus autour des heures du lot, puis entre elles, dans l'ordre des heures
+    candidats.sort(key=lambda candidat: candidat[2]['date'])
+    vus = {}
+    for colis_id, statut, localisation, date_heure in SuiviStatut.objects.filter(
+        colis_id__in={colis_id for _, colis_id, _ in candidats},
+        date_heure__gt=candidats[0][2]['date'] - FENETRE_REPETITION,
+        date_heure__lt=candidats[-1][2]['date'] + FENETRE_REPETITION,
+    ).values_list('colis_id', 'statut', 'localisation', 'date_heure'):
+        insort(vus.setdefault((colis_id, statut, localisation), []), date_heure)
+    retenus = []
+    for index, colis_id, donnees in candidats:
+        dates = vus.setdefault((colis_id, donnees['statut'], donnees['localisation']), [])
+        date = donnees['date']
+        position = bisect_left(dates, date)
+        if ((position < len(dates) and dates[position] - date < FENETRE_REPETITION)
+                or (position and date - dates[position - 1] < FENETRE_REPETITION)):
+            resultats[index] = {'resultat': 'repetition'}
+            continue
+        dates.insert(position, date)
+        retenus.append((index, colis_id, donnees))
+
+    touches = {colis_id for _, colis_id, _ in retenus}
+    precedents = dict(
+        SuiviStatut.objects.filter(colis_id__in=touches).values('colis')
+        .annotate(derniere=Max('date_heure')).values_list('colis', 'derniere')
+    )
+    suivis = SuiviStatut.objects.bulk_create([
+        SuiviStatut(colis_id=colis_id, statut=donnees['statut'], localisation=donnees['localisation'],
+                    date_heure=donnees['date'], agent_operationnel=agent,
+                    evenement_id=donnees['evenement_id'], appareil=donnees['appareil'])
+        for _, colis_id, donnees in retenus
+    ])
+
+    # Événements plus récents que l'historique repliés par colis dans l'ordre des heures (retenus est
+    # trié), chacun depuis l'état laissé par le précédent ; l'historique est enregistré dans tous les cas
+    etats, appliques, derniers = dict(lus), set(), {}
+    for index, colis_id, donnees in retenus:
+        if colis_id in precedents and donnees['date'] <= precedents[colis_id]:
+            continue
+        statut, lieu_stockage = etats[colis_id]
+        if transition_autorisee(statut, donnees['statut']):
+            appliques.add(index)
+            derniers[colis_id] = donnees
+        etats[colis_id] = appliquer(statut, lieu_stockage, donnees['statut'], donnees['localisation'])
+    par_statut, par_lieu = {}, {}
+    for colis_id, (statut, lieu_stockage) in etats.items():
+        if statut != lus[colis_id][0]:
+            par_statut.setdefault((lus[colis_id][0], statut), []).append(colis_id)
+        if lieu_stockage != lus[colis_id][1]:
+            par_lieu.setdefault(lieu_stockage, []).append(colis_id)
+    # Un seul UPDATE : version incrémentée pour tous (historique imbriqué), statut et lieu repliés,
+    # le statut à condition d'être toujours celui lu (comme la clause WHERE de transitionner())
+    Colis.objects.filter(pk__in=touches).update(
+        statut_actuel=Case(
+            *(When(pk__in=ids, statut_actuel=ancien, then=Value(statut))
+              for (ancien, statut), ids in par_statut.items()),
+            default=F('statut_actuel'),
+        ),
+        lieu_stockage=Case(
+            *(When(pk__in=ids, then=Value(lieu)) for lieu, ids in par_lieu.items()),
+            default=F('lieu_stockage'),
+        ),
+    )
+
+    modifies = [colis_id for ids in par_statut.values() for colis_id in ids]
+    reporter_statuts(
+        {pk: (voyages[pk], lus[pk][0]) for pk in modifies if voyages[pk] is not None},
+        {pk: etats[pk][0] for pk in modifies},
+    )
+
+    # bulk_create n'émet pas post_save : dérivés mis à jour ici, en lot
+    synchroniser_resumes(touches)
+    enregistrer_changements(SuiviStatut, [suivi.pk for suivi in suivis])
+    invalider_suivi(*touches)
+    # Un avis par colis : son statut final, à la localisation du dernier événement appliqué
+    groupes = {}
+    for colis_id, donnees in derniers.items():
+        groupes.setdefault((etats[colis_id][0], donnees['localisation']), []).append(colis_id)
+    for (statut, localisation), ids in groupes.items():
+        publier_colis_lot(
+            [Colis(pk=pk, numero_bl=numeros[pk], statut_actuel=statut) for pk in ids],
+            'suivi', localisation=localisation,
+        )
+        ids_notifies = [str(pk) for pk in ids]
+        transaction.on_commit(
+            lambda ids_notifies=ids_notifies, statut=statut, localisation=localisation:
+            envoyer_notifications_statut.delay(ids_notifies, statut, localisation)
+        )
+
+    for (index, colis_id, donnees), suivi in zip(retenus, suivis):
+        resultats[index] = {'resultat': 'enregistre', 'suivi': suivi.pk, 'applique': index in appliques}
+    return resultats
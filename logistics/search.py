@@ -0,0 +1,165 @@
+# logistics/search.py
+
+import math
+import re
+
+from django.db import connection
+from django.db.models import Count, Q
+
+from .models import Colis, ColisRecherche, TrigrammeBL
+
+TABLE_FTS = 'logistics_colis_fts'
+# Part minimale des trigrammes de la requête présents dans un B/L candidat
+SEUIL_TRIGRAMMES = 0.5
+CANDIDATS_BL_MAX = 200
+# Constante de la fusion des classements (Reciprocal Rank Fusion)
+FUSION_K = 60
+
+# Confusions fréquentes de l'OCR et de la dictée sur les B/L
+_CONFUSIONS = str.maketrans({'O': '0', 'Q': '0', 'I': '1', 'L': '1'})
+_NON_ALPHANUMERIQUE = re.compile(r'[^0-9A-Z]')
+_MOTS = re.compile(r'\w+')
+
+
+def fts_disponible():
+    """La recherche plein texte utilise FTS5 : SQLite uniquement (repli LIKE ailleurs)."""
+    return connection.vendor == 'sqlite'
+
+
+def normaliser_bl(valeur):
+    """Majuscules, alphanumérique uniquement, confusions OCR unifiées : 'bl-0O1 gab' -> 'B1001GAB'."""
+    return _NON_ALPHANUMERIQUE.sub('', valeur.upper()).translate(_CONFUSIONS)
+
+
+def trigrammes(valeur):
+    """Trigrammes d'un B/L normalisé, bornés comme pg_trgm (deux espaces avant, un après)."""
+    borne = f'  {valeur} '
+    return {borne[i:i + 3] for i in range(len(borne) - 2)} if valeur else set()
+
+
+# --- Maintenance incrémentale (dans la transaction de l'écriture) ---
+
+def indexer_colis(colis_ids):
+    """Crée ou met à jour l'entrée de recherche (trigrammes + plein texte) des colis donnés."""
+    colis_ids = set(colis_ids)
+    if not colis_ids:
+        return
+    lignes = list(
+        Colis.objects.filter(pk__in=colis_ids)
+        .values_list('pk', 'numero_bl', 'description', 'client__prenoms', 'client__nom')
+    )
+    entrees = {e.colis_id: e for e in ColisRecherche.objects.filter(colis_id__in=colis_ids)}
+
+    nouvelles, modifiees = [], []
+    for pk, numero_bl, _, _, _ in lignes:
+        bl_normalise = normaliser_bl(numero_bl)
+        entree = entrees.get(pk)
+        if entree is None:
+            entree = entrees[pk] = ColisRecherche(colis_id=pk, bl_normalise=bl_normalise)
+            nouvelles.append(entree)
+        elif entree.bl_normalise != bl_normalise:
+            entree.bl_normalise = bl_normalise
+            modifiees.append(entree)
+    ColisRecherche.objects.bulk_create(nouvelles)
+    if modifiees:
+        ColisRecherche.objects.bulk_update(modifiees, ['bl_normalise'])
+        TrigrammeBL.objects.filter(entree__in=modifiees).delete()
+    # Une dizaine de trigrammes par B/L : insertion directe (executemany), sans instancier de modèle
+    lignes_trigrammes = [
+        (trigramme, entree.pk)
+        for entree in (*nouvelles, *modifiees)
+        for trigramme in sorted(trigrammes(entree.bl_normalise))
+    ]
+    if lignes_trigrammes:
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {TrigrammeBL._meta.db_table} (trigramme, entree_id) VALUES (%s, %s)", lignes_trigrammes
+            )
+
+    if fts_disponible() and lignes:
+        rowids = [entrees[pk].pk for pk, *_ in lignes]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {TABLE_FTS} WHERE rowid IN ({', '.join(['%s'] * len(rowids))})", rowids
+            )
+            cursor.executemany(
+                f"INSERT INTO {TABLE_FTS} (rowid, description, client) VALUES (%s, %s, %s)",
+                [(entrees[pk].pk, description, f"{prenoms or ''} {nom or ''}".strip())
+                 for pk, _, description, prenoms, nom in lignes],
+            )
+
+
+def desindexer_entree(entree_id):
+    """Retire une entrée de la table plein texte (les trigrammes suivent la cascade)."""
+    if fts_disponible():
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE_FTS} WHERE rowid = %s", [entree_id])
+
+
+# --- Recherche ---
+
+def _recherche_bl(requete):
+    """Colis dont le B/L ressemble à la requête, du plus au moins proche."""
+    bl = normaliser_bl(requete)
+    if len(bl) < 3:
+        # Trop court pour les trigrammes : préfixe exact sur le B/L normalisé (index)
+        if not bl:
+            return []
+        return list(
+            ColisRecherche.objects.filter(bl_normalise__gte=bl, bl_normalise__lt=bl + '\U0010ffff')
+            .order_by('bl_normalise').values_list('colis_id', flat=True)[:CANDIDATS_BL_MAX]
+        )
+
+    cherches = trigrammes(bl)
+    candidats = (
+        TrigrammeBL.objects.filter(trigramme__in=cherches)
+        .values('entree').annotate(communs=Count('id'))
+        .filter(communs__gte=math.ceil(len(cherches) * SEUIL_TRIGRAMMES))
+        .order_by('-communs')[:CANDIDATS_BL_MAX]
+    )
+    communs = {c['entree']: c['communs'] for c in candidats}
+    scores = []
+    for entree_id, colis_id, bl_normalise in ColisRecherche.objects.filter(pk__in=communs).values_list(
+        'pk', 'colis_id', 'bl_normalise'
+    ):
+        n = communs[entree_id]
+        # Part de la requête retrouvée (préfixes, fautes), puis similarité globale (départage)
+        similarite = n / (len(cherches) + len(trigrammes(bl_normalise)) - n)
+        scores.append((n / len(cherches), similarite, colis_id))
+    scores.sort(key=lambda s: (s[0], s[1]), reverse=True)
+    return [colis_id for _, _, colis_id in scores]
+
+
+def _recherche_texte(requete, limite):
+    """Colis dont la description ou le nom du client contient les mots (ou leurs préfixes)."""
+    mots = _MOTS.findall(requete.lower())
+    if not mots:
+        return []
+    if not fts_disponible():
+        filtre = Q()
+        for mot in mots:
+            filtre &= Q(description__icontains=mot) | Q(client__nom__icontains=mot) | Q(client__prenoms__icontains=mot)
+        return list(Colis.objects.filter(filtre).order_by('-date_arrivee').values_list('pk', flat=True)[:limite])
+
+    # Chaque mot est cherché comme préfixe ; les mots sont combinés en ET, classement BM25
+    expression = ' '.join(f'"{mot}"*' for mot in mots)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT r.colis_id FROM {TABLE_FTS} f JOIN {ColisRecherche._meta.db_table} r ON r.id = f.rowid "
+            f"WHERE {TABLE_FTS} MATCH %s ORDER BY bm25({TABLE_FTS}) LIMIT %s",
+            [expression, limite],
+        )
+        return [Colis._meta.pk.to_python(ligne[0]) for ligne in cursor.fetchall()]
+
+
+def rechercher_colis(requete, limite=20):
+    """
+    Retourne [(colis_id, pertinence)] : classement du B/L (trigrammes,
+    tolérant aux fautes) et classement plein texte (description, client)
+    fusionnés par rangs réciproques.
+    """
+    scores = {}
+    for classement in (_recherche_bl(requete)[:limite * 2], _recherche_texte(requete, limite * 2)):
+        for rang, colis_id in enumerate(classement, start=1):
+            scores[colis_id] = scores.get(colis_id, 0) + 1 / (FUSION_K + rang)
+    return sorted(scores.items(), key=lambda s: s[1], reverse=True)[:limite]
@@ -1,47 +1,63 @@
 # logistics/serializers.py
 
+from datetime import timedelta
+
+from django.db import models
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Colis, SuiviStatut, RetraitColis, Facture, DeclarationDouaniere
+from .models import Colis, SuiviStatut, RetraitColis, Facture, DeclarationDouaniere, ColisResume, Voyage
 from users.models import Utilisateur, Role, Permission
 from users.serializers import ClientMinimalSerializer
+from transit.fragments import FragmentCacheListSerializer
+from transit.sparse import SparseFieldsetMixin
 
-class SuiviStatutSerializer(serializers.ModelSerializer):
+class SuiviStatutSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Sérielizeur pour l'historique de statut."""
     agent_operationnel_name = serializers.CharField(source='agent_operationnel.get_full_name', read_only=True)
     
     class Meta:
         model = SuiviStatut
         fields = '__all__'
-        read_only_fields = ('date_heure',)
+        read_only_fields = ('date_heure', 'evenement_id', 'appareil')
+        expandable_fields = {'agent_operationnel': (ClientMinimalSerializer, {})}
 
-class ColisSerializer(serializers.ModelSerializer):
-    """Sérielizeur pour l'entité Colis."""
-    client_name = serializers.CharField(source='client.get_full_name', read_only=True)
-    # Pour afficher l'historique lors de la consultation d'un Colis
-    historique_statuts = SuiviStatutSerializer(many=True, read_only=True) 
-    
-    # Ajoutez ou modifiez le constructeur pour accepter 'fields'
-    def __init__(self, *args, **kwargs):
-        # Ne pas appeler la méthode __init__ de la classe de base (serializers.Field) 
-        # car c'est là que l'erreur 'fields' se produit
-        
-        # Récupérer l'argument 'fields' si passé
-        fields = kwargs.pop('fields', None)
+# Nombre de suivis imbriqués dans un colis (détail, liste, suivi) ; l'historique
+# complet est paginé sur colis/{id}/timeline/
+HISTORIQUE_IMBRIQUE_MAX = 10
+
+
+class DerniersElementsListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer limité aux `limite` premiers éléments (dans l'ordre du modèle).
+    Avec un Prefetch déjà limité (voir transit.fastpath.limiter_par_parent),
+    aucune requête n'est ajoutée.
+    """
 
-        # Appeler la méthode __init__ de la classe parent (ModelSerializer)
+    def __init__(self, *args, limite, **kwargs):
+        self.limite = limite
         super().__init__(*args, **kwargs)
 
-        if fields is not None:
-            # Drop any fields that are not specified in the 'fields' argument.
-            allowed = set(fields)
-            existing = set(self.fields)
-            for field_name in existing - allowed:
-                self.fields.pop(field_name)
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        return super().to_representation(iterable[:self.limite])
+
+
+class ColisSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Sérielizeur pour l'entité Colis (accepte les kwargs 'fields' et 'expand')."""
+    client_name = serializers.CharField(source='client.get_full_name', read_only=True)
+    # Pour afficher l'historique (les plus récents) lors de la consultation d'un Colis
+    historique_statuts = DerniersElementsListSerializer(
+        child=SuiviStatutSerializer(), limite=HISTORIQUE_IMBRIQUE_MAX, read_only=True
+    )
 
     class Meta:
         model = Colis
         fields = '__all__'
         read_only_fields = ('id', 'date_arrivee', 'statut_actuel', 'historique_statuts')
+        expandable_fields = {'client': (ClientMinimalSerializer, {})}
+        # Cache de fragments : l'historique et le nom du client incrémentent la version du colis
+        list_serializer_class = FragmentCacheListSerializer
+        fragment_version_fields = ('version',)
         
 class ColisMinimalSerializer(serializers.ModelSerializer):
     client = ClientMinimalSerializer(read_only=True)
@@ -83,7 +99,7 @@ class RetraitColisCreateSerializer(serializers.ModelSerializer):
 
 # --- SÉRIALISEUR POUR L'AFFICHAGE DÉTAILLÉ (GET) ---
 # Ceci est votre ancien RetraitColisSerializer, mais renommé ou modifié pour la clarté.
-class RetraitColisSerializer(serializers.ModelSerializer):
+class RetraitColisSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Sérielizeur pour l'affichage détaillé (GET) d'un RetraitColis."""
     colis_details = ColisMinimalSerializer(source='colis', read_only=True)
     agent_details = AgentValidationMinimalSerializer(source='agent_validation', read_only=True)
@@ -118,7 +134,7 @@ class FileUploadSerializer(serializers.Serializer):
 # ... (Assurez-vous que l'import de Utilisateur est là : from users.models import Utilisateur, ...)
 
 # --- Sérielseurs pour les Factures ---
-class FactureSerializer(serializers.ModelSerializer):
+class FactureSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Sérialiseur standard pour la gestion des Factures."""
     # Affichage minimal du colis lié
     colis_minimal = ColisMinimalSerializer(source='colis', read_only=True)
@@ -127,9 +143,12 @@ class FactureSerializer(serializers.ModelSerializer):
         model = Facture
         fields = '__all__'
         read_only_fields = ('date_emission', 'date_paiement',) # Date de paiement sera mise à jour via une action
+        # colis_minimal dépend aussi de la version du colis
+        list_serializer_class = FragmentCacheListSerializer
+        fragment_version_fields = ('version', 'colis__version')
 
 # --- Sérielseurs pour les Déclarations Douanières ---
-class DeclarationDouaniereSerializer(serializers.ModelSerializer):
+class DeclarationDouaniereSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Sérialiseur standard pour la gestion des Déclarations Douanières."""
     # L'ID du douanier est envoyé en écriture (PrimaryKey)
     # Les détails du douanier sont affichés en lecture seule
@@ -144,4 +163,150 @@ class DeclarationDouaniereSerializer(serializers.ModelSerializer):
         """Validation pour s'assurer que l'utilisateur lié est bien un Douanier."""
         if not value.role or value.role.nom != 'Douanier':
             raise serializers.ValidationError("L'utilisateur spécifié doit avoir le rôle 'Douanier'.")
-        return value
\ No newline at end of file
+        return value
+
+
+# --- Sérialiseur du résumé dénormalisé (écrans de liste) ---
+class ColisResumeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """Lecture seule du modèle de lecture ColisResume (une seule table, aucune jointure)."""
+    id = serializers.UUIDField(source='colis_id', read_only=True)
+
+    class Meta:
+        model = ColisResume
+        exclude = ('colis',)
+
+
+# --- Mise à jour de statut en masse (suivi-statuts/bulk/) ---
+class SuiviStatutLotSerializer(serializers.Serializer):
+    """Un statut et une localisation appliqués à une liste de colis (`colis`) ou à un filtre (`filtre`)."""
+    # Filtres acceptés et validation de leur valeur
+    FILTRES = {
+        'statut_actuel': serializers.ChoiceField(choices=Colis.STATUT_CHOICES),
+        'lieu_stockage': serializers.CharField(max_length=100),
+        'client': serializers.UUIDField(),
+        'numero_bl__startswith': serializers.CharField(),
+    }
+
+    colis = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=False)
+    filtre = serializers.DictField(child=serializers.CharField(), required=False, allow_empty=False)
+    statut = serializers.ChoiceField(choices=Colis.STATUT_CHOICES)
+    localisation = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate_filtre(self, value):
+        inconnus = set(value) - set(self.FILTRES)
+        if inconnus:
+            raise serializers.ValidationError(
+                f"Filtres non pris en charge : {', '.join(sorted(inconnus))} (autorisés : {', '.join(self.FILTRES)})."
+            )
+        filtre, erreurs = {}, {}
+        for nom, valeur in value.items():
+            try:
+                filtre[nom] = self.FILTRES[nom].run_validation(valeur)
+            except serializers.ValidationError as e:
+                erreurs[nom] = e.detail
+        if erreurs:
+            raise serializers.ValidationError(erreurs)
+        return filtre
+
+    def validate(self, attrs):
+        if ('colis' in attrs) == ('filtre' in attrs):
+            raise serializers.ValidationError("Fournir soit 'colis' (liste d'IDs), soit 'filtre'.")
+        return attrs
+
+
+# --- Import de manifeste (colis/import/, manage.py importer_manifeste) ---
+class ManifesteLigneSerializer(serializers.Serializer):
+    """
+    Une ligne de manifeste. Le client est désigné par `client_email` ou
+    `client_telephone`, résolus dans `context['clients']` (voir
+    logistics.manifestes.annuaire_clients) sans requête par ligne.
+    """
+    numero_bl = serializers.CharField(max_length=150)
+    description = serializers.CharField()
+    poids_kg = serializers.DecimalField(max_digits=10, decimal_places=3, min_value=0)
+    dimensions = serializers.CharField(max_length=200, required=False, allow_blank=True, default='')
+    lieu_stockage = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    client_email = serializers.CharField(required=False, allow_blank=True, write_only=True)
+    client_telephone = serializers.CharField(required=False, allow_blank=True, write_only=True)
+
+    def validate(self, attrs):
+        from .manifestes import normaliser_telephone
+
+        clients = self.context['clients']
+        email = attrs.pop('client_email', '').strip().lower()
+        telephone = normaliser_telephone(attrs.pop('client_telephone', ''))
+        if not email and not telephone:
+            raise serializers.ValidationError("Indiquer 'client_email' ou 'client_telephone'.")
+        client_id = clients.get(('email', email)) if email else None
+        if client_id is None and telephone:
+            client_id = clients.get(('telephone', telephone))
+        if client_id is None:
+            raise serializers.ValidationError("Client introuvable (email ou téléphone inconnu).")
+        attrs['client_id'] = client_id
+        return attrs
+
+
+# --- Scans des terminaux (suivi-statuts/scans/) ---
+class EvenementScanSerializer(serializers.Serializer):
+    """
+    Un scan de terminal : `evenement_id` unique attribué par le terminal, le
+    colis par son ID (`colis`) ou son B/L (`numero_bl`), et `date`, l'heure
+    du scan sur le terminal (l'envoi peut être très postérieur).
+    """
+    # Décalage toléré de l'horloge des terminaux
+    AVANCE_MAX = timedelta(minutes=5)
+
+    evenement_id = serializers.CharField(max_length=64)
+    colis = serializers.UUIDField(required=False)
+    numero_bl = serializers.CharField(max_length=150, required=False)
+    statut = serializers.ChoiceField(choices=Colis.STATUT_CHOICES)
+    localisation = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    date = serializers.DateTimeField()
+    appareil = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+
+    def validate_date(self, value):
+        if value > timezone.now() + self.AVANCE_MAX:
+            raise serializers.ValidationError("Date de scan dans le futur (horloge du terminal ?).")
+        return value
+
+    def validate(self, attrs):
+        if ('colis' in attrs) == ('numero_bl' in attrs):
+            raise serializers.ValidationError("Fournir soit 'colis' (ID), soit 'numero_bl'.")
+        return attrs
+
+
+# --- Voyages (voyages/) ---
+class VoyageSerializer(serializers.ModelSerializer):
+    """Voyage et ses compteurs, lus sur sa seule ligne (tenus à jour par logistics.voyages)."""
+    nombre_colis = serializers.IntegerField(read_only=True)
+    colis_par_statut = serializers.DictField(child=serializers.IntegerField(), read_only=True)
+
+    class Meta:
+        model = Voyage
+        fields = (
+            'id', 'navire', 'numero_voyage', 'date_arrivee_prevue', 'date_creation',
+            'nombre_colis', 'colis_par_statut', 'poids_total_kg', 'colis_dedouanes',
+        )
+        read_only_fields = ('date_creation', 'poids_total_kg', 'colis_dedouanes')
+
+
+class ColisVoyageSerializer(serializers.ModelSerializer):
+    """Colis de la liste d'un voyage : colonnes de la table des colis seulement (aucune jointure)."""
+
+    class Meta:
+        model = Colis
+        fields = ('id', 'numero_bl', 'description', 'poids_kg', 'statut_actuel', 'lieu_stockage', 'client',
+                  'date_arrivee')
+
+
+class StatutVoyageSerializer(serializers.Serializer):
+    """Un statut appliqué à tous les colis d'un voyage, éventuellement restreints à un statut actuel."""
+    statut = serializers.ChoiceField(choices=Colis.STATUT_CHOICES)
+    localisation = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+    notes = serializers.CharField(required=False, allow_blank=True, default='')
+    statut_actuel = serializers.ChoiceField(choices=Colis.STATUT_CHOICES, required=False)
+
+
+class RattachementVoyageSerializer(serializers.Serializer):
+    colis = serializers.ListField(child=serializers.UUIDField(), allow_empty=False)
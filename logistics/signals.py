@@ -0,0 +1,252 @@
+# logistics/signals.py
+
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from users.models import Utilisateur
+from .cache import invalider_suivi
+from .models import (
+    Colis, ColisRecherche, ColisResume, InstantaneColis, SuiviStatut, RetraitColis, Facture, DeclarationDouaniere,
+    lignes_modifiees,
+)
+from .read_models import synchroniser_resumes
+from .search import desindexer_entree, indexer_colis
+from .sync import enregistrer_changements
+from .voyages import Compteurs, compter_dedouanement
+
+
+def suppression_en_cascade(sender, instance, origin):
+    """
+    Vrai si la ligne est supprimée par cascade depuis un autre objet
+    (ex: suppression du colis) : le résumé disparaît alors avec le colis.
+    """
+    return origin is not instance and getattr(origin, 'model', None) is not sender
+
+
+# --- Maintien du résumé dénormalisé (ColisResume) ---
+
+@receiver(post_save, sender=Colis)
+def colis_enregistre(sender, instance, raw=False, **kwargs):
+    if not raw:
+        synchroniser_resumes([instance.pk])
+
+
+@receiver(post_save, sender=SuiviStatut)
+@receiver(post_save, sender=RetraitColis)
+@receiver(post_save, sender=Facture)
+@receiver(post_save, sender=DeclarationDouaniere)
+def rattache_au_colis_enregistre(sender, instance, raw=False, **kwargs):
+    if not raw:
+        synchroniser_resumes([instance.colis_id])
+
+
+@receiver(post_delete, sender=SuiviStatut)
+@receiver(post_delete, sender=RetraitColis)
+@receiver(post_delete, sender=Facture)
+@receiver(post_delete, sender=DeclarationDouaniere)
+def rattache_au_colis_supprime(sender, instance, origin=None, **kwargs):
+    if not suppression_en_cascade(sender, instance, origin):
+        synchroniser_resumes([instance.colis_id])
+
+
+@receiver(pre_save, sender=Utilisateur)
+def utilisateur_avant_enregistrement(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Ex: la mise à jour de last_login à la connexion ne touche pas au nom
+    if update_fields is not None and not {'nom', 'prenoms'} & set(update_fields):
+        return
+    if not raw and not instance._state.adding:
+        instance._nom_precedent = Utilisateur.objects.filter(pk=instance.pk).values_list('prenoms', 'nom').first()
+
+
+@receiver(post_save, sender=Utilisateur)
+def utilisateur_enregistre(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    nom_precedent = instance.__dict__.pop('_nom_precedent', None)
+    if nom_precedent is None or nom_precedent == (instance.prenoms, instance.nom):
+        return
+    ColisResume.objects.filter(client=instance).update(client_nom=instance.get_full_name())
+    # Le nom du client et celui de l'agent des suivis imbriqués font partie de la
+    # représentation du colis (ETag, fragments en cache)
+    Colis.objects.filter(
+        Q(client=instance) | Q(pk__in=SuiviStatut.objects.filter(agent_operationnel=instance).values('colis_id'))
+    ).toucher()
+
+
+# --- Version du colis parent (ETag, fragments en cache) ---
+# L'historique est imbriqué dans le colis : toute écriture unitaire, vues comme admin
+
+@receiver(post_save, sender=SuiviStatut)
+def suivi_enregistre_a_versionner(sender, instance, raw=False, **kwargs):
+    # Un suivi créé après changer_statut() (statuts.creer_suivi) suit un colis déjà incrémenté
+    colis_a_jour = instance.__dict__.pop('_colis_a_jour', False)
+    if not raw and not colis_a_jour:
+        Colis.objects.filter(pk=instance.colis_id).toucher()
+
+
+@receiver(post_delete, sender=SuiviStatut)
+def suivi_supprime_a_versionner(sender, instance, origin=None, **kwargs):
+    if not suppression_en_cascade(sender, instance, origin):
+        Colis.objects.filter(pk=instance.colis_id).toucher()
+
+
+# --- Journal des changements (synchronisation mobile) ---
+
+@receiver(post_save, sender=Colis)
+@receiver(post_save, sender=SuiviStatut)
+@receiver(post_save, sender=Facture)
+@receiver(post_save, sender=DeclarationDouaniere)
+def changement_enregistre(sender, instance, raw=False, **kwargs):
+    if not raw:
+        enregistrer_changements(sender, [instance.pk])
+
+
+@receiver(post_delete, sender=Colis)
+@receiver(post_delete, sender=SuiviStatut)
+@receiver(post_delete, sender=Facture)
+@receiver(post_delete, sender=DeclarationDouaniere)
+def changement_supprime(sender, instance, **kwargs):
+    # Y compris par cascade : chaque objet supprimé reçoit son tombstone
+    enregistrer_changements(sender, [instance.pk], supprime=True)
+
+
+@receiver(lignes_modifiees, sender=Colis)
+@receiver(lignes_modifiees, sender=Facture)
+@receiver(lignes_modifiees, sender=DeclarationDouaniere)
+def changements_en_masse(sender, pks, **kwargs):
+    enregistrer_changements(sender, pks)
+
+
+# --- Cache du suivi public (colis/track/) ---
+# Toute écriture unitaire, vues comme admin ; les écritures en masse invalident elles-mêmes
+
+@receiver(post_save, sender=Colis)
+@receiver(post_delete, sender=Colis)
+def colis_suivi_a_invalider(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalider_suivi(instance.pk)
+
+
+@receiver(post_save, sender=SuiviStatut)
+def suivi_enregistre_a_invalider(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalider_suivi(instance.colis_id)
+
+
+@receiver(post_delete, sender=SuiviStatut)
+def suivi_supprime_a_invalider(sender, instance, origin=None, **kwargs):
+    if not suppression_en_cascade(sender, instance, origin):
+        invalider_suivi(instance.colis_id)
+
+
+# --- Instantanés de l'historique (logistics.evenements) ---
+
+@receiver(post_save, sender=SuiviStatut)
+def suivi_modifie(sender, instance, created=False, raw=False, **kwargs):
+    # Un suivi ajouté est lu au prochain rejeu ; un suivi déjà rejoué qui change invalide l'instantané
+    if not created and not raw:
+        InstantaneColis.objects.filter(colis_id=instance.colis_id).delete()
+
+
+@receiver(post_delete, sender=SuiviStatut)
+def suivi_supprime(sender, instance, origin=None, **kwargs):
+    if not suppression_en_cascade(sender, instance, origin):
+        InstantaneColis.objects.filter(colis_id=instance.colis_id).delete()
+
+
+# --- Compteurs des voyages (logistics.voyages) ---
+# Les écritures en masse (transitionner, scans, import, rattachement) les tiennent à jour elles-mêmes
+
+CHAMPS_COMPTES = frozenset({'voyage', 'voyage_id', 'statut_actuel', 'poids_kg'})
+
+
+@receiver(pre_save, sender=Colis)
+def colis_avant_enregistrement(sender, instance, raw=False, update_fields=None, **kwargs):
+    if update_fields is not None and not CHAMPS_COMPTES & set(update_fields):
+        return
+    if not raw and not instance._state.adding:
+        instance._compte_precedent = Colis.objects.filter(pk=instance.pk).values_list(
+            'voyage_id', 'statut_actuel', 'poids_kg'
+        ).first()
+
+
+@receiver(post_save, sender=Colis)
+def colis_a_compter(sender, instance, created=False, raw=False, **kwargs):
+    precedent = instance.__dict__.pop('_compte_precedent', None)
+    if raw:
+        return
+    actuel = (instance.voyage_id, instance.statut_actuel, instance.poids_kg)
+    if created:
+        precedent = (None, None, None)
+    if precedent is None or (precedent[0] is None and actuel[0] is None) or precedent == actuel:
+        return
+    voyage_id, statut, poids_kg = precedent
+    # Le dédouanement ne suit le colis que s'il change de voyage
+    dedouane = voyage_id != instance.voyage_id and not created and DeclarationDouaniere.objects.filter(
+        colis_id=instance.pk, statut='CLEARED'
+    ).exists()
+    compteurs = Compteurs()
+    compteurs.colis(voyage_id, statut, poids_kg, dedouane, signe=-1)
+    compteurs.colis(*actuel, dedouane)
+    compteurs.appliquer()
+
+
+@receiver(post_delete, sender=Colis)
+def colis_a_decompter(sender, instance, **kwargs):
+    # Le dédouanement est décompté par la suppression (en cascade, avant le colis) de la déclaration
+    compteurs = Compteurs()
+    compteurs.colis(instance.voyage_id, instance.statut_actuel, instance.poids_kg, signe=-1)
+    compteurs.appliquer()
+
+
+@receiver(pre_save, sender=DeclarationDouaniere)
+def declaration_avant_enregistrement(sender, instance, raw=False, **kwargs):
+    if not raw and not instance._state.adding:
+        instance._compte_precedent = DeclarationDouaniere.objects.filter(pk=instance.pk).values_list(
+            'colis_id', 'statut'
+        ).first()
+
+
+@receiver(post_save, sender=DeclarationDouaniere)
+def declaration_a_compter(sender, instance, raw=False, **kwargs):
+    colis_id, statut = instance.__dict__.pop('_compte_precedent', None) or (None, None)
+    if raw or ((statut == 'CLEARED') == (instance.statut == 'CLEARED') and colis_id in (None, instance.colis_id)):
+        return
+    if statut == 'CLEARED':
+        compter_dedouanement(colis_id, signe=-1)
+    if instance.statut == 'CLEARED':
+        compter_dedouanement(instance.colis_id)
+
+
+@receiver(post_delete, sender=DeclarationDouaniere)
+def declaration_a_decompter(sender, instance, **kwargs):
+    if instance.statut == 'CLEARED':
+        compter_dedouanement(instance.colis_id, signe=-1)
+
+
+# --- Index de recherche des colis ---
+
+# Colonnes du colis lues par l'index ; un simple toucher() (ex: renommage du client) réindexe aussi
+CHAMPS_INDEXES = frozenset({'numero_bl', 'description', 'client', 'client_id'})
+CHAMPS_VERSION = frozenset({'version', 'date_modification'})
+
+
+@receiver(post_save, sender=Colis)
+def colis_a_indexer(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Ex: save(update_fields=['statut_actuel']) ne touche pas à l'index
+    if raw or (update_fields is not None and not CHAMPS_INDEXES & set(update_fields)):
+        return
+    indexer_colis([instance.pk])
+
+
+@receiver(lignes_modifiees, sender=Colis)
+def colis_a_reindexer(sender, pks, champs=None, **kwargs):
+    # Ex: renommage du client (toucher()) ou mise à jour en masse ; un changement
+    # de statut seul (suivi-statuts/bulk/) ne touche pas à l'index
+    if champs is not None and champs - CHAMPS_VERSION and not champs & CHAMPS_INDEXES:
+        return
+    indexer_colis(pks)
+
+
+@receiver(post_delete, sender=ColisRecherche)
+def entree_recherche_supprimee(sender, instance, **kwargs):
+    desindexer_entree(instance.pk)
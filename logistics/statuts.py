@@ -0,0 +1,189 @@
+# logistics/statuts.py
+
+import uuid
+
+from django.db import connections, transaction
+from django.db.models import F, sql
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .cache import invalider_suivi
+from .models import Colis, SuiviStatut, lignes_modifiees
+from .read_models import enregistrer_dernier_suivi
+from .realtime import publier_colis_lot
+from .sync import enregistrer_changements
+from .tasks import envoyer_notifications_statut
+from .voyages import lire_statuts, reporter_statuts
+
+
+# --- Machine à états du statut des colis ---
+
+# Statuts atteignables depuis chaque statut. Rester dans le même statut (nouvelle
+# localisation) est permis, sauf une fois livré ; un litige peut survenir à tout
+# moment et sa résolution ramène le colis à n'importe quelle étape.
+TRANSITIONS = {
+    'EN_ATTENTE_DECHARGE': {'EN_ATTENTE_DECHARGE', 'EN_TRANSIT', 'DEDOUANEMENT', 'PRET_RETRAIT', 'LITIGE'},
+    'EN_TRANSIT': {'EN_TRANSIT', 'DEDOUANEMENT', 'PRET_RETRAIT', 'LITIGE'},
+    'DEDOUANEMENT': {'DEDOUANEMENT', 'PRET_RETRAIT', 'LITIGE'},
+    'PRET_RETRAIT': {'PRET_RETRAIT', 'LIVRE', 'LITIGE'},
+    'LIVRE': {'LITIGE'},
+    'LITIGE': {'LITIGE', 'EN_ATTENTE_DECHARGE', 'EN_TRANSIT', 'DEDOUANEMENT', 'PRET_RETRAIT', 'LIVRE'},
+}
+# Statuts depuis lesquels chaque statut peut être atteint (clause WHERE de la transition)
+SOURCES = {
+    cible: sorted(source for source, cibles in TRANSITIONS.items() if cible in cibles)
+    for cible, _ in Colis.STATUT_CHOICES
+}
+# La localisation d'un suivi devient le lieu de stockage du colis (tronquée à la taille du champ)
+LIEU_MAX = Colis._meta.get_field('lieu_stockage').max_length
+
+
+class TransitionInvalide(APIException):
+    """Changement de statut refusé par TRANSITIONS (ou statut modifié entre-temps) : 409."""
+    status_code = status.HTTP_409_CONFLICT
+    default_code = 'transition_invalide'
+
+    def __init__(self, statut_actuel, statut):
+        self.statut_actuel = statut_actuel
+        self.statut = statut
+        super().__init__(f"Transition de statut non autorisée : {statut_actuel} -> {statut}.")
+
+
+def transition_autorisee(statut_actuel, statut):
+    return statut in TRANSITIONS.get(statut_actuel, ())
+
+
+def update_returning_disponible(alias='default'):
+    """UPDATE ... RETURNING : PostgreSQL et SQLite >= 3.35 (repli SELECT FOR UPDATE ailleurs)."""
+    connexion = connections[alias]
+    return connexion.vendor == 'postgresql' or (
+        connexion.vendor == 'sqlite' and connexion.Database.sqlite_version_info >= (3, 35)
+    )
+
+
+def transitionner(queryset, statut, localisation=''):
+    """
+    Passe au statut `statut` les colis de `queryset` dont le statut actuel le
+    permet, en un seul UPDATE conditionnel (WHERE statut_actuel IN SOURCES)
+    qui incrémente aussi la version : deux agents concurrents ne peuvent pas
+    écraser mutuellement leurs changements. Seuls les colis rattachés à un
+    voyage sont lus au préalable (verrouillés), pour reporter le statut quitté
+    sur les compteurs du voyage (voir logistics.voyages). Une `localisation`
+    devient le lieu de stockage, comme au rejeu de l'historique (voir
+    logistics.evenements). Retourne les (pk, numero_bl) des colis modifiés.
+    """
+    queryset = queryset.filter(statut_actuel__in=SOURCES[statut])
+    valeurs = {'statut_actuel': statut, 'version': F('version') + 1, 'date_modification': timezone.now()}
+    if localisation:
+        valeurs['lieu_stockage'] = localisation[:LIEU_MAX]
+    with transaction.atomic(using=queryset.db):
+        # Statuts quittés par les colis rattachés à un voyage (lignes verrouillées), pour ses compteurs
+        avant = lire_statuts(queryset)
+        lignes = _mettre_a_jour(queryset, valeurs)
+        reporter_statuts(avant, {pk: statut for pk, _ in lignes})
+    return lignes
+
+
+def _mettre_a_jour(queryset, valeurs):
+    if not update_returning_disponible(queryset.db):
+        lignes = list(queryset.select_for_update().values_list('pk', 'numero_bl'))
+        # VersionedQuerySet.update() émet lui-même lignes_modifiees
+        Colis.objects.filter(pk__in=[pk for pk, _ in lignes]).update(**valeurs)
+        return lignes
+
+    requete = queryset.query.chain(sql.UpdateQuery)
+    requete.add_update_values(valeurs)
+    compilateur = requete.get_compiler(queryset.db)
+    compilateur.pre_sql_setup()
+    texte, parametres = compilateur.as_sql()
+    connexion = connections[queryset.db]
+    nom = connexion.ops.quote_name
+    with connexion.cursor() as cursor:
+        cursor.execute(f"{texte} RETURNING {nom(Colis._meta.pk.column)}, {nom('numero_bl')}", parametres)
+        lignes = [(Colis._meta.pk.to_python(pk), numero_bl) for pk, numero_bl in cursor.fetchall()]
+    if lignes:
+        # Comme VersionedQuerySet.update() : journal de synchronisation (l'index n'est pas concerné)
+        lignes_modifiees.send(sender=Colis, pks=[pk for pk, _ in lignes], champs=frozenset(valeurs))
+    return lignes
+
+
+def changer_statut(colis_id, statut, localisation=''):
+    """
+    Transition d'un colis (voir transitionner). Retourne un Colis partiel (pk,
+    numero_bl, statut_actuel) pour la publication ; lève Http404 si le colis
+    n'existe pas, TransitionInvalide si son statut actuel l'interdit.
+    """
+    lignes = transitionner(Colis.objects.filter(pk=colis_id), statut, localisation)
+    if not lignes:
+        statut_actuel = Colis.objects.filter(pk=colis_id).values_list('statut_actuel', flat=True).first()
+        if statut_actuel is None:
+            raise Http404
+        raise TransitionInvalide(statut_actuel, statut)
+    return Colis(pk=colis_id, numero_bl=lignes[0][1], statut_actuel=statut)
+
+
+def creer_suivi(**champs):
+    """
+    Enregistre le SuiviStatut d'une transition faite par changer_statut() : le
+    colis a déjà changé de version, son post_save ne l'incrémente pas une
+    seconde fois (voir logistics.signals).
+    """
+    suivi = SuiviStatut(**champs)
+    suivi._colis_a_jour = True
+    suivi.save()
+    return suivi
+
+
+def appliquer_statut_en_masse(references, statut, localisation, agent, notes=''):
+    """
+    Applique `statut` aux colis `references` (IDs) en quelques requêtes :
+    statut_actuel par un seul UPDATE conditionnel (voir transitionner),
+    historique par bulk_create, résumés, journal de synchronisation et cache
+    de suivi mis à jour en lot, puis une seule tâche de notification après
+    validation.
+
+    Doit être appelé dans une transaction. Retourne un résultat par
+    référence, dans l'ordre : {'colis', 'succes', 'suivi' | 'erreur'}.
+    """
+    ids = {}
+    for reference in references:
+        try:
+            ids[reference] = uuid.UUID(str(reference))
+        except ValueError:
+            pass
+    # Statuts lus pour expliquer les refus ; c'est l'UPDATE conditionnel qui décide
+    actuels = dict(Colis.objects.filter(pk__in=set(ids.values())).values_list('pk', 'statut_actuel'))
+    existants = dict(transitionner(Colis.objects.filter(pk__in=actuels), statut, localisation)) if actuels else {}
+
+    suivis = SuiviStatut.objects.bulk_create([
+        SuiviStatut(colis_id=pk, statut=statut, localisation=localisation, notes=notes, agent_operationnel=agent)
+        for pk in existants
+    ])
+    if existants:
+        # bulk_create n'émet pas post_save : dérivés mis à jour ici, en lot
+        enregistrer_changements(SuiviStatut, [suivi.pk for suivi in suivis])
+        enregistrer_dernier_suivi(existants, statut, localisation, agent)
+        invalider_suivi(*existants)
+        publier_colis_lot(
+            [Colis(pk=pk, numero_bl=numero_bl, statut_actuel=statut) for pk, numero_bl in existants.items()],
+            'suivi', localisation=localisation,
+        )
+        ids_notifies = [str(pk) for pk in existants]
+        transaction.on_commit(lambda: envoyer_notifications_statut.delay(ids_notifies, statut, localisation))
+
+    suivi_par_colis = {suivi.colis_id: suivi.pk for suivi in suivis}
+    resultats = []
+    for reference in references:
+        pk = ids.get(reference)
+        if pk is None:
+            resultats.append({'colis': reference, 'succes': False, 'erreur': "Identifiant invalide."})
+        elif pk not in actuels:
+            resultats.append({'colis': reference, 'succes': False, 'erreur': "Colis introuvable."})
+        elif pk not in existants:
+            resultats.append({'colis': reference, 'succes': False,
+                              'erreur': str(TransitionInvalide(actuels[pk], statut).detail)})
+        else:
+            resultats.append({'colis': reference, 'succes': True, 'suivi': suivi_par_colis[pk]})
+    return resultats
@@ -0,0 +1,121 @@
+# logistics/sync.py
+
+import base64
+import json
+
+from .models import ChangementSync, Colis, SuiviStatut, Facture, DeclarationDouaniere
+
+# Type d'objet synchronisé -> (modèle, chemin vers le client propriétaire)
+SOURCES_SYNC = {
+    'colis': (Colis, 'client'),
+    'suivi': (SuiviStatut, 'colis__client'),
+    'facture': (Facture, 'colis__client'),
+    'declaration': (DeclarationDouaniere, 'colis__client'),
+}
+TYPES_SYNC = {model: type_objet for type_objet, (model, _) in SOURCES_SYNC.items()}
+
+
+class JetonInvalide(ValueError):
+    """Jeton de synchronisation illisible."""
+
+
+def enregistrer_changements(model, ids, supprime=False):
+    """
+    Enregistre (ou renumérote) le changement des objets donnés.
+    Doit être appelé dans la transaction de l'écriture qui les modifie.
+
+    Un objet passé à un autre client (ex: colis réattribué) reçoit un
+    tombstone pour son ancien propriétaire, dont les appareils le retirent ;
+    l'historique, la facture et la déclaration d'un colis le suivent.
+    """
+    type_objet = TYPES_SYNC[model]
+    ids = {str(pk) for pk in ids}
+    if not ids:
+        return
+    existants = list(
+        ChangementSync.objects.filter(type_objet=type_objet, objet_id__in=ids)
+        .values_list('id', 'objet_id', 'client', 'supprime')
+    )
+    # Propriétaire(s) du dernier changement de chaque objet
+    proprietaires = {}
+    for _, objet_id, client, est_supprime in existants:
+        if not est_supprime:
+            proprietaires.setdefault(objet_id, set()).add(client)
+
+    lignes, transferes = [], set()
+    if supprime:
+        # L'objet n'existe plus : tombstone pour le propriétaire de son dernier changement
+        for pk in sorted(ids):
+            lignes.extend((pk, client, True) for client in sorted(proprietaires.get(pk) or {None}, key=str))
+    else:
+        chemin_client = SOURCES_SYNC[type_objet][1]
+        clients = {
+            str(pk): client for pk, client in model.objects.filter(pk__in=ids).values_list('pk', chemin_client)
+        }
+        for pk in sorted(ids):
+            client = clients.get(pk)
+            anciens = proprietaires.get(pk, set()) - {client}
+            if anciens:
+                transferes.add(pk)
+            # Tombstones avant la nouvelle ligne : qui voit les deux (personnel) finit sur l'objet à jour
+            lignes.extend((pk, ancien, True) for ancien in sorted(anciens, key=str))
+            lignes.append((pk, client, False))
+
+    # Une ligne par objet et par client : les lignes remplacées le sont par des lignes d'id plus grand.
+    # Les tombstones des propriétaires précédents restent tant que rien ne les remplace.
+    remplacees = {(pk, client) for pk, client, _ in lignes}
+    ChangementSync.objects.filter(id__in=[
+        id_ for id_, objet_id, client, est_supprime in existants
+        if not est_supprime or (objet_id, client) in remplacees
+    ]).delete()
+    ChangementSync.objects.bulk_create([
+        ChangementSync(type_objet=type_objet, objet_id=pk, client_id=client, supprime=est_supprime)
+        for pk, client, est_supprime in lignes
+    ])
+
+    if model is Colis and transferes:
+        # Historique, facture et déclaration suivent le colis chez son nouveau propriétaire
+        for type_enfant in ('suivi', 'facture', 'declaration'):
+            enfant = SOURCES_SYNC[type_enfant][0]
+            enregistrer_changements(
+                enfant, enfant.objects.filter(colis_id__in=transferes).values_list('pk', flat=True)
+            )
+
+
+def encoder_jeton(dernier_id):
+    return base64.urlsafe_b64encode(json.dumps({'c': dernier_id}).encode()).decode()
+
+
+def decoder_jeton(jeton):
+    """Retourne l'id du dernier changement transmis (0 sans jeton : synchronisation complète)."""
+    if not jeton:
+        return 0
+    try:
+        dernier_id = json.loads(base64.urlsafe_b64decode(jeton.encode()).decode())['c']
+    except (TypeError, ValueError, KeyError):
+        raise JetonInvalide(jeton)
+    if not isinstance(dernier_id, int) or dernier_id < 0:
+        raise JetonInvalide(jeton)
+    return dernier_id
+
+
+def lire_changements(utilisateur, jeton, limite):
+    """
+    Retourne (changements, nouveau jeton, suite) : au plus `limite` changements
+    postérieurs au jeton, dans l'ordre, limités aux colis du client (tous les
+    colis pour le personnel).
+
+    Note : l'ordre des ids suppose des écritures sérialisées (cas de SQLite) ;
+    sur une base à écritures concurrentes, une transaction longue peut valider
+    un id inférieur à un jeton déjà transmis.
+    """
+    dernier_id = decoder_jeton(jeton)
+    changements = ChangementSync.objects.filter(id__gt=dernier_id).order_by('id')
+    if not utilisateur.is_staff:
+        changements = changements.filter(client=utilisateur)
+    changements = list(changements.values('id', 'type_objet', 'objet_id', 'supprime')[:limite + 1])
+    suite = len(changements) > limite
+    changements = changements[:limite]
+    if changements:
+        dernier_id = changements[-1]['id']
+    return changements, encoder_jeton(dernier_id), suite
@@ -1,8 +1,9 @@
 # logistics/tasks.py
 
 from celery import shared_task
-from django.core.mail import send_mail
+from django.core.mail import send_mail, send_mass_mail
 from users.models import Utilisateur
+from .models import Colis
 from django.conf import settings
 
 @shared_task
@@ -40,4 +41,26 @@ def envoyer_alerte_securite(user_id, action, ip_address):
         send_mail(sujet, message, settings.EMAIL_HOST_USER, list(admin_emails), fail_silently=False)
         return f"Alerte sécurité envoyée à {len(admin_emails)} admins."
     except Utilisateur.DoesNotExist:
-        return "Utilisateur d'alerte non trouvé."
\ No newline at end of file
+        return "Utilisateur d'alerte non trouvé."
+
+@shared_task
+def envoyer_notifications_statut(colis_ids, statut, localisation):
+    """
+    Notifie en une seule tâche (et une seule connexion SMTP) les clients des
+    colis mis à jour en masse (voir logistics.statuts).
+    """
+    libelle = dict(Colis.STATUT_CHOICES).get(statut, statut)
+    messages = [
+        (
+            f"PPPI : Mise à jour de votre colis #{colis_id}",
+            f"Le statut de votre colis ({numero_bl}) a été mis à jour.\nNouveau statut : {libelle}\n"
+            f"Localisation : {localisation}",
+            settings.EMAIL_HOST_USER,
+            [email],
+        )
+        for colis_id, numero_bl, email in Colis.objects.filter(pk__in=colis_ids)
+        .values_list('pk', 'numero_bl', 'client__email')
+        if email
+    ]
+    envoyes = send_mass_mail(messages, fail_silently=True)
+    return f"{envoyes} email(s) de mise à jour envoyé(s) sur {len(colis_ids)} colis."
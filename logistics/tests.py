@@ -1,3 +1,1978 @@
-from django.test import TestCase
+import asyncio
+import collections
+import hashlib
+import importlib
+import io
+import json
+import threading
+import time
+import uuid
+import zlib
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from audit.models import JournalAudit
+from payments.models import TransactionPaiement
+from transit import cache as transit_cache, idempotence
+from transit.pagination import KeysetPagination
+from users.models import Role, Utilisateur
+from . import evenements
+from .models import (
+    Colis, SuiviStatut, RetraitColis, Facture, DeclarationDouaniere, ColisResume, ChangementSync, InstantaneColis,
+    Voyage,
+)
+from .read_models import calculer_resumes, synchroniser_resumes, CHAMPS_RESUME
+from .serializers import HISTORIQUE_IMBRIQUE_MAX
+from .sync import enregistrer_changements
+from .voyages import recompter_voyages
+
+
+# --- Jeu de données volumineux partagé par les tests ---
+
+def creer_utilisateurs():
+    """Crée un client, un agent portuaire et un douanier."""
+    role_douanier, _ = Role.objects.get_or_create(nom_role='Douanier')
+    client = Utilisateur.objects.create_user(
+        email='client@transit241.com', password='x', nom='Client', prenoms='Test', telephone='+24101000001'
+    )
+    agent = Utilisateur.objects.create_user(
+        email='agent@transit241.com', password='x', nom='Agent', prenoms='Port', telephone='+24101000002',
+        is_staff=True,
+    )
+    douanier = Utilisateur.objects.create_user(
+        email='douanier@transit241.com', password='x', nom='Douanier', prenoms='Test', telephone='+24101000003',
+        role=role_douanier,
+    )
+    return client, agent, douanier
+
+
+def creer_colis(nombre, client, agent, douanier, prefixe='BL'):
+    """Crée `nombre` colis avec historique, facture, déclaration, retrait, transactions et audit."""
+    debut = Colis.objects.count()
+    colis_list = Colis.objects.bulk_create([
+        Colis(
+            numero_bl=f"{prefixe}{debut + i:06d}GAB",
+            description=f"Marchandise générale n°{debut + i}",
+            poids_kg=Decimal('1250.500'),
+            client=client,
+            lieu_stockage='Zone A',
+        )
+        for i in range(nombre)
+    ])
+    SuiviStatut.objects.bulk_create([
+        SuiviStatut(colis=colis, statut=statut, localisation='Zone A', agent_operationnel=agent)
+        for colis in colis_list
+        for statut in ('EN_ATTENTE_DECHARGE', 'EN_TRANSIT', 'DEDOUANEMENT')
+    ])
+    Facture.objects.bulk_create([
+        Facture(colis=colis, montant_total=Decimal('150000.00')) for colis in colis_list
+    ])
+    DeclarationDouaniere.objects.bulk_create([
+        DeclarationDouaniere(colis=colis, douanier=douanier, numero_declaration=f"DEC-{colis.numero_bl}")
+        for colis in colis_list
+    ])
+    RetraitColis.objects.bulk_create([
+        RetraitColis(colis=colis, agent_validation=agent, preuve_identite_url='https://example.com/id',
+                     signature_client='SignatureB64')
+        for colis in colis_list[::2]
+    ])
+    TransactionPaiement.objects.bulk_create([
+        TransactionPaiement(colis=colis, utilisateur_payeur=client, montant_ht=Decimal('1000.00'),
+                            montant_total=Decimal('1192.50'), type_frais=type_frais)
+        for colis in colis_list
+        for type_frais in ('MANUTENTION', 'STOCKAGE')
+    ])
+    JournalAudit.objects.bulk_create([
+        JournalAudit(utilisateur=agent, action_type='MODIF_STATUT', ressource_affectee='Colis',
+                     ressource_id=str(colis.id), adresse_ip='10.0.0.5')
+        for colis in colis_list
+    ])
+    return colis_list
+
+
+# --- 1. Budgets de requêtes SQL des endpoints de liste ---
+
+# Nombre maximal de requêtes SQL autorisé par endpoint de liste, quel que soit
+# le nombre de lignes (l'authentification est forcée dans les tests).
+# Les endpoints à GET conditionnel ont une requête de plus (marqueurs de version).
+QUERY_BUDGETS = {
+    'colis-list': 3,            # marqueurs, colis + client, historique + agents
+    'suivi-statut-list': 1,     # suivis + agent
+    'retrait-list': 1,          # retraits + colis + client + agent
+    'facture-list': 2,          # marqueurs, factures + colis + client
+    'declaration-list': 2,      # marqueurs, déclarations + douanier
+    'transaction-list': 1,
+    'audit-log-list': 1,
+}
+
+
+class ListQueryBudgetTests(APITestCase):
+    """Vérifie que le nombre de requêtes des listes reste constant quand le volume augmente."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        creer_colis(5, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def compter_requetes(self, url_name):
+        with CaptureQueriesContext(connection) as contexte:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(contexte.captured_queries)
+
+    def test_budgets_respectes_sur_gros_volume(self):
+        petits = {nom: self.compter_requetes(nom) for nom in QUERY_BUDGETS}
+        creer_colis(150, self.client_user, self.agent, self.douanier, prefixe='BLX')
+
+        for nom, budget in QUERY_BUDGETS.items():
+            with self.subTest(endpoint=nom):
+                requetes = self.compter_requetes(nom)
+                self.assertLessEqual(requetes, budget)
+                self.assertEqual(requetes, petits[nom])
+
+
+# --- 2. Pagination keyset ---
+
+class KeysetPaginationTests(APITestCase):
+    """Parcours complet des colis par curseur, sans COUNT(*) ni doublon."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        # bulk_create : beaucoup de colis partagent la même date_arrivee
+        cls.colis = creer_colis(25, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def test_parcours_aller_retour(self):
+        url = reverse('colis-list') + '?page_size=10'
+        vus, pages = [], []
+        while url:
+            with CaptureQueriesContext(connection) as contexte:
+                response = self.client.get(url)
+            self.assertFalse(any('COUNT(' in q['sql'] for q in contexte.captured_queries))
+            pages.append(response.data)
+            vus.extend(item['id'] for item in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(len(vus), 25)
+        self.assertEqual(set(vus), {str(c.id) for c in self.colis})
+
+        # Retour à la page précédente depuis la dernière page
+        precedente = self.client.get(pages[-1]['previous']).data
+        self.assertEqual([i['id'] for i in precedente['results']], [i['id'] for i in pages[1]['results']])
+
+    def test_taille_de_page_plafonnee(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 10):
+            response = self.client.get(reverse('colis-list') + '?page_size=100000')
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_curseur_invalide(self):
+        response = self.client.get(reverse('colis-list') + '?cursor=pas-un-curseur')
+        self.assertEqual(response.status_code, 404)
+
+
+# --- 3. Cache du suivi (colis/track/) ---
+
+CACHES_MEMOIRE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-local'},
+}
+
+
+@override_settings(CACHES=CACHES_MEMOIRE)
+class TrackCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis = creer_colis(1, cls.client_user, cls.agent, cls.douanier)[0]
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['local'].clear()
+        self.client.force_authenticate(user=self.agent)
+        self.url = reverse('colis-track-colis') + f'?id={self.colis.id}'
+
+    def test_lecture_traversante_et_invalidation(self):
+        premiere = self.client.get(self.url).data
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).data, premiere)
+
+        with mock.patch('logistics.views.envoyer_notifications_statut.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('suivi-statut-list'), {
+                'colis': str(self.colis.id), 'statut': 'PRET_RETRAIT', 'localisation': 'Zone B',
+            })
+        self.assertEqual(response.status_code, 201)
+
+        apres = self.client.get(self.url).data
+        self.assertEqual(apres['statut_actuel'], 'PRET_RETRAIT')
+        self.assertEqual(len(apres['historique_statuts']), 4)
+
+    def test_invalidation_hors_des_vues(self):
+        # Écritures unitaires de l'admin (ou du shell) : invalidées par les signaux
+        self.client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            colis = Colis.objects.get(pk=self.colis.pk)
+            colis.description = 'Modifié dans l\'admin'
+            colis.save()
+        self.assertEqual(self.client.get(self.url).data['description'], 'Modifié dans l\'admin')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            SuiviStatut.objects.filter(colis=self.colis).first().delete()
+        self.assertEqual(len(self.client.get(self.url).data['historique_statuts']), 2)
+
+    def test_reconstruction_commencee_avant_une_ecriture(self):
+        from .views import ColisViewSet
+
+        construire = ColisViewSet._construire_suivi
+
+        def construire_pendant_une_ecriture(vue, colis_id):
+            payload = construire(vue, colis_id)
+            # Écriture validée (et invalidée) entre la lecture en base et la mise en cache
+            with self.captureOnCommitCallbacks(execute=True):
+                colis = Colis.objects.get(pk=colis_id)
+                colis.description = 'Après écriture'
+                colis.save()
+            return payload
+
+        with mock.patch.object(ColisViewSet, '_construire_suivi', construire_pendant_une_ecriture):
+            self.assertNotEqual(self.client.get(self.url).data['description'], 'Après écriture')
+        # Le payload périmé est rangé sous l'ancienne génération : jamais relu
+        self.assertEqual(self.client.get(self.url).data['description'], 'Après écriture')
+
+    def test_id_invalide(self):
+        self.assertEqual(self.client.get(reverse('colis-track-colis') + '?id=abc').status_code, 404)
+
+    def test_meute_reduite_a_une_reconstruction(self):
+        appels = []
+
+        def construire():
+            appels.append(1)
+            time.sleep(0.2)
+            return {'ok': True}
+
+        resultats = []
+        threads = [
+            threading.Thread(target=lambda: resultats.append(transit_cache.lecture_cache('cle-meute', construire)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(appels), 1)
+        self.assertEqual(resultats, [{'ok': True}] * 8)
+
+    def test_attente_hors_du_verrou_local(self):
+        def rayure(cle):
+            return zlib.crc32(cle.encode()) % len(transit_cache._VERROUS_LOCAUX)
+
+        voisine = next(cle for cle in (f'voisine-{i}' for i in range(10000)) if rayure(cle) == rayure('occupee'))
+        # Reconstruction de 'occupee' en cours dans un autre processus
+        transit_cache.cache.add('occupee:verrou', 1, 10)
+        with mock.patch('transit.cache.ATTENTE_MAX', 1):
+            attente = threading.Thread(target=transit_cache.lecture_cache, args=('occupee', lambda: 'tard'))
+            attente.start()
+            time.sleep(0.1)
+            debut = time.monotonic()
+            # Même rayure de verrous locaux : non bloquée par l'attente
+            self.assertEqual(transit_cache.lecture_cache(voisine, lambda: 'vite'), 'vite')
+            self.assertLess(time.monotonic() - debut, 0.5)
+            attente.join()
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:1/0'},
+    'local': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-secours'},
+})
+class CacheResilientTests(TestCase):
+
+    def test_repli_sur_cache_local(self):
+        cache = transit_cache.CacheResilient()
+        cache.set('cle', 'valeur')
+        self.assertEqual(cache.get('cle'), 'valeur')
+        self.assertEqual(caches['local'].get('cle'), 'valeur')
+
+
+# --- 4. GET conditionnels (ETag / Last-Modified) ---
+
+class ConditionalGetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis = creer_colis(3, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def test_detail_304_sans_serialisation(self):
+        url = reverse('colis-detail', args=[self.colis[0].pk])
+        response = self.client.get(url)
+        etag = response['ETag']
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        # Une action d'admin (queryset.update) invalide l'ETag
+        Colis.objects.filter(pk=self.colis[0].pk).update(lieu_stockage='Zone C')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_suivi_modifie_hors_des_vues_et_if_modified_since(self):
+        url = reverse('colis-detail', args=[self.colis[0].pk])
+        Colis.objects.filter(pk=self.colis[0].pk).update(date_modification=timezone.now() - timezone.timedelta(minutes=1))
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        # Suivi modifié par l'ORM (admin, shell) : l'historique imbriqué change, l'ETag aussi
+        suivi = SuiviStatut.objects.filter(colis=self.colis[0]).first()
+        suivi.notes = 'Corrigé depuis l\'admin'
+        suivi.save()
+        modifie = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(modifie.status_code, 200)
+        self.assertNotEqual(modifie['ETag'], response['ETag'])
+        # Modifié dans la seconde en cours : pas de Last-Modified, If-Modified-Since ignoré (pas de faux 304)
+        self.assertNotIn('Last-Modified', modifie)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 200)
+
+        suivi.delete()
+        self.assertNotEqual(self.client.get(url)['ETag'], modifie['ETag'])
+
+    def test_liste_304_sans_last_modified(self):
+        url = reverse('facture-list')
+        response = self.client.get(url)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertNotIn('Last-Modified', response)
+
+        with self.assertNumQueries(1):
+            response_304 = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response_304.status_code, 304)
+        # Une suppression ne change aucune date : If-Modified-Since n'est pas honoré sur une liste
+        futur = 'Fri, 01 Jan 2100 00:00:00 GMT'
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=futur).status_code, 200)
+
+        # La facture imbrique le colis : modifier le colis change l'ETag de la liste
+        colis = Colis.objects.get(pk=self.colis[1].pk)
+        colis.description = 'Nouvelle description'
+        colis.save()
+        self.assertEqual(colis.version, 2)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+    def test_detail_inexistant(self):
+        self.assertEqual(self.client.get(reverse('colis-detail', args=['inconnu'])).status_code, 404)
+
+
+# --- 5. Résumé dénormalisé des colis ---
+
+def resume_en_dict(resume):
+    return {champ: getattr(resume, champ if champ != 'client' else 'client_id') for champ in CHAMPS_RESUME}
+
+
+class ColisResumeTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis = creer_colis(3, cls.client_user, cls.agent, cls.douanier)
+        synchroniser_resumes([c.pk for c in cls.colis])
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def test_maintenu_par_les_ecritures(self):
+        colis = self.colis[1]  # sans retrait
+        with mock.patch('logistics.views.envoyer_notifications_statut.delay'):
+            self.client.post(reverse('suivi-statut-list'), {
+                'colis': str(colis.pk), 'statut': 'PRET_RETRAIT', 'localisation': 'Magasin 4',
+            })
+        self.client.post(reverse('facture-mark-paid', args=[colis.facture.pk]))
+        self.client.post(reverse('transaction-list'), {
+            'colis': str(colis.pk), 'montant_ht': '100.00', 'montant_total': '119.25',
+            'type_frais': 'DOUANE', 'statut_paiement': 'REUSSI',
+        })
+
+        resume = ColisResume.objects.get(pk=colis.pk)
+        self.assertEqual(resume.statut_actuel, 'PRET_RETRAIT')
+        self.assertEqual(resume.derniere_localisation, 'Magasin 4')
+        self.assertEqual(resume.dernier_agent_nom, 'Port Agent')
+        self.assertEqual(resume.facture_statut, 'PAID')
+        self.assertEqual(resume.total_paye, Decimal('119.25'))
+        self.assertIsNone(resume.date_retrait)
+
+        # Renommer le client met à jour le nom dénormalisé
+        self.client_user.nom = 'Renommé'
+        self.client_user.save()
+        self.assertEqual(ColisResume.objects.get(pk=colis.pk).client_nom, 'Test Renommé')
+
+        # L'état incrémental est identique à un recalcul complet
+        self.assertEqual(resume_en_dict(ColisResume.objects.get(pk=colis.pk)),
+                         resume_en_dict(calculer_resumes([colis.pk])[0]))
+
+    def test_creation_et_suppression_du_colis(self):
+        response = self.client.post(reverse('colis-list'), {
+            'numero_bl': 'BLNEW001', 'description': 'Pièces détachées', 'poids_kg': '12.500',
+            'client': str(self.client_user.pk),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ColisResume.objects.get(pk=response.data['id']).client_nom, 'Test Client')
+
+        self.assertEqual(self.client.delete(reverse('colis-detail', args=[response.data['id']])).status_code, 204)
+        self.assertFalse(ColisResume.objects.filter(pk=response.data['id']).exists())
+
+    def test_liste_et_tableau_de_bord_monotable(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('colis-resume') + '?statut=EN_ATTENTE_DECHARGE')
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['results'][0]['client_nom'], 'Test Client')
+
+        data = self.client.get(reverse('colis-tableau-de-bord')).data
+        self.assertEqual(data['total_colis'], 3)
+        self.assertEqual(data['colis_par_statut']['EN_ATTENTE_DECHARGE'], 3)
+        self.assertEqual(data['factures_par_statut'], {'PENDING': 3})
+
+        url = reverse('colis-resume')
+        self.assertEqual(len(self.client.get(url, {'client': str(self.client_user.pk)}).data['results']), 3)
+        self.assertEqual(self.client.get(url, {'client': 'abc'}).status_code, 400)
+
+
+class ReconstruireResumesCommandTests(TransactionTestCase):
+
+    def test_reconstruction_parallele(self):
+        client_user, agent, douanier = creer_utilisateurs()
+        colis = creer_colis(7, client_user, agent, douanier)
+        call_command('reconstruire_resumes', '--taille-lot', '3', '--workers', '2', '--vider', stdout=mock.Mock())
+        self.assertEqual(ColisResume.objects.count(), 7)
+        self.assertEqual(ColisResume.objects.get(pk=colis[0].pk).date_retrait,
+                         RetraitColis.objects.get(colis=colis[0]).date_heure_retrait)
+
+
+# --- 6. Champs clairsemés (?fields=) et dépliage (?expand=) ---
+
+class SparseFieldsetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        creer_colis(4, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def lister(self, url):
+        with CaptureQueriesContext(connection) as contexte:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results'], [q['sql'] for q in contexte.captured_queries]
+
+    def test_colonnes_poussees_dans_la_requete(self):
+        resultats, requetes = self.lister(reverse('colis-list') + '?fields=id,numero_bl,client_name')
+        self.assertEqual(set(resultats[0]), {'id', 'numero_bl', 'client_name'})
+        self.assertEqual(resultats[0]['client_name'], 'Test Client')
+        # marqueurs ETag + une requête jointe, sans lecture de la description ni de l'historique
+        self.assertEqual(len(requetes), 2)
+        self.assertNotIn('"description"', requetes[1])
+        self.assertNotIn('suivistatut', requetes[1])
+
+    def test_colonne_lourde_du_retrait_non_lue(self):
+        resultats, requetes = self.lister(reverse('retrait-list') + '?fields=id,colis,date_heure_retrait')
+        self.assertEqual(set(resultats[0]), {'id', 'colis', 'date_heure_retrait'})
+        self.assertEqual(len(requetes), 1)
+        self.assertNotIn('signature_client', requetes[0])
+
+    def test_expand(self):
+        resultats, requetes = self.lister(reverse('colis-list') + '?fields=id,client&expand=client')
+        self.assertEqual(resultats[0]['client']['full_name'], 'Test Client')
+        self.assertEqual(len(requetes), 2)
+
+        # Sans ?expand, le client reste une clé primaire
+        resultats, _ = self.lister(reverse('colis-list') + '?fields=id,client')
+        self.assertEqual(resultats[0]['client'], self.client_user.pk)
+
+    def test_serialiseurs_imbriques_sans_n_plus_un(self):
+        # Relations jointes lues en entier : pas de requête par ligne pour colis_details / colis_minimal
+        for url, nombre in (
+            (reverse('retrait-list') + '?fields=id,colis_details&page_size=20', 1),
+            (reverse('facture-list') + '?fields=id,colis_minimal', 2),
+            (reverse('transaction-list') + '?expand=colis', 1),
+        ):
+            with self.subTest(url=url), self.assertNumQueries(nombre):
+                self.assertEqual(self.client.get(url).status_code, 200)
+        resultats, _ = self.lister(reverse('retrait-list') + '?fields=id,colis_details')
+        self.assertEqual(resultats[0]['colis_details']['client']['full_name'], 'Test Client')
+        resultats, _ = self.lister(reverse('transaction-list') + '?expand=colis')
+        self.assertIn('numero_bl', resultats[0]['colis'])
+
+
+# --- 7. Chemin de lecture rapide (values_list + constructeurs précompilés) ---
+
+@override_settings(CACHES=CACHES_MEMOIRE)
+class FastReadEquivalenceTests(APITestCase):
+    """Le chemin rapide doit produire exactement le même JSON que les sérialiseurs DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis_list = creer_colis(7, cls.client_user, cls.agent, cls.douanier)
+        # Suivi sans agent : agent_operationnel_name est absent de la sortie DRF
+        SuiviStatut.objects.create(colis=cls.colis_list[0], statut='ARRIVE_ENTREPOT', agent_operationnel=None)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_authenticate(user=self.agent)
+
+    def comparer(self, url):
+        """Compare les octets des deux chemins et renvoie la réponse rapide."""
+        from .views import ColisViewSet, SuiviStatutViewSet
+
+        rapide = self.client.get(url)
+        # Les deux chemins partagent le cache de fragments
+        caches['default'].clear()
+        with mock.patch.object(ColisViewSet, 'fast_read', False), \
+                mock.patch.object(SuiviStatutViewSet, 'fast_read', False):
+            lent = self.client.get(url)
+        self.assertEqual(rapide.status_code, 200)
+        self.assertEqual(rapide.content, lent.content)
+        return rapide
+
+    def test_listes_identiques(self):
+        for url in (
+            reverse('colis-list') + '?page_size=3',
+            reverse('colis-list') + '?fields=id,client_name,historique_statuts',
+            reverse('colis-list') + '?fields=id,poids_kg,client&expand=client',
+            reverse('suivi-statut-list'),
+            reverse('suivi-statut-list') + '?expand=agent_operationnel',
+        ):
+            with self.subTest(url=url):
+                response = self.comparer(url)
+                # Les pages suivantes passent aussi par le chemin rapide
+                if response.data.get('next'):
+                    self.comparer(response.data['next'])
+
+    def test_suivi_identique(self):
+        response = self.comparer(reverse('colis-track-colis') + f'?id={self.colis_list[0].id}')
+        self.assertEqual(len(response.data['historique_statuts']), 4)
+        self.assertNotIn('agent_operationnel_name', response.data['historique_statuts'][0])
+
+    def test_sans_instanciation_de_modeles(self):
+        with mock.patch.object(Colis, '__init__', side_effect=AssertionError), \
+                mock.patch.object(SuiviStatut, '__init__', side_effect=AssertionError):
+            self.assertEqual(self.client.get(reverse('colis-list')).status_code, 200)
+            self.assertEqual(self.client.get(reverse('suivi-statut-list')).status_code, 200)
+
+    def test_constructeurs_en_nombre_borne(self):
+        from transit import fastpath
+        champs = ('id', 'numero_bl', 'description', 'poids_kg', 'statut_actuel', 'lieu_stockage')
+        with mock.patch.object(fastpath, 'CONSTRUCTEURS_MAX', 4), \
+                mock.patch.object(fastpath, '_constructeurs', collections.OrderedDict()):
+            for n in range(1, len(champs) + 1):
+                url = reverse('colis-list') + '?fields=' + ','.join(champs[:n])
+                self.assertEqual(self.client.get(url).status_code, 200)
+            self.assertEqual(len(fastpath._constructeurs), 4)
+
+    def test_commande_de_mesure(self):
+        sortie = io.StringIO()
+        call_command('bench_serialisation', colis=5, suivis=2, repetitions=1, stdout=sortie)
+        self.assertIn('gain x', sortie.getvalue())
+        # Le jeu de données de mesure est annulé
+        self.assertFalse(Colis.objects.filter(numero_bl__startswith='BENCH').exists())
+
+
+# --- 8. Renderer / parser JSON (orjson) ---
+
+class ORJSONRendererTests(TestCase):
+    """Le renderer orjson doit produire les mêmes octets que le JSONRenderer de DRF."""
+
+    def test_types_identiques(self):
+        from collections import OrderedDict
+        import datetime
+        import uuid
+        import zoneinfo
+        from django.utils.translation import gettext_lazy
+        from rest_framework.renderers import JSONRenderer
+        from transit.renderers import ORJSONRenderer
+
+        donnees = OrderedDict(
+            id=uuid.uuid4(),
+            poids_kg=Decimal('1250.500'),
+            grand=Decimal('1e16'),
+            utc=datetime.datetime(2025, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+            libreville=datetime.datetime(2025, 1, 2, 3, 4, 5, 123, tzinfo=zoneinfo.ZoneInfo('Africa/Libreville')),
+            jour=datetime.date(2025, 1, 2),
+            duree=datetime.timedelta(hours=1),
+            libelle=gettext_lazy('Colis'),
+            texte='Zone A é',
+            liste=[1, None, True, (2, 3)],
+            cles={1: 'x'},
+            entier=2 ** 70,
+        )
+        self.assertEqual(ORJSONRenderer().render(donnees), JSONRenderer().render(donnees))
+        self.assertEqual(
+            ORJSONRenderer().render(donnees, 'application/json; indent=2'),
+            JSONRenderer().render(donnees, 'application/json; indent=2'),
+        )
+
+
+class ORJSONApiTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        creer_colis(3, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def test_reponses_identiques(self):
+        from rest_framework.renderers import JSONRenderer
+
+        for url in (reverse('colis-list'), reverse('audit-log-list'), reverse('transaction-list')):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_parser(self):
+        colis = Colis.objects.first()
+        url = reverse('colis-detail', args=[colis.pk])
+        response = self.client.patch(url, '{"lieu_stockage": "Zone C é"}', content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['lieu_stockage'], 'Zone C é')
+
+        response = self.client.patch(url, '{"lieu_stockage": ', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('JSON parse error', response.data['detail'])
+
+
+# --- 9. Synchronisation différentielle (api/v1/sync/) ---
+
+class SyncTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.autre = Utilisateur.objects.create_user(
+            email='autre@transit241.com', password='x', nom='Autre', prenoms='Client', telephone='+24101000009'
+        )
+        cls.colis_list = creer_colis(3, cls.client_user, cls.agent, cls.douanier)
+        creer_colis(2, cls.autre, cls.agent, cls.douanier, prefixe='AU')
+        # bulk_create n'émet pas de signaux : journal initial comme la migration
+        for model in (Colis, SuiviStatut, Facture, DeclarationDouaniere):
+            enregistrer_changements(model, model.objects.values_list('pk', flat=True))
+
+    def synchroniser(self, jeton='', limite=None, utilisateur=None):
+        self.client.force_authenticate(user=utilisateur or self.client_user)
+        url = reverse('sync') + f'?jeton={jeton}' + (f'&limite={limite}' if limite else '')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_synchronisation_complete_limitee_au_client(self):
+        donnees = self.synchroniser()
+        self.assertFalse(donnees['suite'])
+        modifies = donnees['modifies']
+        self.assertEqual(len(modifies['colis']), 3)
+        self.assertEqual(len(modifies['suivis']), 9)
+        self.assertEqual(len(modifies['factures']), 3)
+        self.assertEqual(len(modifies['declarations']), 3)
+        self.assertEqual({c['client'] for c in modifies['colis']}, {self.client_user.pk})
+        self.assertNotIn('historique_statuts', modifies['colis'][0])
+
+    def test_delta_et_tombstones(self):
+        jeton = self.synchroniser()['jeton']
+        self.assertEqual(self.synchroniser(jeton)['modifies']['colis'], [])
+
+        colis = self.colis_list[0]
+        suivi = colis.historique_statuts.first()
+        self.client.force_authenticate(user=self.agent)
+        self.client.patch(reverse('colis-detail', args=[colis.pk]), {'lieu_stockage': 'Zone D'})
+        self.client.delete(reverse('suivi-statut-detail', args=[suivi.pk]))
+        # Mise à jour en masse (sans post_save) et changement d'un autre client
+        Facture.objects.filter(colis=colis).update(statut='PAID')
+        Colis.objects.filter(client=self.autre).update(lieu_stockage='Zone E')
+
+        with self.assertNumQueries(3):  # changements, colis, factures (les types sans changement ne sont pas lus)
+            donnees = self.synchroniser(jeton)
+        self.assertEqual([c['lieu_stockage'] for c in donnees['modifies']['colis']], ['Zone D'])
+        self.assertEqual(donnees['supprimes']['suivis'], [str(suivi.pk)])
+        self.assertEqual([f['statut'] for f in donnees['modifies']['factures']], ['PAID'])
+        self.assertEqual(donnees['modifies']['suivis'], [])
+
+    def test_colis_reattribue_a_un_autre_client(self):
+        jeton = self.synchroniser()['jeton']
+        colis = self.colis_list[0]
+        self.client.force_authenticate(user=self.agent)
+        self.assertEqual(self.client.patch(reverse('colis-detail', args=[colis.pk]),
+                                           {'client': str(self.autre.pk)}).status_code, 200)
+
+        # L'ancien propriétaire retire le colis et ses pièces de ses appareils
+        donnees = self.synchroniser(jeton)
+        self.assertEqual(donnees['modifies']['colis'], [])
+        self.assertEqual(donnees['supprimes']['colis'], [str(colis.pk)])
+        self.assertEqual(len(donnees['supprimes']['suivis']), 3)
+        self.assertEqual(donnees['supprimes']['factures'], [str(colis.facture.pk)])
+
+        # Le nouveau propriétaire le reçoit avec son historique ; le personnel le voit modifié
+        donnees = self.synchroniser(utilisateur=self.autre)
+        self.assertIn(str(colis.pk), [str(c['id']) for c in donnees['modifies']['colis']])
+        self.assertEqual(len(donnees['modifies']['suivis']), 9)
+        donnees = self.synchroniser(utilisateur=self.agent)
+        self.assertEqual(len(donnees['modifies']['colis']), 5)
+        self.assertEqual(donnees['supprimes']['colis'], [])
+
+        # Retour chez le premier client : le tombstone est remplacé par le colis
+        self.client.force_authenticate(user=self.agent)
+        self.client.patch(reverse('colis-detail', args=[colis.pk]), {'client': str(self.client_user.pk)})
+        donnees = self.synchroniser(jeton)
+        self.assertEqual([str(c['id']) for c in donnees['modifies']['colis']], [str(colis.pk)])
+        self.assertEqual(donnees['supprimes']['colis'], [])
+
+    def test_lots_bornes(self):
+        jeton, recus, lots = '', 0, 0
+        while True:
+            donnees = self.synchroniser(jeton, limite=4)
+            recus += sum(len(lignes) for lignes in donnees['modifies'].values())
+            jeton, lots = donnees['jeton'], lots + 1
+            if not donnees['suite']:
+                break
+        self.assertEqual(recus, 18)
+        self.assertEqual(lots, 5)
+
+    def test_jeton_invalide(self):
+        self.client.force_authenticate(user=self.client_user)
+        self.assertEqual(self.client.get(reverse('sync') + '?jeton=xyz').status_code, 400)
+        self.assertEqual(self.client.get(reverse('sync') + '?limite=0').status_code, 400)
+
+
+# --- 10. Suivi groupé (colis/track-batch/) ---
+
+@override_settings(CACHES=CACHES_MEMOIRE)
+class TrackBatchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis_list = creer_colis(6, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_authenticate(user=self.agent)
+        self.url = reverse('colis-track-batch')
+
+    def test_resultats_dans_l_ordre_de_la_demande(self):
+        a, b, c = self.colis_list[:3]
+        inconnu = '00000000-0000-0000-0000-000000000000'
+        references = [str(b.id), c.numero_bl, inconnu, 'BL-INEXISTANT', str(a.id)]
+
+        with self.assertNumQueries(2):  # colis (IN), historique
+            response = self.client.post(self.url, {'ids': references}, format='json')
+        self.assertEqual(response.status_code, 200)
+        resultats = response.data['resultats']
+        self.assertEqual([r['reference'] for r in resultats], references)
+        self.assertEqual([r['trouve'] for r in resultats], [True, True, False, False, True])
+        self.assertEqual(resultats[1]['colis']['id'], str(c.id))
+        self.assertIsNone(resultats[2]['colis'])
+        # Même payload que le suivi unitaire
+        unitaire = self.client.get(reverse('colis-track-colis') + f'?id={a.id}').data
+        self.assertEqual(resultats[4]['colis'], unitaire)
+
+        # Les payloads sont en cache : seules les références par B/L sont relues
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url + f'?ids={a.id},{b.id},{c.numero_bl}')
+        self.assertEqual([r['trouve'] for r in response.data['resultats']], [True, True, True])
+        with self.assertNumQueries(0):
+            self.client.get(self.url + f'?ids={a.id},{b.id}')
+
+    def test_limites(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.post(self.url, {'ids': 'x'}, format='json').status_code, 400)
+        with mock.patch('logistics.views.ColisViewSet.suivi_lot_max', 2):
+            response = self.client.get(self.url + '?ids=a,b,c')
+        self.assertEqual(response.status_code, 400)
+
+
+# --- 11. Dossier complet d'un colis (colis/{id}/dossier/) ---
+
+class DossierTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.avec_retrait, cls.sans_retrait = creer_colis(2, cls.client_user, cls.agent, cls.douanier)
+        creer_colis(3, cls.client_user, cls.agent, cls.douanier, prefixe='BLX')
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def test_dossier_en_nombre_fixe_de_requetes(self):
+        url = reverse('colis-dossier', args=[self.avec_retrait.pk])
+        with self.assertNumQueries(3):  # colis + relations, historique, transactions
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        dossier = response.data
+        self.assertEqual(dossier['colis']['numero_bl'], self.avec_retrait.numero_bl)
+        self.assertNotIn('historique_statuts', dossier['colis'])
+        self.assertEqual(len(dossier['historique']['results']), 3)
+        self.assertEqual(dossier['facture']['colis'], self.avec_retrait.pk)
+        self.assertNotIn('colis_minimal', dossier['facture'])
+        self.assertEqual(dossier['declaration']['douanier_details']['id'], str(self.douanier.pk))
+        self.assertEqual(dossier['retrait']['agent_details']['id'], str(self.agent.pk))
+        self.assertEqual(len(dossier['transactions']), 2)
+
+        response = self.client.get(reverse('colis-dossier', args=[self.sans_retrait.pk]))
+        self.assertIsNone(response.data['retrait'])
+
+    def test_historique_pagine(self):
+        url = reverse('colis-dossier', args=[self.avec_retrait.pk])
+        page = self.client.get(url + '?historique_taille=2').data['historique']
+        suite = self.client.get(page['next']).data['historique']
+        ids = [s['id'] for s in page['results'] + suite['results']]
+        self.assertEqual(ids, list(self.avec_retrait.historique_statuts.values_list('id', flat=True)))
+        self.assertIsNone(suite['next'])
+
+    def test_colis_introuvable(self):
+        self.assertEqual(self.client.get(reverse('colis-dossier', args=['inconnu'])).status_code, 404)
+
+
+# --- 12. Historique imbriqué limité et timeline paginée ---
+
+@override_settings(CACHES=CACHES_MEMOIRE)
+class TimelineTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.litige, cls.autre = creer_colis(2, cls.client_user, cls.agent, cls.douanier)
+        # Litige douanier : l'historique dépasse largement la limite imbriquée
+        SuiviStatut.objects.bulk_create([
+            SuiviStatut(colis=cls.litige, statut='LITIGE', localisation=f'Bureau {n}', agent_operationnel=cls.agent)
+            for n in range(HISTORIQUE_IMBRIQUE_MAX + 15)
+        ])
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_authenticate(user=self.agent)
+
+    def test_historique_imbrique_limite(self):
+        from .views import ColisViewSet
+
+        recents = list(self.litige.historique_statuts.values_list('id', flat=True)[:HISTORIQUE_IMBRIQUE_MAX])
+        urls = [
+            reverse('colis-detail', args=[self.litige.pk]),
+            reverse('colis-track-colis') + f'?id={self.litige.pk}',
+        ]
+        for fast_read in (True, False):
+            with mock.patch.object(ColisViewSet, 'fast_read', fast_read):
+                caches['default'].clear()
+                for url in urls:
+                    with self.subTest(url=url, fast_read=fast_read):
+                        historique = self.client.get(url).data['historique_statuts']
+                        self.assertEqual([s['id'] for s in historique], recents)
+                liste = self.client.get(reverse('colis-list')).data['results']
+                self.assertEqual([len(c['historique_statuts']) for c in liste], [3, HISTORIQUE_IMBRIQUE_MAX])
+
+    def test_timeline_paginee(self):
+        url = reverse('colis-timeline', args=[self.litige.pk])
+        ids, lien = [], url + '?page_size=10'
+        while lien:
+            with self.assertNumQueries(1):
+                page = self.client.get(lien).data
+            ids += [s['id'] for s in page['results']]
+            lien = page['next']
+        self.assertEqual(ids, list(self.litige.historique_statuts.values_list('id', flat=True)))
+
+        self.assertEqual(self.client.get(reverse('colis-timeline', args=[uuid.uuid4()])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('colis-timeline', args=['x'])).status_code, 404)
+
+    def test_index_utilise(self):
+        requete = SuiviStatut.objects.filter(colis=self.litige).order_by('-date_heure', '-id')[:20]
+        self.assertIn('suivi_colis_date_idx', requete.explain())
+
+
+# --- 13. Cache de fragments (représentation par objet et par version) ---
+
+@override_settings(CACHES=CACHES_MEMOIRE)
+class FragmentCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis_list = creer_colis(4, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.client.force_authenticate(user=self.agent)
+
+    def lister(self, url, serializer_class):
+        """Retourne (résultats, nombre d'objets sérialisés par DRF)."""
+        with mock.patch.object(serializer_class, 'to_representation', autospec=True,
+                               side_effect=serializer_class.to_representation) as serialiser:
+            resultats = self.client.get(url).data['results']
+        return resultats, serialiser.call_count
+
+    def test_seules_les_lignes_perimees_sont_reserialisees(self):
+        from .serializers import FactureSerializer
+        url = reverse('facture-list')
+        premiere, appels = self.lister(url, FactureSerializer)
+        self.assertEqual(appels, 4)
+        seconde, appels = self.lister(url, FactureSerializer)
+        self.assertEqual(appels, 0)
+        self.assertEqual(seconde, premiere)
+
+        # Nouvelle version de la facture, puis du colis lié (colis_minimal)
+        facture = Facture.objects.get(colis=self.colis_list[0])
+        facture.statut = 'PAID'
+        facture.save()
+        Colis.objects.filter(pk=self.colis_list[1].pk).update(statut_actuel='PRET_RETRAIT')
+        resultats, appels = self.lister(url, FactureSerializer)
+        self.assertEqual(appels, 2)
+        non_cache = [
+            FactureSerializer(f).data
+            for f in Facture.objects.select_related('colis__client').order_by('-date_emission', 'id')
+        ]
+        self.assertEqual(sorted(resultats, key=lambda f: f['id']), sorted(non_cache, key=lambda f: f['id']))
+
+        # Relations dépliées : pas de cache
+        from payments.serializers import TransactionPaiementSerializer
+        url = reverse('transaction-list') + '?expand=colis'
+        self.lister(url, TransactionPaiementSerializer)
+        _, appels = self.lister(url, TransactionPaiementSerializer)
+        self.assertGreater(appels, 0)
+
+    def test_chemin_rapide_sans_relecture_des_suivis(self):
+        url = reverse('colis-list')
+        premiere = self.client.get(url).data['results']
+        with CaptureQueriesContext(connection) as requetes:
+            seconde = self.client.get(url).data['results']
+        self.assertEqual(seconde, premiere)
+        self.assertFalse([q for q in requetes if 'logistics_suivistatut' in q['sql']])
+
+        # Le renommage du client incrémente la version de ses colis
+        self.client_user.prenoms = 'Renommé'
+        self.client_user.save()
+        noms = {c['client_name'] for c in self.client.get(url).data['results']}
+        self.assertEqual(noms, {'Renommé Client'})
+
+        # Comme celui de l'agent des suivis imbriqués, et un suivi modifié hors des vues (admin, shell)
+        self.agent.nom = 'Ondo'
+        self.agent.save()
+        suivi = SuiviStatut.objects.filter(colis=self.colis_list[0]).first()
+        suivi.localisation = 'Quai Ondo'
+        suivi.save()
+        resultats = self.client.get(url).data['results']
+        self.assertEqual(
+            {s['agent_operationnel_name'] for c in resultats for s in c['historique_statuts']},
+            {self.agent.get_full_name()},
+        )
+        colis = next(c for c in resultats if c['id'] == str(self.colis_list[0].pk))
+        self.assertIn('Quai Ondo', [s['localisation'] for s in colis['historique_statuts']])
+
+
+# --- 14. Format colonnaire (?format=columnar) ---
+
+def decoder_colonnes(bloc):
+    """Reconstruit la liste de dicts d'une réponse colonnaire (voir transit.renderers.en_colonnes)."""
+    noms = bloc['colonnes']
+    absents = {(nom, i) for nom, lignes in bloc['absents'].items() for i in lignes}
+    objets = []
+    for i, ligne in enumerate(bloc['lignes']):
+        objet = {}
+        for nom, valeur in zip(noms, ligne):
+            if (nom, i) in absents:
+                continue
+            if nom in bloc['dictionnaires']:
+                valeur = bloc['dictionnaires'][nom][valeur]
+            objet[nom] = valeur
+        objets.append(objet)
+    return objets
+
+
+class ColumnarRendererTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        creer_colis(6, cls.client_user, cls.agent, cls.douanier)
+        SuiviStatut.objects.create(colis=Colis.objects.first(), statut='ARRIVE_ENTREPOT', agent_operationnel=None)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def test_decodage_identique_au_json(self):
+        for url in (reverse('colis-list'), reverse('audit-log-list'),
+                    reverse('transaction-list'), reverse('suivi-statut-list')):
+            with self.subTest(url=url):
+                ordinaire = self.client.get(url).json()
+                response = self.client.get(url, {'format': 'columnar'})
+                self.assertEqual(response['Content-Type'], 'application/vnd.transit.columnar+json')
+                colonnaire = response.json()
+                self.assertEqual(decoder_colonnes(colonnaire['results']), ordinaire['results'])
+                # Les liens de pagination sont conservés
+                self.assertEqual(set(colonnaire), set(ordinaire))
+                self.assertLess(len(response.content), len(self.client.get(url).content))
+
+    def test_dictionnaires_et_absents(self):
+        bloc = self.client.get(reverse('suivi-statut-list'), {'format': 'columnar'}).json()['results']
+        self.assertIn('statut', bloc['dictionnaires'])
+        self.assertNotIn('id', bloc['dictionnaires'])
+        # Suivi sans agent : agent_operationnel_name absent (et non null)
+        self.assertEqual(len(bloc['absents']['agent_operationnel_name']), 1)
+
+        bloc = self.client.get(reverse('suivi-statut-list'), {'format': 'columnar', 'dictionnaire': '0'}).json()
+        self.assertEqual(bloc['results']['dictionnaires'], {})
+
+    def test_negociation_par_accept(self):
+        url = reverse('colis-list')
+        response = self.client.get(url, HTTP_ACCEPT='application/vnd.transit.columnar+json')
+        self.assertIn('colonnes', response.json()['results'])
+        self.assertIn('Accept', response['Vary'])
+        # Le détail reste un objet JSON ordinaire ; l'ETag dépend du format
+        detail = reverse('colis-detail', args=[Colis.objects.first().pk])
+        colonnaire = self.client.get(detail, HTTP_ACCEPT='application/vnd.transit.columnar+json')
+        self.assertIn('numero_bl', colonnaire.json())
+        self.assertNotEqual(colonnaire['ETag'], self.client.get(detail)['ETag'])
+
+
+# --- 15. Lot de requêtes (api/v1/batch/) ---
+
+class BatchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis_list = creer_colis(3, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        self.url = reverse('batch')
+
+    def test_reponses_identiques_aux_appels_directs(self):
+        self.client.force_authenticate(user=self.client_user)
+        urls = ['/api/v1/colis/?page_size=2', '/api/v1/factures/', '/api/v1/roles/', '/api/v1/inconnu/']
+        response = self.client.post(self.url, {'requetes': [{'url': url} for url in urls]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        reponses = response.json()['reponses']
+        self.assertEqual([r['statut'] for r in reponses[:3]], [self.client.get(url).status_code for url in urls[:3]])
+        self.assertEqual(reponses[0]['corps'], self.client.get(urls[0]).json())
+        self.assertIn('ETag', reponses[0]['entetes'])
+        self.assertEqual(reponses[3]['statut'], 404)
+
+    def test_ecritures_independantes(self):
+        self.client.force_authenticate(user=self.agent)
+        colis = self.colis_list[0]
+        response = self.client.post(self.url, {'requetes': [
+            {'methode': 'PATCH', 'url': f'/api/v1/colis/{colis.pk}/', 'corps': {'lieu_stockage': 'Zone D'}},
+            {'methode': 'PATCH', 'url': f'/api/v1/colis/{colis.pk}/', 'corps': {'poids_kg': 'x'}},
+            {'methode': 'GET', 'url': f'/api/v1/colis/{colis.pk}/'},
+        ]}, format='json')
+        statuts = [r['statut'] for r in response.json()['reponses']]
+        self.assertEqual(statuts, [200, 400, 200])
+        self.assertEqual(response.json()['reponses'][2]['corps']['lieu_stockage'], 'Zone D')
+
+    def test_validation_du_lot(self):
+        self.assertEqual(self.client.post(self.url, {'requetes': []}, format='json').status_code, 401)
+        self.client.force_authenticate(user=self.agent)
+        for corps in (
+            {'requetes': []},
+            {'requetes': [{'url': '/api/v1/roles/'}] * 21},
+            {'requetes': [{'url': 'https://exemple.com/api/v1/roles/'}]},
+            {'requetes': [{'methode': 'TRACE', 'url': '/api/v1/roles/'}]},
+            # Ignorée par les sous-requêtes (pas de middleware) : la clé va sur le lot lui-même
+            {'requetes': [{'methode': 'POST', 'url': '/api/v1/suivi-statuts/', 'entetes': {'idempotency-key': 'k'}}]},
+        ):
+            with self.subTest(corps=str(corps)[:60]):
+                self.assertEqual(self.client.post(self.url, corps, format='json').status_code, 400)
+        imbrique = self.client.post(self.url, {'requetes': [{'methode': 'POST', 'url': '/api/v1/batch/'}]},
+                                    format='json')
+        self.assertEqual(imbrique.json()['reponses'][0]['statut'], 400)
+
+
+class BatchParalleleTests(TransactionTestCase):
+
+    def test_lectures_en_parallele(self):
+        from rest_framework.test import APIClient
+
+        client_user, agent, douanier = creer_utilisateurs()
+        creer_colis(3, client_user, agent, douanier)
+        api = APIClient()
+        api.force_authenticate(user=client_user)
+        urls = ['/api/v1/colis/', '/api/v1/factures/', '/api/v1/declarations/', '/api/v1/transactions/']
+        response = api.post(reverse('batch'), {'parallele': True, 'requetes': [{'url': url} for url in urls]},
+                            format='json')
+        reponses = response.json()['reponses']
+        for url, reponse in zip(urls, reponses):
+            with self.subTest(url=url):
+                self.assertEqual(reponse['statut'], 200)
+                self.assertEqual(reponse['corps'], api.get(url).json())
+
+
+# --- 16. Recherche des colis (trigrammes du B/L, plein texte FTS5) ---
+
+class RechercheColisTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis_list = creer_colis(5, cls.client_user, cls.agent, cls.douanier)
+        # bulk_create ne déclenche pas les signaux : indexation explicite
+        call_command('indexer_recherche', stdout=io.StringIO())
+        cls.frigo = Colis.objects.create(
+            numero_bl='MSCU7781234GAB', description='Réfrigérateurs industriels', poids_kg=Decimal('300.000'),
+            client=cls.douanier, lieu_stockage='Zone B',
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def chercher(self, q):
+        response = self.client.get(reverse('colis-search'), {'q': q})
+        self.assertEqual(response.status_code, 200)
+        return [r['numero_bl'] for r in response.data['resultats']]
+
+    def test_bl_exact_prefixe_et_fautes(self):
+        cible = self.colis_list[2].numero_bl  # ex: BL000002GAB
+        self.assertEqual(self.chercher(cible)[0], cible)
+        # Saisie OCR / dictée : tirets, minuscules, O lu pour 0, un caractère faux
+        self.assertEqual(self.chercher(cible.lower().replace('0', 'o', 2))[0], cible)
+        self.assertEqual(self.chercher(cible[:1] + 'X' + cible[2:])[0], cible)
+        self.assertEqual(self.chercher('MSCU-778')[0], 'MSCU7781234GAB')
+        self.assertEqual(self.chercher('MSCU7718234GAB')[0], 'MSCU7781234GAB')
+
+    def test_plein_texte(self):
+        # Préfixes, sans accents, sur la description et le nom du client
+        self.assertEqual(self.chercher('refrig indus'), ['MSCU7781234GAB'])
+        self.assertEqual(len(self.chercher('marchandise generale')), 5)
+        self.assertEqual(self.chercher('douanier'), ['MSCU7781234GAB'])
+        self.assertEqual(self.client.get(reverse('colis-search')).status_code, 400)
+
+    def test_maintenance_incrementale(self):
+        self.frigo.description = 'Climatiseurs'
+        self.frigo.save()
+        self.assertEqual(self.chercher('refrig'), [])
+        self.assertEqual(self.chercher('climat'), ['MSCU7781234GAB'])
+
+        # Renommage du client : réindexation de ses colis
+        self.douanier.nom = 'Mbadinga'
+        self.douanier.save()
+        self.assertEqual(self.chercher('mbadinga'), ['MSCU7781234GAB'])
+
+        Colis.objects.filter(pk=self.frigo.pk).update(numero_bl='CMAU5550001GAB')
+        self.assertEqual(self.chercher('CMAU555')[0], 'CMAU5550001GAB')
+        self.assertNotIn('CMAU5550001GAB', self.chercher('MSCU7781234GAB'))
+
+        self.frigo.delete()
+        self.assertEqual(self.chercher('climat'), [])
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM logistics_colis_fts")
+            self.assertEqual(cursor.fetchone()[0], 5)
+
+    def test_statut_seul_sans_reindexation(self):
+        with mock.patch('logistics.signals.indexer_colis') as indexer:
+            self.frigo.statut_actuel = 'EN_TRANSIT'
+            self.frigo.save(update_fields=['statut_actuel'])
+            indexer.assert_not_called()
+            self.frigo.save(update_fields=['description'])
+            indexer.assert_called_once_with([self.frigo.pk])
+
+    def test_recherche_admin_par_email_du_client(self):
+        from django.contrib import admin
+        from .admin import ColisAdmin
+
+        colis_admin = ColisAdmin(Colis, admin.site)
+        resultats, _ = colis_admin.get_search_results(None, Colis.objects.all(), 'douanier@transit241')
+        self.assertEqual([c.numero_bl for c in resultats], ['MSCU7781234GAB'])
+        resultats, _ = colis_admin.get_search_results(None, Colis.objects.all(), 'refrig')
+        self.assertEqual([c.numero_bl for c in resultats], ['MSCU7781234GAB'])
+
+
+# --- 17. Flux temps réel des colis (SSE sur ASGI) ---
+
+@override_settings(EVENEMENTS_TEMPS_REEL={'BACKEND': 'transit.events.BusMemoire'})
+class FluxColisTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis, cls.autre = creer_colis(2, cls.client_user, cls.agent, cls.douanier)
+        Colis.objects.filter(pk=cls.autre.pk).update(client=cls.douanier)
+
+    async def ouvrir(self, utilisateur, ids, intervalle_ping=15):
+        """Lance le flux ; retourne (tâche, messages envoyés, fonction de déconnexion)."""
+        from asgiref.sync import sync_to_async
+        from rest_framework_simplejwt.tokens import AccessToken
+        from .realtime import FluxColis
+
+        jeton = await sync_to_async(lambda: str(AccessToken.for_user(utilisateur)))()
+        scope = {'type': 'http', 'path': '/api/v1/stream/colis/', 'headers': [],
+                 'query_string': f"ids={','.join(map(str, ids))}&jeton={jeton}".encode()}
+        fin = asyncio.Event()
+
+        async def receive():
+            await fin.wait()
+            return {'type': 'http.disconnect'}
+
+        envoyes = []
+
+        async def send(message):
+            envoyes.append(message)
+
+        flux = FluxColis()
+        flux.intervalle_ping = intervalle_ping
+        tache = asyncio.ensure_future(flux(scope, receive, send))
+        return tache, envoyes, fin.set
+
+    @staticmethod
+    def corps(envoyes):
+        return b''.join(m.get('body', b'') for m in envoyes if m['type'] == 'http.response.body').decode()
+
+    async def attendre(self, envoyes, texte):
+        for _ in range(200):
+            if texte in self.corps(envoyes):
+                return
+            await asyncio.sleep(0.01)
+        self.fail(f"{texte!r} non reçu : {self.corps(envoyes)!r}")
+
+    async def test_evenements_publies_apres_validation(self):
+        from asgiref.sync import sync_to_async
+
+        tache, envoyes, deconnecter = await self.ouvrir(self.client_user, [self.colis.pk])
+        await self.attendre(envoyes, 'retry:')
+        self.assertEqual(envoyes[0]['status'], 200)
+
+        def creer_suivi():
+            self.client.force_authenticate(user=self.agent)
+            with mock.patch('logistics.views.envoyer_notifications_statut.delay'), \
+                    self.captureOnCommitCallbacks(execute=True):
+                return self.client.post(reverse('suivi-statut-list'), {
+                    'colis': self.colis.pk, 'statut': 'PRET_RETRAIT', 'localisation': 'Quai 4',
+                })
+
+        self.assertEqual((await sync_to_async(creer_suivi)()).status_code, 201)
+        await self.attendre(envoyes, 'event: suivi')
+        trame = self.corps(envoyes).split('event: suivi\ndata: ')[1].split('\n')[0]
+        self.assertEqual(json.loads(trame)['statut_actuel'], 'PRET_RETRAIT')
+        self.assertEqual(json.loads(trame)['localisation'], 'Quai 4')
+
+        deconnecter()
+        await asyncio.wait_for(tache, 1)
+        from transit.events import get_bus
+        self.assertEqual(get_bus()._abonnes, {})
+
+    async def test_ping_et_autorisations(self):
+        tache, envoyes, deconnecter = await self.ouvrir(self.agent, [self.colis.pk, self.autre.pk], 0.01)
+        await self.attendre(envoyes, ': ping')
+        deconnecter()
+        await asyncio.wait_for(tache, 1)
+
+        # Colis d'un autre client : indiscernable d'un colis inexistant
+        tache, envoyes, _ = await self.ouvrir(self.client_user, [self.autre.pk])
+        await asyncio.wait_for(tache, 1)
+        self.assertEqual(envoyes[0]['status'], 404)
+
+        tache, envoyes, _ = await self.ouvrir(self.client_user, ['pas-un-uuid'])
+        await asyncio.wait_for(tache, 1)
+        self.assertEqual(envoyes[0]['status'], 400)
+
+
+# --- 18. Vues de lecture asynchrones (ASGI) ---
+
+@override_settings(CACHES=CACHES_MEMOIRE)
+class LectureAsynchroneTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis_list = creer_colis(3, cls.client_user, cls.agent, cls.douanier)
+        cls.entetes = {'Authorization': f'Bearer {AccessToken.for_user(cls.agent)}'}
+
+    def setUp(self):
+        caches['default'].clear()
+
+    async def comparer(self, url, **entetes):
+        """Réponses ASGI (vue asynchrone, sans délégation) et WSGI (vue DRF) de `url`."""
+        from asgiref.sync import sync_to_async
+        from . import async_views
+
+        with mock.patch('transit.asynchrone.deleguer') as deleguer, \
+                mock.patch.object(async_views, 'constructeur_pour', wraps=async_views.constructeur_pour) as rapide:
+            asynchrone = await self.async_client.get(url, headers={**self.entetes, **entetes})
+        deleguer.assert_not_called()
+        rapide.assert_called()
+        await sync_to_async(caches['default'].clear)()
+        synchrone = await sync_to_async(self.client.get)(url, headers={**self.entetes, **entetes})
+        return asynchrone, synchrone
+
+    async def test_track_identique_et_mis_en_cache(self):
+        from .cache import acle_suivi
+
+        colis = self.colis_list[0]
+        url = reverse('colis-track-colis') + f'?id={colis.pk}'
+        asynchrone, synchrone = await self.comparer(url)
+        self.assertEqual(asynchrone.status_code, 200)
+        self.assertEqual(asynchrone.content, synchrone.content)
+        # Le payload mis en cache par la vue asynchrone est celui de la vue DRF
+        self.assertIsNotNone(await transit_cache.cache.aget(await acle_suivi(colis.pk)))
+
+    async def test_detail_identique_et_conditionnel(self):
+        url = reverse('colis-detail', args=[self.colis_list[0].pk])
+        asynchrone, synchrone = await self.comparer(url)
+        self.assertEqual(asynchrone.status_code, 200)
+        self.assertEqual(asynchrone.content, synchrone.content)
+        self.assertEqual(asynchrone['ETag'], synchrone['ETag'])
+
+        with mock.patch('transit.asynchrone.deleguer') as deleguer:
+            reponse = await self.async_client.get(url, headers={**self.entetes, 'If-None-Match': asynchrone['ETag']})
+        deleguer.assert_not_called()
+        self.assertEqual(reponse.status_code, 304)
+
+    async def test_liste_identique_et_paginee(self):
+        url = reverse('colis-list') + '?page_size=2'
+        asynchrone, synchrone = await self.comparer(url)
+        self.assertEqual(asynchrone.content, synchrone.content)
+        self.assertEqual(asynchrone['ETag'], synchrone['ETag'])
+
+        suivante = json.loads(asynchrone.content)['next']
+        asynchrone, synchrone = await self.comparer(suivante)
+        self.assertEqual(asynchrone.content, synchrone.content)
+        self.assertEqual(len(json.loads(asynchrone.content)['results']), 1)
+
+    async def test_autres_cas_delegues_a_drf(self):
+        url = reverse('colis-detail', args=[self.colis_list[0].pk])
+        # ?fields=, sans jeton, colis inexistant, curseur invalide : réponses des vues DRF
+        reponse = await self.async_client.get(url + '?fields=id,numero_bl', headers=self.entetes)
+        self.assertEqual(json.loads(reponse.content), {'id': str(self.colis_list[0].pk),
+                                                       'numero_bl': self.colis_list[0].numero_bl})
+        self.assertEqual((await self.async_client.get(url)).status_code, 401)
+        inexistant = reverse('colis-detail', args=[uuid.uuid4()])
+        self.assertEqual((await self.async_client.get(inexistant, headers=self.entetes)).status_code, 404)
+        reponse = await self.async_client.get(reverse('colis-list') + '?cursor=xyz', headers=self.entetes)
+        self.assertEqual(reponse.status_code, 404)
+        reponse = await self.async_client.get(reverse('colis-track-colis'), headers=self.entetes)
+        self.assertEqual(reponse.status_code, 400)
+
+
+# --- 19. Mise à jour de statut en masse (suivi-statuts/bulk/) ---
+
+@override_settings(CACHES=CACHES_MEMOIRE, EVENEMENTS_TEMPS_REEL={'BACKEND': 'transit.events.BusMemoire'})
+class StatutEnMasseTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis_list = creer_colis(4, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def appliquer(self, corps):
+        with mock.patch('logistics.statuts.envoyer_notifications_statut.delay') as notifier, \
+                self.captureOnCommitCallbacks(execute=True):
+            reponse = self.client.post(reverse('suivi-statut-bulk'), corps, format='json')
+        return reponse, notifier
+
+    def test_lot_par_ids(self):
+        cibles = self.colis_list[:3]
+        versions = dict(Colis.objects.values_list('pk', 'version'))
+        inconnu = str(uuid.uuid4())
+        reponse, notifier = self.appliquer({
+            'statut': 'PRET_RETRAIT', 'localisation': 'Quai 7',
+            'colis': [str(c.pk) for c in cibles] + [inconnu, 'pas-un-uuid'],
+        })
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.data['appliques'], 3)
+        resultats = reponse.data['resultats']
+        self.assertTrue(all(r['succes'] for r in resultats[:3]))
+        self.assertEqual(resultats[3], {'colis': inconnu, 'succes': False, 'erreur': "Colis introuvable."})
+        self.assertEqual(resultats[4]['erreur'], "Identifiant invalide.")
+
+        for colis in cibles:
+            colis.refresh_from_db()
+            self.assertEqual(colis.statut_actuel, 'PRET_RETRAIT')
+            self.assertEqual(colis.version, versions[colis.pk] + 1)
+            suivi = colis.historique_statuts.first()
+            self.assertEqual(suivi.localisation, 'Quai 7')
+            resume = ColisResume.objects.get(colis=colis)
+            self.assertEqual((resume.derniere_localisation, resume.date_dernier_suivi), ('Quai 7', suivi.date_heure))
+        self.assertNotEqual(Colis.objects.get(pk=self.colis_list[3].pk).statut_actuel, 'PRET_RETRAIT')
+        suivi_id = resultats[0]['suivi']
+        self.assertTrue(ChangementSync.objects.filter(type_objet='suivi', objet_id=str(suivi_id)).exists())
+        # Une seule tâche de notification pour tout le lot
+        notifier.assert_called_once()
+        self.assertCountEqual(notifier.call_args.args[0], [str(c.pk) for c in cibles])
+
+    def test_lot_par_filtre_et_nombre_de_requetes_constant(self):
+        Colis.objects.filter(pk=self.colis_list[0].pk).update(lieu_stockage='Zone C')
+        reponse, _ = self.appliquer({'statut': 'EN_TRANSIT', 'filtre': {'lieu_stockage': 'Zone C'}})
+        self.assertEqual(reponse.data['appliques'], 1)
+
+        def requetes(nombre):
+            colis = creer_colis(nombre, self.client_user, self.agent, self.douanier, prefixe=f'Q{nombre}')
+            with CaptureQueriesContext(connection) as requetes:
+                self.appliquer({'statut': 'LITIGE', 'colis': [str(c.pk) for c in colis]})
+            return len(requetes)
+
+        self.assertEqual(requetes(2), requetes(12))
+
+    def test_validation(self):
+        reponse, _ = self.appliquer({'statut': 'EN_TRANSIT', 'colis': [str(self.colis_list[0].pk)],
+                                     'filtre': {'lieu_stockage': 'Zone A'}})
+        self.assertEqual(reponse.status_code, 400)
+        reponse, _ = self.appliquer({'statut': 'EN_TRANSIT', 'filtre': {'description': 'x'}})
+        self.assertEqual(reponse.status_code, 400)
+        reponse, _ = self.appliquer({'statut': 'INCONNU', 'colis': [str(self.colis_list[0].pk)]})
+        self.assertEqual(reponse.status_code, 400)
+        # Valeurs des filtres validées : identifiant de client, statut connu
+        for filtre in ({'client': 'abc'}, {'statut_actuel': 'INCONNU'}):
+            reponse, _ = self.appliquer({'statut': 'EN_TRANSIT', 'filtre': filtre})
+            self.assertEqual(reponse.status_code, 400)
+            self.assertIn(next(iter(filtre)), reponse.data['filtre'])
+        reponse, _ = self.appliquer({'statut': 'LITIGE', 'filtre': {'client': str(self.client_user.pk)}})
+        self.assertEqual(reponse.data['appliques'], 4)
+
+
+# --- 20. Import de manifeste en flux (colis/import/, importer_manifeste) ---
+
+class ImportManifesteTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.existant = creer_colis(1, cls.client_user, cls.agent, cls.douanier)[0]
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def televerser(self, contenu, nom, **donnees):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+
+        fichier = SimpleUploadedFile(nom, contenu.encode())
+        return self.client.post(reverse('colis-importer'), {'fichier': fichier, **donnees}, format='multipart')
+
+    def test_import_csv(self):
+        contenu = (
+            "numero_bl,description,poids_kg,dimensions,lieu_stockage,client_email,client_telephone\n"
+            "MAN001,Pneus,120.5,,Zone A,CLIENT@transit241.com,\n"
+            "MAN002,Ciment,2000,,Zone B,,+241 01 00 00 01\n"
+            f"{self.existant.numero_bl},Déjà connu,10,,,client@transit241.com,\n"
+            "MAN001,Doublon du fichier,10,,,client@transit241.com,\n"
+            "MAN003,Poids invalide,abc,,,client@transit241.com,\n"
+            "MAN004,Client inconnu,10,,,inconnu@transit241.com,\n"
+            "MAN005,Trop de colonnes,10,,,client@transit241.com,,en trop\n"
+        )
+        reponse = self.televerser(contenu, 'manifeste.csv')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual({cle: reponse.data[cle] for cle in ('lignes', 'crees', 'doublons', 'en_erreur')},
+                         {'lignes': 7, 'crees': 2, 'doublons': 2, 'en_erreur': 3})
+        self.assertEqual([e['ligne'] for e in reponse.data['erreurs']], [6, 7, 8])
+        self.assertIn('poids_kg', reponse.data['erreurs'][0]['erreurs'])
+
+        colis = Colis.objects.get(numero_bl='MAN002')
+        self.assertEqual(colis.client_id, self.client_user.pk)
+        # Dérivés des signaux, maintenus par lot
+        self.assertTrue(ColisResume.objects.filter(colis=colis).exists())
+        self.assertTrue(ChangementSync.objects.filter(type_objet='colis', objet_id=str(colis.pk)).exists())
+        from .search import rechercher_colis
+        self.assertEqual(rechercher_colis('MAN002')[0][0], colis.pk)
+
+    def test_commande_ndjson_par_lots(self):
+        import os
+        import tempfile
+
+        lignes = [json.dumps({'numero_bl': f'ND{i}', 'description': 'Riz', 'poids_kg': '50',
+                              'client_telephone': '+24101000001'}) for i in range(5)]
+        lignes.insert(2, '{pas du json')
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as fichier:
+            fichier.write('\n'.join(lignes) + '\n')
+        self.addCleanup(os.unlink, fichier.name)
+        sortie, erreurs = io.StringIO(), io.StringIO()
+        call_command('importer_manifeste', fichier.name, '--taille-lot', '2', stdout=sortie, stderr=erreurs)
+        self.assertIn('5 colis créés', sortie.getvalue())
+        self.assertIn('Ligne 3', erreurs.getvalue())
+        self.assertEqual(Colis.objects.filter(numero_bl__startswith='ND').count(), 5)
+
+        # Réimport : uniquement des doublons
+        call_command('importer_manifeste', fichier.name, stdout=sortie, stderr=erreurs)
+        self.assertIn('0 colis créés, 5 doublons', sortie.getvalue())
+
+    def test_manifeste_illisible(self):
+        self.assertEqual(self.televerser("numero_bl,description\nX,Y\n", 'manifeste.csv').status_code, 400)
+        self.assertEqual(self.televerser("{}", 'manifeste.txt').status_code, 400)
+        self.assertEqual(self.televerser("{}", 'manifeste.txt', type='ndjson').status_code, 200)
+
+
+# --- 21. Scans des terminaux (suivi-statuts/scans/) ---
+
+@override_settings(CACHES=CACHES_MEMOIRE, EVENEMENTS_TEMPS_REEL={'BACKEND': 'transit.events.BusMemoire'})
+class ScansTerminauxTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis_list = creer_colis(3, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def envoyer(self, evenements):
+        corps = '\n'.join(e if isinstance(e, str) else json.dumps(e) for e in evenements)
+        with mock.patch('logistics.scans.envoyer_notifications_statut.delay') as notifier, \
+                self.captureOnCommitCallbacks(execute=True):
+            reponse = self.client.post(reverse('suivi-statut-scans'), corps, content_type='application/x-ndjson')
+        return reponse, notifier
+
+    @staticmethod
+    def scan(evenement_id, colis, statut, minutes, localisation='Quai 3'):
+        date = timezone.now() + timezone.timedelta(minutes=minutes)
+        return {'evenement_id': evenement_id, 'colis': str(colis.pk), 'statut': statut,
+                'localisation': localisation, 'date': date.isoformat(), 'appareil': 'TPE-07'}
+
+    def test_heure_du_scan_et_envoi_tardif(self):
+        colis = self.colis_list[0]
+        reponse, notifier = self.envoyer([self.scan('e1', colis, 'PRET_RETRAIT', 1)])
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.data['enregistres'], 1)
+        self.assertTrue(reponse.data['resultats'][0]['applique'])
+        colis.refresh_from_db()
+        self.assertEqual(colis.statut_actuel, 'PRET_RETRAIT')
+        notifier.assert_called_once()
+
+        # Scan d'il y a une heure, envoyé après reconnexion : historique complété, statut inchangé
+        version = colis.version
+        reponse, notifier = self.envoyer([self.scan('e0', colis, 'EN_TRANSIT', -60)])
+        self.assertEqual(reponse.data['resultats'][0]['resultat'], 'enregistre')
+        self.assertFalse(reponse.data['resultats'][0]['applique'])
+        colis.refresh_from_db()
+        self.assertEqual((colis.statut_actuel, colis.version), ('PRET_RETRAIT', version + 1))
+        tardif = SuiviStatut.objects.get(evenement_id='e0')
+        self.assertLess(tardif.date_heure, timezone.now() - timezone.timedelta(minutes=59))
+        self.assertEqual(tardif.appareil, 'TPE-07')
+        self.assertEqual(ColisResume.objects.get(colis=colis).statut_actuel, 'PRET_RETRAIT')
+        notifier.assert_not_called()
+
+    def test_evenements_du_lot_appliques_dans_l_ordre(self):
+        colis = self.colis_list[0]
+        Colis.objects.filter(pk=colis.pk).update(statut_actuel='EN_TRANSIT')
+        # LIVRE n'est atteignable que depuis PRET_RETRAIT, appliqué juste avant dans le même lot
+        reponse, notifier = self.envoyer([
+            self.scan('c2', colis, 'LIVRE', 2, localisation='Sortie'),
+            self.scan('c1', colis, 'PRET_RETRAIT', 1),
+        ])
+        self.assertEqual([r['applique'] for r in reponse.data['resultats']], [True, True])
+        colis.refresh_from_db()
+        self.assertEqual((colis.statut_actuel, colis.lieu_stockage), ('LIVRE', 'Sortie'))
+        notifier.assert_called_once_with([str(colis.pk)], 'LIVRE', 'Sortie')
+        # Même état qu'au rejeu complet de l'historique
+        self.assertEqual(evenements.replier([colis.pk], depuis_zero=True)['divergents'], {})
+
+    def test_evenements_deja_recus_et_repetitions(self):
+        colis, autre = self.colis_list[1], self.colis_list[2]
+        self.envoyer([self.scan('a1', colis, 'LITIGE', 0)])
+        reponse, _ = self.envoyer([
+            self.scan('a1', colis, 'LITIGE', 0),  # Renvoi
+            self.scan('a2', colis, 'LITIGE', 1),  # Même scan une minute plus tard
+            self.scan('a3', colis, 'LITIGE', 1, localisation='Quai 4'),
+            self.scan('a4', autre, 'LITIGE', 1),
+            self.scan('a4', autre, 'LITIGE', 5),  # Identifiant répété dans le lot
+            {**self.scan('a5', autre, 'LITIGE', 0), 'colis': str(uuid.uuid4())},
+            {**self.scan('a6', autre, 'LITIGE', 0), 'date': '2100-01-01T00:00:00Z'},
+            'pas du json',
+        ])
+        self.assertEqual(
+            [r['resultat'] for r in reponse.data['resultats']],
+            ['deja_recu', 'repetition', 'enregistre', 'enregistre', 'deja_recu', 'rejete', 'rejete', 'rejete'],
+        )
+        self.assertEqual(reponse.data['resultats'][5]['erreurs'], {'non_field_errors': ["Colis introuvable."]})
+        self.assertIn('date', reponse.data['resultats'][6]['erreurs'])
+        self.assertEqual((reponse.data['enregistres'], reponse.data['rejetes']), (2, 3))
+        self.assertEqual(SuiviStatut.objects.filter(evenement_id__startswith='a').count(), 3)
+
+    def test_par_numero_bl_et_nombre_de_requetes_constant(self):
+        colis = self.colis_list[2]
+        scan = {**self.scan('b1', colis, 'DEDOUANEMENT', 0), 'numero_bl': colis.numero_bl}
+        del scan['colis']
+        reponse, _ = self.envoyer([scan])
+        self.assertEqual(reponse.data['enregistres'], 1)
+
+        def requetes(nombre):
+            lot = creer_colis(nombre, self.client_user, self.agent, self.douanier, prefixe=f'S{nombre}')
+            with CaptureQueriesContext(connection) as requetes:
+                self.envoyer([self.scan(f'{nombre}-{c.pk}', c, 'EN_TRANSIT', 2) for c in lot])
+            return len(requetes)
+
+        self.assertEqual(requetes(2), requetes(12))
+
+
+# --- 22. Machine à états du statut (transitions conditionnelles) ---
+
+@override_settings(CACHES=CACHES_MEMOIRE, EVENEMENTS_TEMPS_REEL={'BACKEND': 'transit.events.BusMemoire'})
+class TransitionsStatutTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis_list = creer_colis(3, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def suivre(self, colis, statut):
+        with mock.patch('logistics.views.envoyer_notifications_statut.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('suivi-statut-list'), {
+                'colis': str(colis.pk), 'statut': statut, 'localisation': 'Quai 2',
+            })
+
+    def test_un_seul_update_conditionnel(self):
+        colis = self.colis_list[0]
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(self.suivre(colis, 'EN_TRANSIT').status_code, 201)
+        ecritures = [q['sql'] for q in requetes if q['sql'].startswith('UPDATE "logistics_colis"')]
+        self.assertEqual(len(ecritures), 1)
+        self.assertIn('"statut_actuel" IN', ecritures[0])
+        self.assertIn('RETURNING', ecritures[0])
+        colis.refresh_from_db()
+        self.assertEqual(colis.statut_actuel, 'EN_TRANSIT')
+        self.assertEqual(ColisResume.objects.get(colis=colis).statut_actuel, 'EN_TRANSIT')
+
+    def test_transition_refusee(self):
+        colis = self.colis_list[1]
+        Colis.objects.filter(pk=colis.pk).update(statut_actuel='LIVRE')
+        historique = colis.historique_statuts.count()
+        reponse = self.suivre(colis, 'EN_TRANSIT')
+        self.assertEqual(reponse.status_code, 409)
+        self.assertIn('LIVRE -> EN_TRANSIT', reponse.data['detail'])
+        self.assertEqual(colis.historique_statuts.count(), historique)
+        # Un litige reste possible sur un colis livré
+        self.assertEqual(self.suivre(colis, 'LITIGE').status_code, 201)
+
+        # Dédouanement d'un colis livré : transition refusée, approbation annulée
+        Colis.objects.filter(pk=colis.pk).update(statut_actuel='LIVRE')
+        declaration = colis.declaration_douaniere
+        reponse = self.client.post(reverse('declaration-approve-declaration', args=[declaration.pk]))
+        self.assertEqual(reponse.status_code, 409)
+        declaration.refresh_from_db()
+        self.assertNotEqual(declaration.statut, 'CLEARED')
+
+    def test_lot_refuse_par_colis(self):
+        livre, autre = self.colis_list[2], self.colis_list[0]
+        Colis.objects.filter(pk=livre.pk).update(statut_actuel='LIVRE')
+        with mock.patch('logistics.statuts.envoyer_notifications_statut.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            reponse = self.client.post(reverse('suivi-statut-bulk'), {
+                'statut': 'PRET_RETRAIT', 'colis': [str(livre.pk), str(autre.pk)],
+            }, format='json')
+        self.assertEqual(reponse.data['appliques'], 1)
+        self.assertFalse(reponse.data['resultats'][0]['succes'])
+        self.assertIn('LIVRE -> PRET_RETRAIT', reponse.data['resultats'][0]['erreur'])
+        self.assertEqual(Colis.objects.get(pk=livre.pk).statut_actuel, 'LIVRE')
+
+
+# --- 23. Idempotency-Key sur les écritures ---
+
+CACHES_IDEMPOTENCE = {
+    **CACHES_MEMOIRE,
+    'idempotence': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'transit_idempotence'},
+}
+
+
+@override_settings(CACHES=CACHES_IDEMPOTENCE, EVENEMENTS_TEMPS_REEL={'BACKEND': 'transit.events.BusMemoire'})
+class IdempotenceTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.colis = creer_colis(1, cls.client_user, cls.agent, cls.douanier)[0]
+
+    def setUp(self):
+        # Le middleware identifie l'appelant par son JWT (avant DRF)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.agent)}')
+
+    def suivre(self, cle, localisation='Quai 1'):
+        with mock.patch('logistics.views.envoyer_notifications_statut.delay') as notifier, \
+                self.captureOnCommitCallbacks(execute=True):
+            reponse = self.client.post(reverse('suivi-statut-list'), {
+                'colis': str(self.colis.pk), 'statut': 'EN_TRANSIT', 'localisation': localisation,
+            }, format='json', HTTP_IDEMPOTENCY_KEY=cle)
+        return reponse, notifier
+
+    def cle_stockage(self, cle):
+        return f'idempotence:{self.agent.pk}:{hashlib.sha256(cle.encode()).hexdigest()}'
+
+    def test_nouvelle_tentative_rejouee(self):
+        premiere, notifier = self.suivre('k-1')
+        self.assertEqual(premiere.status_code, 201)
+        notifier.assert_called_once()
+        historique = self.colis.historique_statuts.count()
+
+        seconde, notifier = self.suivre('k-1')
+        self.assertEqual(seconde.status_code, 201)
+        self.assertEqual(seconde['Idempotent-Replayed'], 'true')
+        self.assertEqual(seconde.content, premiere.content)
+        self.assertEqual(self.colis.historique_statuts.count(), historique)
+        notifier.assert_not_called()
+
+        # Autre clé : nouvelle exécution ; même clé, autre requête : refusée
+        self.assertNotIn('Idempotent-Replayed', self.suivre('k-2')[0])
+        self.assertEqual(self.suivre('k-1', localisation='Quai 9')[0].status_code, 422)
+
+    def test_doublon_concurrent_attend_la_premiere(self):
+        premiere, _ = self.suivre('k-3')
+        cle = self.cle_stockage('k-3')
+        terminee = idempotence.store.get(cle)
+        # Première requête encore en cours : le doublon attend son résultat puis le rejoue
+        idempotence.store.set(cle, {'empreinte': terminee['empreinte']})
+        threading.Timer(0.2, idempotence.store.set, (cle, terminee)).start()
+        seconde, _ = self.suivre('k-3')
+        self.assertEqual((seconde.status_code, seconde['Idempotent-Replayed']), (201, 'true'))
+        self.assertEqual(seconde.content, premiere.content)
+
+        idempotence.store.set(cle, {'empreinte': terminee['empreinte']})
+        with mock.patch('transit.idempotence.ATTENTE_MAX', 0.1):
+            self.assertEqual(self.suivre('k-3')[0].status_code, 409)
+
+    @override_settings(CACHES={
+        **CACHES_IDEMPOTENCE,
+        'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:1/0'},
+    })
+    def test_repli_en_base_si_redis_indisponible(self):
+        self.addCleanup(setattr, idempotence.store, '_coupe_jusqua', 0.0)
+        premiere, _ = self.suivre('k-4')
+        self.assertIsNotNone(caches['idempotence'].get(self.cle_stockage('k-4')))
+        seconde, _ = self.suivre('k-4')
+        self.assertEqual(seconde['Idempotent-Replayed'], 'true')
+        self.assertEqual(seconde.content, premiere.content)
+
+    def test_table_de_repli_creee_par_migrate(self):
+        # Le lanceur de tests crée les tables de cache lui-même : on rejoue la migration sans elle
+        migration = importlib.import_module('logistics.migrations.0013_table_idempotence')
+
+        def appliquer(operation):
+            # Éditeur hors `with` (SQLite, transaction du test) : SQL différé (index) exécuté à la main
+            schema_editor = connection.schema_editor()
+            schema_editor.deferred_sql = []
+            operation(None, schema_editor)
+            for sql in schema_editor.deferred_sql:
+                schema_editor.execute(sql)
+
+        with connection.cursor() as curseur:
+            curseur.execute('DROP TABLE transit_idempotence')
+        appliquer(migration.creer_table)
+        with connection.cursor() as curseur:
+            colonnes = {c.name for c in connection.introspection.get_table_description(curseur, migration.TABLE)}
+        self.assertEqual(colonnes, {'cache_key', 'value', 'expires'})
+        # Le cache DatabaseCache l'utilise telle quelle
+        caches['idempotence'].set('cle', {'statut': 201})
+        self.assertEqual(caches['idempotence'].get('cle'), {'statut': 201})
+
+        # Retour arrière : la table est supprimée
+        appliquer(migration.supprimer_table)
+        self.assertNotIn(migration.TABLE, connection.introspection.table_names())
+        appliquer(migration.creer_table)
+
+
+# --- 24. Rejeu de l'historique (instantanés, commande rejouer_evenements) ---
+
+@override_settings(CACHES=CACHES_MEMOIRE, EVENEMENTS_TEMPS_REEL={'BACKEND': 'transit.events.BusMemoire'})
+class RejeuEvenementsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        # Historique jusqu'à DEDOUANEMENT en 'Zone A', statut_actuel resté EN_ATTENTE_DECHARGE
+        cls.colis_list = creer_colis(3, cls.client_user, cls.agent, cls.douanier)
+        cls.ids = [colis.pk for colis in cls.colis_list]
+
+    def etat(self, colis):
+        return Colis.objects.filter(pk=colis.pk).values_list('statut_actuel', 'lieu_stockage').get()
+
+    def test_derive_corrigee_et_instantanes(self):
+        resultat = evenements.rejouer(self.ids, intervalle=0)
+        self.assertEqual(resultat, {'colis': 3, 'evenements': 9, 'divergents': 3, 'corriges': 3})
+        self.assertEqual(self.etat(self.colis_list[0]), ('DEDOUANEMENT', 'Zone A'))
+        self.assertEqual(ColisResume.objects.get(colis=self.colis_list[0]).statut_actuel, 'DEDOUANEMENT')
+        self.assertEqual(InstantaneColis.objects.get(colis=self.colis_list[0]).evenements, 3)
+        # Instantanés à jour : plus rien à relire
+        self.assertEqual(evenements.rejouer(self.ids), {'colis': 3, 'evenements': 0, 'divergents': 0, 'corriges': 0})
+
+    def test_colis_modifie_pendant_le_rejeu_non_corrige(self):
+        colis = self.colis_list[0]
+        resultat = evenements.replier([colis.pk])
+        Colis.objects.filter(pk=colis.pk).update(lieu_stockage='Zone B')
+        self.assertEqual(evenements.enregistrer_rejeu(resultat), 0)
+        self.assertEqual(self.etat(colis), ('EN_ATTENTE_DECHARGE', 'Zone B'))
+
+    def test_rejeu_incremental_depuis_instantane(self):
+        colis = self.colis_list[1]
+        evenements.rejouer([colis.pk], intervalle=0)
+        self.client.force_authenticate(user=self.agent)
+        with mock.patch('logistics.views.envoyer_notifications_statut.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            reponse = self.client.post(reverse('suivi-statut-list'), {
+                'colis': str(colis.pk), 'statut': 'PRET_RETRAIT', 'localisation': 'Quai 2',
+            })
+        self.assertEqual(reponse.status_code, 201)
+        # Écriture en direct et rejeu s'accordent : la localisation devient le lieu de stockage
+        self.assertEqual(self.etat(colis), ('PRET_RETRAIT', 'Quai 2'))
+
+        Colis.objects.filter(pk=colis.pk).update(statut_actuel='EN_TRANSIT', lieu_stockage='Zone B')
+        with CaptureQueriesContext(connection) as requetes:
+            self.assertEqual(evenements.rejouer_colis(colis.pk), ('PRET_RETRAIT', 'Quai 2'))
+        lecture = next(q['sql'] for q in requetes if 'FROM "logistics_suivistatut"' in q['sql'])
+        self.assertIn('"logistics_suivistatut"."id" >', lecture)
+        # Un seul suivi depuis l'instantané : sous INTERVALLE_INSTANTANE, il n'est pas remplacé
+        self.assertEqual(InstantaneColis.objects.get(colis=colis).evenements, 3)
+
+    def test_suivi_tardif_impose_un_rejeu_complet(self):
+        colis = self.colis_list[2]
+        evenements.rejouer([colis.pk], intervalle=0)
+        premier = colis.historique_statuts.order_by('date_heure').first()
+        # Scan envoyé en retard, daté d'avant l'instantané
+        SuiviStatut.objects.bulk_create([SuiviStatut(
+            colis=colis, statut='EN_TRANSIT', localisation='Zone Z', agent_operationnel=self.agent,
+            date_heure=premier.date_heure - timezone.timedelta(hours=1),
+        )])
+        resultat = evenements.rejouer([colis.pk], intervalle=0)
+        self.assertEqual(resultat['evenements'], 4)
+        self.assertEqual(self.etat(colis), ('DEDOUANEMENT', 'Zone A'))
+        self.assertEqual(InstantaneColis.objects.get(colis=colis).evenements, 4)
+
+    def test_instantane_invalide_par_modification_de_l_historique(self):
+        colis = self.colis_list[0]
+        evenements.rejouer([colis.pk], intervalle=0)
+        suivi = colis.historique_statuts.order_by('date_heure').last()
+        suivi.localisation = 'Zone C'
+        suivi.save()
+        self.assertFalse(InstantaneColis.objects.filter(colis=colis).exists())
+        self.assertEqual(evenements.rejouer_colis(colis.pk), ('DEDOUANEMENT', 'Zone C'))
+        suivi.delete()
+        self.assertFalse(InstantaneColis.objects.filter(colis=colis).exists())
+        self.assertEqual(evenements.rejouer_colis(colis.pk), ('EN_TRANSIT', 'Zone A'))
+
+    def test_commande(self):
+        sortie = io.StringIO()
+        call_command('rejouer_evenements', '--processus', '1', '--taille-lot', '2', '--verifier', stdout=sortie)
+        self.assertIn('3 divergents', sortie.getvalue())
+        self.assertFalse(InstantaneColis.objects.exists())
+
+        call_command('rejouer_evenements', '--processus', '1', '--taille-lot', '2', stdout=sortie)
+        self.assertEqual(InstantaneColis.objects.count(), 3)
+        self.assertEqual(set(Colis.objects.values_list('statut_actuel', flat=True)), {'DEDOUANEMENT'})
+
+
+# --- 25. Voyages (compteurs incrémentaux, opérations sur tout un voyage) ---
+
+@override_settings(CACHES=CACHES_MEMOIRE, EVENEMENTS_TEMPS_REEL={'BACKEND': 'transit.events.BusMemoire'})
+class VoyagesTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.client_user, cls.agent, cls.douanier = creer_utilisateurs()
+        cls.voyage = Voyage.objects.create(navire='MSC Libreville', numero_voyage='MSC-241')
+        cls.colis_list = creer_colis(4, cls.client_user, cls.agent, cls.douanier)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.agent)
+
+    def rattacher(self, voyage, colis_list):
+        return self.client.post(reverse('voyage-rattacher', args=[voyage.pk]),
+                                {'colis': [str(colis.pk) for colis in colis_list]}, format='json')
+
+    def compteurs(self, voyage):
+        voyage.refresh_from_db()
+        return (voyage.colis_par_statut, voyage.poids_total_kg, voyage.colis_dedouanes)
+
+    def assertCompteursExacts(self, voyage):
+        """Les compteurs incrémentaux égalent un recomptage complet."""
+        incrementaux = self.compteurs(voyage)
+        recompter_voyages([voyage.pk])
+        self.assertEqual(incrementaux, self.compteurs(voyage))
+
+    def test_rattachement_et_resume_sur_une_ligne(self):
+        inconnu = uuid.uuid4()
+        reponse = self.client.post(reverse('voyage-rattacher', args=[self.voyage.pk]), {
+            'colis': [str(colis.pk) for colis in self.colis_list] + [str(inconnu)],
+        }, format='json')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual((reponse.data['rattaches'], reponse.data['introuvables']), (4, [str(inconnu)]))
+        self.assertEqual(reponse.data['voyage']['nombre_colis'], 4)
+        self.assertEqual(reponse.data['voyage']['colis_par_statut']['EN_ATTENTE_DECHARGE'], 4)
+        self.assertEqual(Decimal(reponse.data['voyage']['poids_total_kg']), Decimal('5002.000'))
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('voyage-detail', args=[self.voyage.pk])).status_code, 200)
+
+        # Déplacement vers un autre voyage : les deux voyages suivent
+        autre = Voyage.objects.create(navire='CMA Owendo', numero_voyage='CMA-17')
+        self.assertEqual(self.rattacher(autre, self.colis_list[:1]).data['rattaches'], 1)
+        self.assertEqual(self.compteurs(self.voyage)[0]['EN_ATTENTE_DECHARGE'], 3)
+        self.assertEqual(self.compteurs(autre)[1], Decimal('1250.500'))
+        self.assertEqual(self.client.delete(reverse('voyage-detail', args=[autre.pk])).status_code, 409)
+
+    def test_compteurs_suivent_chaque_changement(self):
+        self.rattacher(self.voyage, self.colis_list)
+        premier, deuxieme, troisieme, quatrieme = self.colis_list
+        with mock.patch('logistics.statuts.envoyer_notifications_statut.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            reponse = self.client.post(reverse('voyage-statut', args=[self.voyage.pk]), {
+                'statut': 'EN_TRANSIT', 'localisation': 'Quai 1', 'statut_actuel': 'EN_ATTENTE_DECHARGE',
+            }, format='json')
+        self.assertEqual((reponse.data['colis'], reponse.data['appliques']), (4, 4))
+        self.assertEqual(reponse.data['voyage']['colis_par_statut']['EN_TRANSIT'], 4)
+
+        with mock.patch('logistics.views.envoyer_notifications_statut.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('suivi-statut-list'), {'colis': str(premier.pk), 'statut': 'DEDOUANEMENT'})
+        self.client.post(reverse('declaration-approve-declaration', args=[premier.declaration_douaniere.pk]))
+        with mock.patch('logistics.scans.envoyer_notifications_statut.delay'), \
+                self.captureOnCommitCallbacks(execute=True):
+            date = (timezone.now() + timezone.timedelta(minutes=2)).isoformat()
+            self.client.post(reverse('suivi-statut-scans'), json.dumps({
+                'evenement_id': 'v1', 'colis': str(deuxieme.pk), 'statut': 'LITIGE', 'date': date,
+            }), content_type='application/x-ndjson')
+        self.client.patch(reverse('colis-detail', args=[troisieme.pk]), {'poids_kg': '100.000'}, format='json')
+        TransactionPaiement.objects.filter(colis=quatrieme).delete()
+        Colis.objects.get(pk=quatrieme.pk).delete()
+
+        colis_par_statut, poids, dedouanes = self.compteurs(self.voyage)
+        self.assertEqual(
+            {statut: nombre for statut, nombre in colis_par_statut.items() if nombre},
+            {'EN_TRANSIT': 1, 'PRET_RETRAIT': 1, 'LITIGE': 1},
+        )
+        self.assertEqual((poids, dedouanes), (Decimal('2601.000'), 1))
+        self.assertCompteursExacts(self.voyage)
+
+        # Rejeu de l'historique : les corrections suivent aussi
+        evenements.rejouer([colis.pk for colis in self.colis_list[:3]])
+        self.assertCompteursExacts(self.voyage)
+
+    def test_liste_des_colis_un_parcours_d_index(self):
+        self.rattacher(self.voyage, self.colis_list[:3])
+        reponse = self.client.get(reverse('voyage-colis', args=[self.voyage.pk]), {'page_size': 2})
+        self.assertEqual(len(reponse.data['results']), 2)
+        suite = self.client.get(reponse.data['next'])
+        self.assertEqual(len(suite.data['results']), 1)
+        plan = Colis.objects.filter(voyage=self.voyage).order_by('-date_arrivee', '-id').explain()
+        self.assertIn('colis_voyage_idx', plan)
+        self.assertEqual(self.client.get(reverse('voyage-colis', args=[uuid.uuid4()])).status_code, 404)
@@ -2,7 +2,7 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ColisViewSet, SuiviStatutViewSet, RetraitColisViewSet, FileUploadView, FactureViewSet, DeclarationDouaniereViewSet
+from .views import ColisViewSet, SuiviStatutViewSet, RetraitColisViewSet, FileUploadView, FactureViewSet, DeclarationDouaniereViewSet, SyncView, VoyageViewSet
 
 router = DefaultRouter()
 router.register('colis', ColisViewSet, basename='colis')
@@ -11,6 +11,7 @@ router.register('retraits', RetraitColisViewSet, basename='retrait')
 # --- AJOUT DES NOUVELLES ROUTES ---
 router.register('factures', FactureViewSet, basename='facture')
 router.register('declarations', DeclarationDouaniereViewSet, basename='declaration')
+router.register('voyages', VoyageViewSet, basename='voyage')
 # ----------------------------------
 
 # Les endpoints spécifiques sont gérés par le router
@@ -20,6 +21,8 @@ urlpatterns = [
     # 1. PLACEZ LE CHEMIN SPÉCIFIQUE EN PREMIER !
     # Django recherche la correspondance dans l'ordre, il trouvera celui-ci avant le router.
     path('retraits/upload-identite/', FileUploadView.as_view(), name='upload_identite'), 
+    # Synchronisation différentielle des applications mobiles
+    path('sync/', SyncView.as_view(), name='sync'),
     
     # 2. Le Router est inclus après, il prendra tout le reste.
     path('', include(router.urls)),
@@ -0,0 +1,13 @@
+# logistics/urls_asgi.py
+
+from django.urls import path
+
+from . import async_views
+
+# Servies uniquement sous ASGI (voir transit/urls_asgi.py) ; les autres cas
+# (écriture, ?fields=...) sont délégués aux vues DRF de logistics/urls.py.
+urlpatterns = [
+    path('colis/', async_views.liste_colis),
+    path('colis/track/', async_views.track_colis),
+    path('colis/<uuid:pk>/', async_views.detail_colis),
+]
@@ -3,9 +3,30 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from .models import Colis, SuiviStatut, RetraitColis, Facture, DeclarationDouaniere
-from .serializers import ColisSerializer, SuiviStatutSerializer, RetraitColisSerializer, RetraitColisCreateSerializer, FactureSerializer, DeclarationDouaniereSerializer
+from .models import Colis, SuiviStatut, RetraitColis, Facture, DeclarationDouaniere, ColisResume, Voyage
+from .serializers import HISTORIQUE_IMBRIQUE_MAX, ColisResumeSerializer, ColisSerializer, SuiviStatutSerializer, SuiviStatutLotSerializer, RetraitColisSerializer, RetraitColisCreateSerializer, FactureSerializer, DeclarationDouaniereSerializer
+from .serializers import ColisVoyageSerializer, RattachementVoyageSerializer, StatutVoyageSerializer, VoyageSerializer
 from django.shortcuts import get_object_or_404
+from django.db.models import Count, Prefetch, ProtectedError, Q
+from django.http import Http404
+from .cache import DUREE_CACHE_SUIVI, cles_suivi
+from .realtime import publier_colis
+from .manifestes import ManifesteInvalide, importer_manifeste, type_depuis_nom
+from .scans import ingerer_scans
+from .search import rechercher_colis
+from .statuts import appliquer_statut_en_masse, changer_statut, creer_suivi
+from .sync import JetonInvalide, lire_changements
+from .voyages import compter_dedouanement, rattacher_colis
+from transit.cache import cache, lecture_cache
+from transit.atomic import AtomicWritesMixin
+from transit.conditional import ConditionalGetMixin
+from transit.fastpath import FastReadMixin, constructeur_pour, limiter_par_parent
+from transit.pagination import KeysetPagination
+from transit.parsers import NDJSONParser
+from transit.sparse import SparseFieldsetViewMixin
+from payments.models import TransactionPaiement
+from payments.serializers import TransactionPaiementSerializer
+from rest_framework.generics import get_object_or_404 as get_object_or_404_api
 # logistics/views.py (Ajouter ou corriger ces imports au début du fichier)
 
 from rest_framework import viewsets, permissions, status
@@ -19,7 +40,7 @@ from drf_yasg.openapi import Parameter # <--- C'EST CELLE-CI LA BONNE !
 from rest_framework.permissions import IsAuthenticated
 
 # ... (imports existants)
-from .tasks import envoyer_notification_email 
+from .tasks import envoyer_notifications_statut
 from django.shortcuts import get_object_or_404 # Nécessaire si non importé
 from django.core.files.storage import default_storage
 from django.conf import settings
@@ -28,8 +49,11 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.utils import timezone
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
+import collections
+import io
+import itertools
 import uuid
 import random 
 from django.utils import timezone # <--- ASSUREZ-VOUS QUE C'EST BIEN LÀ !
@@ -53,11 +77,49 @@ file_upload_request_body = openapi.Schema(
 # -----------------------------------------------------------------
 
 
-class ColisViewSet(viewsets.ModelViewSet):
+class TimelinePagination(KeysetPagination):
+    """Pagination de l'historique d'un colis (index suivi_colis_date_idx)."""
+    ordering = '-date_heure'
+
+
+class HistoriquePagination(TimelinePagination):
+    """Pagination de l'historique imbriqué dans colis/{id}/dossier/."""
+    page_size = 20
+    cursor_query_param = 'historique_curseur'
+    page_size_query_param = 'historique_taille'
+
+
+class ColisViewSet(AtomicWritesMixin, ConditionalGetMixin, FastReadMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """CRUD pour la gestion des colis (accès restreint aux Agents/Admins)."""
-    queryset = Colis.objects.all()
+    # Plan de chargement : le client (client_name) en jointure, l'historique et
+    # ses agents en une seule requête supplémentaire (évite le N+1).
+    # L'historique imbriqué est limité aux HISTORIQUE_IMBRIQUE_MAX suivis les plus récents par colis.
+    historique_recent = limiter_par_parent(
+        SuiviStatut.objects.select_related('agent_operationnel'), 'colis', HISTORIQUE_IMBRIQUE_MAX
+    )
+    queryset = Colis.objects.select_related('client').prefetch_related(
+        Prefetch('historique_statuts', queryset=historique_recent)
+    )
+    ordering = '-date_arrivee'  # Clé de pagination (index colis_date_arrivee_idx)
+    fast_read = True  # Liste, suivi et timeline par le constructeur précompilé (voir transit.fastpath)
+    # Plan de chargement par champ pour ?fields= / ?expand= (voir SparseFieldsetViewMixin)
+    field_plans = {
+        'client_name': {'only': ('client__nom', 'client__prenoms'), 'select_related': ('client',)},
+        'historique_statuts': {'prefetch_related': (Prefetch('historique_statuts', queryset=historique_recent),)},
+    }
+    expand_plans = {
+        'client': {'only': ('client__nom', 'client__prenoms', 'client__email', 'client__telephone'),
+                   'select_related': ('client',)},
+    }
     serializer_class = ColisSerializer
     permission_classes = [IsAuthenticated]
+    # Champs publics du suivi (colis/track/ et colis/track-batch/)
+    champs_suivi = ('id', 'description', 'statut_actuel', 'historique_statuts')
+    suivi_lot_max = 200  # Références acceptées par colis/track-batch/
+    actions_lecture = ('track_batch',)  # POST en lecture seule : pas de transaction
+    actions_par_lots = ('importer',)  # Une transaction par lot de colis importés
+    recherche_limite = 20
+    recherche_limite_max = 100
 
     @swagger_auto_schema(
         manual_parameters=[
@@ -76,42 +138,385 @@ class ColisViewSet(viewsets.ModelViewSet):
         colis_id = request.query_params.get('id')
         if not colis_id:
             return Response({"detail": "Veuillez fournir l'ID unique du colis."}, status=status.HTTP_400_BAD_REQUEST)
-            
-        colis = get_object_or_404(Colis, id=colis_id)
+        try:
+            colis_id = uuid.UUID(colis_id)
+        except ValueError:
+            raise Http404
+
+        # Lecture traversante (Redis, repli local), sous la génération courante du colis (changée à
+        # chaque écriture) : lue avant la base, une reconstruction périmée n'est jamais servie
+        cle = cles_suivi([colis_id])[colis_id]
+        payload = lecture_cache(cle, lambda: self._construire_suivi(colis_id), DUREE_CACHE_SUIVI)
+        return Response(payload)
+
+    @swagger_auto_schema(
+        method='get',
+        manual_parameters=[
+            Parameter('ids', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="IDs (UUID) ou numéros de B/L séparés par des virgules (GET). "
+                                  "En POST : {\"ids\": [...]}."),
+        ]
+    )
+    @action(detail=False, methods=['get', 'post'], url_path='track-batch')
+    def track_batch(self, request):
+        """
+        Suivi de plusieurs colis (IDs ou numéros de B/L) en une seule requête HTTP.
+        Un résultat par référence, dans l'ordre de la demande, y compris les introuvables.
+        """
+        if request.method == 'POST':
+            references = request.data.get('ids') if hasattr(request.data, 'get') else None
+        else:
+            references = [ref.strip() for ref in request.query_params.get('ids', '').split(',') if ref.strip()]
+        if not isinstance(references, list) or not all(isinstance(ref, str) for ref in references):
+            return Response({"detail": "'ids' doit être une liste d'identifiants."}, status=status.HTTP_400_BAD_REQUEST)
+        if not 0 < len(references) <= self.suivi_lot_max:
+            return Response({"detail": f"Entre 1 et {self.suivi_lot_max} références par requête."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        uuids = {}
+        for ref in references:
+            try:
+                uuids[ref] = uuid.UUID(ref)
+            except ValueError:
+                pass
+
+        # Payloads déjà en cache (par ID, à la génération courante), puis une seule requête IN pour le reste
+        cles = cles_suivi(set(uuids.values()))
+        en_cache = cache.get_many(list(cles.values()))
+        par_id = {colis_id: en_cache[cle] for colis_id, cle in cles.items() if cle in en_cache}
+        par_bl = {}
+        ids_manquants = {colis_id for colis_id in uuids.values() if colis_id not in par_id}
+        numeros_bl = {ref for ref in references if ref not in uuids}
+        if ids_manquants or numeros_bl:
+            a_cacher = {}
+            for colis_id, numero_bl, payload in self._suivis(Q(id__in=ids_manquants) | Q(numero_bl__in=numeros_bl)):
+                par_id[colis_id] = par_bl[numero_bl] = payload
+                # Colis trouvés par B/L : génération inconnue avant la lecture, payload non mis en cache
+                if colis_id in cles:
+                    a_cacher[cles[colis_id]] = payload
+            cache.set_many(a_cacher, DUREE_CACHE_SUIVI)
+
+        resultats = []
+        for ref in references:
+            payload = par_id.get(uuids[ref]) if ref in uuids else par_bl.get(ref)
+            resultats.append({'reference': ref, 'trouve': payload is not None, 'colis': payload})
+        return Response({'resultats': resultats})
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            Parameter('statut', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Filtre sur le statut actuel."),
+            Parameter('client', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Filtre sur l'ID du client."),
+        ]
+    )
+    @action(detail=False, methods=['get'], url_path='resume')
+    def resume(self, request):
+        """Liste paginée des colis lue sur le modèle de lecture dénormalisé (une seule table)."""
+        queryset = ColisResume.objects.all()
+        if request.query_params.get('statut'):
+            queryset = queryset.filter(statut_actuel=request.query_params['statut'])
+        if request.query_params.get('client'):
+            try:
+                queryset = queryset.filter(client_id=uuid.UUID(request.query_params['client']))
+            except ValueError:
+                return Response({"detail": "Paramètre 'client' invalide."}, status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(ColisResumeSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'], url_path='tableau-de-bord')
+    def tableau_de_bord(self, request):
+        """Compteurs du tableau de bord, agrégés sur le modèle de lecture."""
+        par_statut = dict(
+            ColisResume.objects.order_by().values_list('statut_actuel').annotate(total=Count('pk'))
+        )
+        factures = dict(
+            ColisResume.objects.exclude(facture_statut='').order_by()
+            .values_list('facture_statut').annotate(total=Count('pk'))
+        )
+        declarations = dict(
+            ColisResume.objects.exclude(declaration_statut='').order_by()
+            .values_list('declaration_statut').annotate(total=Count('pk'))
+        )
+        return Response({
+            'colis_par_statut': {code: par_statut.get(code, 0) for code, _ in Colis.STATUT_CHOICES},
+            'total_colis': sum(par_statut.values()),
+            'factures_par_statut': factures,
+            'declarations_par_statut': declarations,
+        })
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            Parameter('historique_taille', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description="Nombre de suivis de l'historique par page (20 par défaut)."),
+            Parameter('historique_curseur', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="Curseur de la page d'historique (liens next / previous)."),
+        ]
+    )
+    @action(detail=True, methods=['get'], url_path='dossier')
+    def dossier(self, request, pk=None):
+        """
+        Dossier complet d'un colis en 3 requêtes : le colis avec client, facture,
+        déclaration et retrait (jointures), une page d'historique, les transactions.
+        """
+        colis = get_object_or_404_api(
+            Colis.objects.select_related(
+                'client', 'facture', 'declaration_douaniere__douanier', 'retrait_final__agent_validation'
+            ),
+            pk=pk,
+        )
+        self.check_object_permissions(request, colis)
+
+        pagination = HistoriquePagination()
+        historique = pagination.paginate_queryset(
+            SuiviStatut.objects.filter(colis=colis).select_related('agent_operationnel'), request
+        )
+        transactions = TransactionPaiement.objects.filter(colis=colis).order_by('date_heure_paiement', 'pk')
+
+        facture = getattr(colis, 'facture', None)
+        declaration = getattr(colis, 'declaration_douaniere', None)
+        retrait = getattr(colis, 'retrait_final', None)
+        champs_colis = [f for f in ColisSerializer().fields if f != 'historique_statuts']
+        # Le colis n'est pas répété dans chaque objet lié
+        champs_facture = [f for f in FactureSerializer().fields if f != 'colis_minimal']
+        champs_retrait = [f for f in RetraitColisSerializer().fields if f != 'colis_details']
+        return Response({
+            'colis': ColisSerializer(colis, fields=champs_colis).data,
+            'historique': {
+                'next': pagination.get_next_link(),
+                'previous': pagination.get_previous_link(),
+                'results': SuiviStatutSerializer(historique, many=True).data,
+            },
+            'facture': FactureSerializer(facture, fields=champs_facture).data if facture else None,
+            'declaration': DeclarationDouaniereSerializer(declaration).data if declaration else None,
+            'retrait': RetraitColisSerializer(retrait, fields=champs_retrait).data if retrait else None,
+            'transactions': TransactionPaiementSerializer(transactions, many=True).data,
+        })
+
+    @action(detail=True, methods=['get'], url_path='timeline')
+    def timeline(self, request, pk=None):
+        """Historique complet d'un colis, du plus récent au plus ancien, paginé par curseur."""
+        try:
+            colis_id = uuid.UUID(str(pk))
+        except ValueError:
+            raise Http404
+        pagination = TimelinePagination()
+        queryset = SuiviStatut.objects.filter(colis_id=colis_id)
+        constructeur = constructeur_pour(SuiviStatutSerializer()) if self.fast_read else None
+        if constructeur is not None:
+            page = pagination.paginate_queryset(constructeur.requete(queryset, 'date_heure'), request)
+            donnees = constructeur.construire(page)
+        else:
+            page = pagination.paginate_queryset(queryset.select_related('agent_operationnel'), request)
+            donnees = SuiviStatutSerializer(page, many=True).data
+        if not page and not Colis.objects.filter(pk=colis_id).exists():
+            raise Http404
+        return pagination.get_paginated_response(donnees)
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            Parameter('q', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING, required=True,
+                      description="Numéro de B/L (même incomplet ou mal saisi), mots de la description "
+                                  "ou nom du client."),
+            Parameter('limite', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description="Nombre maximal de résultats (20 par défaut, 100 au plus)."),
+        ]
+    )
+    @action(detail=False, methods=['get'], url_path='search')
+    def search(self, request):
+        """Recherche classée des colis : B/L tolérant aux fautes (trigrammes) et plein texte (FTS5)."""
+        requete = request.query_params.get('q', '').strip()
+        if not requete:
+            return Response({"detail": "Paramètre 'q' requis."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limite = min(int(request.query_params.get('limite', self.recherche_limite)), self.recherche_limite_max)
+        except ValueError:
+            limite = 0
+        if limite < 1:
+            return Response({"detail": "Paramètre 'limite' invalide."}, status=status.HTTP_400_BAD_REQUEST)
+
+        pertinences = dict(rechercher_colis(requete, limite))
+        colis = self.get_queryset().filter(pk__in=pertinences).in_bulk()
+        ordonnes = [colis[pk] for pk in pertinences if pk in colis]
+        donnees = self.get_serializer(ordonnes, many=True).data
+        return Response({'resultats': [
+            {**ligne, 'pertinence': round(pertinences[objet.pk], 6)} for objet, ligne in zip(ordonnes, donnees)
+        ]})
+
+    @swagger_auto_schema(
+        method='post',
+        manual_parameters=[
+            Parameter('fichier', in_=openapi.IN_FORM, type=openapi.TYPE_FILE, required=True,
+                      description="Manifeste CSV ou NDJSON (numero_bl, description, poids_kg, dimensions, "
+                                  "lieu_stockage, client_email ou client_telephone)."),
+            Parameter('type', in_=openapi.IN_FORM, type=openapi.TYPE_STRING,
+                      description="'csv' ou 'ndjson' (par défaut : extension du fichier)."),
+            Parameter('voyage', in_=openapi.IN_FORM, type=openapi.TYPE_STRING,
+                      description="ID du voyage auquel rattacher les colis importés."),
+        ]
+    )
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser])
+    def importer(self, request):
+        """
+        Importe le manifeste d'un navire (des dizaines de milliers de lignes) en
+        flux : un rapport donne les colis créés, les doublons de B/L écartés et
+        les erreurs par ligne ; une ligne invalide n'interrompt pas l'import.
+        """
+        fichier = request.FILES.get('fichier')
+        if fichier is None:
+            return Response({"detail": "Fournir le manifeste dans le champ 'fichier'."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        type_manifeste = request.data.get('type') or type_depuis_nom(fichier.name)
+        voyage = None
+        if request.data.get('voyage'):
+            try:
+                voyage = Voyage.objects.filter(pk=uuid.UUID(request.data['voyage'])).first()
+            except ValueError:
+                pass
+            if voyage is None:
+                return Response({"detail": "Voyage introuvable."}, status=status.HTTP_400_BAD_REQUEST)
+        # Le fichier téléversé est lu en flux (fichier temporaire au-delà de FILE_UPLOAD_MAX_MEMORY_SIZE)
+        flux = io.TextIOWrapper(fichier.file, encoding='utf-8-sig', newline='')
+        try:
+            rapport = importer_manifeste(flux, type_manifeste, voyage=voyage)
+        except ManifesteInvalide as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({"detail": "Le manifeste doit être encodé en UTF-8."}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            flux.detach()
+        return Response(rapport.en_dict())
+
+    def _construire_suivi(self, colis_id):
+        suivis = self._suivis(Q(id=colis_id))
+        if not suivis:
+            raise Http404
+        return suivis[0][2]
+
+    def _suivis(self, filtre):
+        """Liste de (id, numero_bl, payload de suivi) des colis correspondant à `filtre`."""
         # On n'affiche que les infos publiques et l'historique de statut
-        serializer = ColisSerializer(colis, fields=('id', 'description', 'statut_actuel', 'historique_statuts'))
-        return Response(serializer.data)
+        constructeur = constructeur_pour(ColisSerializer(fields=self.champs_suivi)) if self.fast_read else None
+        if constructeur is None:
+            return [
+                (colis.pk, colis.numero_bl, dict(ColisSerializer(colis, fields=self.champs_suivi).data))
+                for colis in self.get_queryset().filter(filtre)
+            ]
+        # Une requête pour les colis, une pour tout leur historique
+        lignes = list(constructeur.requete(Colis.objects.filter(filtre), 'numero_bl'))
+        return [
+            (ligne.pk, ligne.numero_bl, payload)
+            for ligne, payload in zip(lignes, constructeur.construire(lignes))
+        ]
 
-class SuiviStatutViewSet(viewsets.ModelViewSet):
+class SuiviStatutViewSet(AtomicWritesMixin, FastReadMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """CRUD pour les mises à jour de statut (utilisé par les agents)."""
-    queryset = SuiviStatut.objects.all()
+    queryset = SuiviStatut.objects.select_related('agent_operationnel')
+    ordering = '-date_heure'
+    fast_read = True
+    field_plans = {
+        'agent_operationnel_name': {'only': ('agent_operationnel__nom', 'agent_operationnel__prenoms'),
+                                    'select_related': ('agent_operationnel',)},
+    }
+    expand_plans = {
+        'agent_operationnel': {'only': ('agent_operationnel__nom', 'agent_operationnel__prenoms',
+                                        'agent_operationnel__email', 'agent_operationnel__telephone'),
+                               'select_related': ('agent_operationnel',)},
+    }
     serializer_class = SuiviStatutSerializer
     permission_classes = [IsAuthenticated]
-    
+    lot_max = 5000  # Colis par mise à jour en masse (suivi-statuts/bulk/)
+    scans_max = 5000  # Événements par envoi des terminaux (suivi-statuts/scans/)
+
+    @swagger_auto_schema(method='post', request_body=SuiviStatutLotSerializer)
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Applique un statut et une localisation à un lot de colis (ex: déchargement
+        d'un navire) en une transaction : {"statut", "localisation", "colis": [IDs]}
+        ou {"statut", "localisation", "filtre": {"lieu_stockage": ...}}.
+        Un résultat par colis ; les colis introuvables n'empêchent pas les autres.
+        """
+        entree = SuiviStatutLotSerializer(data=request.data)
+        entree.is_valid(raise_exception=True)
+        donnees = entree.validated_data
+        references = donnees.get('colis')
+        if references is None:
+            references = [str(pk) for pk in Colis.objects.filter(**donnees['filtre']).values_list('pk', flat=True)
+                          [:self.lot_max + 1]]
+        if len(references) > self.lot_max:
+            return Response({"detail": f"Au plus {self.lot_max} colis par mise à jour."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        resultats = appliquer_statut_en_masse(
+            references, donnees['statut'], donnees['localisation'], request.user, donnees['notes']
+        )
+        return Response({
+            'statut': donnees['statut'],
+            'appliques': sum(1 for resultat in resultats if resultat['succes']),
+            'resultats': resultats,
+        })
+
+    @swagger_auto_schema(
+        method='post',
+        operation_description="Corps application/x-ndjson, un événement par ligne : "
+                              '{"evenement_id", "colis" ou "numero_bl", "statut", "localisation", "date", "appareil"}.',
+    )
+    @action(detail=False, methods=['post'], url_path='scans', parser_classes=[NDJSONParser])
+    def scans(self, request):
+        """
+        Reçoit les scans des terminaux de quai, y compris envoyés en retard
+        (voir logistics.scans) : événements déjà reçus et scans répétés
+        écartés, historique daté de l'heure du scan. Un résultat par ligne.
+        """
+        # Corps vide : DRF ne passe pas par le parser
+        lignes = request.data if not isinstance(request.data, dict) else ()
+        lignes = list(itertools.islice(lignes, self.scans_max + 1))
+        if len(lignes) > self.scans_max:
+            return Response({"detail": f"Au plus {self.scans_max} événements par envoi."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        resultats = ingerer_scans(lignes, request.user)
+        compteurs = collections.Counter(resultat['resultat'] for resultat in resultats)
+        return Response({
+            'evenements': len(resultats),
+            'enregistres': compteurs['enregistre'],
+            'deja_recus': compteurs['deja_recu'],
+            'repetitions': compteurs['repetition'],
+            'rejetes': compteurs['rejete'],
+            'resultats': resultats,
+        })
+
     def perform_create(self, serializer):
-        """Met à jour le statut_actuel du Colis parent après création du SuiviStatut."""
-        statut_instance = serializer.save(agent_operationnel=self.request.user)
-        colis = statut_instance.colis
-        colis.statut_actuel = statut_instance.statut
-        colis.save()
-        
-        # --- Déclenchement ASYNCHRONE ---
-        client_email = colis.client.email
-        
-        sujet = f"PPPI : Mise à jour de votre colis #{colis.id}"
-        message = f"Le statut de votre colis ({colis.numero_bl}) a été mis à jour.\nNouveau statut : {colis.get_statut_actuel_display()}\nLocalisation : {statut_instance.localisation}"
-        
-        # Lancement de la tâche Celery (appel non bloquant)
-        envoyer_notification_email.delay(client_email, sujet, message) 
-        
-        # Ici, vous pourriez aussi ajouter envoyer_notification_sms.delay(...)
-        # Ici, ajouter la logique de notification automatique (asynchrone)
+        """
+        Change le statut_actuel du Colis parent (transition conditionnelle, 409
+        si TRANSITIONS l'interdit) puis crée le SuiviStatut, dans la transaction
+        de la requête.
+        """
+        statut = serializer.validated_data['statut']
+        colis = changer_statut(
+            serializer.validated_data['colis'].pk, statut, serializer.validated_data.get('localisation', '')
+        )
+        statut_instance = serializer.instance = creer_suivi(
+            **serializer.validated_data, agent_operationnel=self.request.user
+        )
+        publier_colis(colis, 'suivi', localisation=statut_instance.localisation)
+
+        # --- Déclenchement ASYNCHRONE, après validation (adresse du client lue par la tâche) ---
+        ids_notifies, localisation = [str(colis.pk)], statut_instance.localisation
+        transaction.on_commit(lambda: envoyer_notifications_statut.delay(ids_notifies, statut, localisation))
+
 
 # logistics/views.py
 
-class RetraitColisViewSet(viewsets.ModelViewSet):
+class RetraitColisViewSet(AtomicWritesMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """CRUD pour la validation des retraits (nécessite des permissions fortes)."""
-    queryset = RetraitColis.objects.all()
+    # colis_details (ColisMinimalSerializer -> client) et agent_details en jointure
+    queryset = RetraitColis.objects.select_related('colis__client', 'agent_validation')
+    ordering = '-date_heure_retrait'
+    # signature_client (Base64, volumineux) n'est lu que s'il est demandé
+    field_plans = {
+        'colis_details': {'select_related': ('colis__client',)},
+        'agent_details': {'select_related': ('agent_validation',)},
+    }
     serializer_class = RetraitColisSerializer
     permission_classes = [IsAuthenticated]
     
@@ -126,14 +531,15 @@ class RetraitColisViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """Met à jour le statut_actuel du Colis parent après création du RetraitColis."""
         
-        # 1. Sauvegarde l'instance. 
+        # 1. Passage du Colis à 'LIVRE' (transition conditionnelle : 409 s'il n'est pas prêt au retrait)
+        colis = changer_statut(serializer.validated_data['colis'].pk, 'LIVRE')
+        # Tout changement de statut figure dans l'historique, rejoué par logistics.evenements
+        creer_suivi(colis_id=colis.pk, statut='LIVRE', agent_operationnel=self.request.user, notes="Retrait validé.")
+
+        # 2. Sauvegarde l'instance (son post_save met à jour le résumé avec le nouveau statut).
         # L'ID de l'agent est déjà dans serializer.validated_data, donc pas d'injection forcée.
-        retrait_instance = serializer.save()
-        
-        # 2. Mise à jour du statut du Colis à 'LIVRE'
-        colis = retrait_instance.colis
-        colis.statut_actuel = 'LIVRE' 
-        colis.save()
+        serializer.save()
+        publier_colis(colis, 'retrait')
         
         # 3. (OPTIONNEL) Déclencher une notification
         # Vous pouvez appeler ici une tâche Celery pour confirmer la livraison.
@@ -219,9 +625,16 @@ from .serializers import FactureSerializer, DeclarationDouaniereSerializer
 # Assurez-vous d'avoir IsAuthenticated, Response, status, action, swagger_auto_schema importés
 
 # --- 4. Vues pour les Factures ---
-class FactureViewSet(viewsets.ModelViewSet):
+class FactureViewSet(AtomicWritesMixin, ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """CRUD pour la gestion des factures."""
-    queryset = Facture.objects.all()
+    # colis_minimal (ColisMinimalSerializer -> client) en jointure
+    queryset = Facture.objects.select_related('colis__client')
+    ordering = '-date_emission'
+    # colis_minimal dépend aussi de la version du colis
+    etag_fields = ('version', 'date_modification', 'colis__version', 'colis__date_modification')
+    field_plans = {
+        'colis_minimal': {'select_related': ('colis__client',)},
+    }
     serializer_class = FactureSerializer
     # Permission: Les agents et clients peuvent voir leurs propres factures, les admins toutes
     permission_classes = [IsAuthenticated]
@@ -244,9 +657,14 @@ class FactureViewSet(viewsets.ModelViewSet):
 
 
 # --- 5. Vues pour les Déclarations Douanières ---
-class DeclarationDouaniereViewSet(viewsets.ModelViewSet):
+class DeclarationDouaniereViewSet(AtomicWritesMixin, ConditionalGetMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """CRUD pour la gestion des déclarations douanières (principalement par les Douaniers)."""
-    queryset = DeclarationDouaniere.objects.all()
+    # douanier_details en jointure
+    queryset = DeclarationDouaniere.objects.select_related('douanier')
+    ordering = '-date_soumission'
+    field_plans = {
+        'douanier_details': {'select_related': ('douanier',)},
+    }
     serializer_class = DeclarationDouaniereSerializer
     # Permission: Seuls les utilisateurs ayant le rôle "Douanier" ou Admin devraient avoir un accès complet
     permission_classes = [IsAuthenticated] 
@@ -263,16 +681,177 @@ class DeclarationDouaniereViewSet(viewsets.ModelViewSet):
     )
     @action(detail=True, methods=['post'], url_path='approve')
     def approve_declaration(self, request, pk=None):
-        declaration = get_object_or_404(DeclarationDouaniere, pk=pk)
-        if declaration.statut != 'CLEARED':
-            declaration.statut = 'CLEARED'
-            declaration.date_dedouanement = timezone.now()
-            declaration.save()
-            
-            # Mettre à jour le statut du colis à "Prêt au Retrait" si nécessaire
-            colis = declaration.colis
-            colis.statut_actuel = 'PRET_RETRAIT'
-            colis.save()
+        declaration = get_object_or_404_api(DeclarationDouaniere.objects.only('colis_id'), pk=pk)
+        # UPDATE conditionnel : deux approbations simultanées ne dédouanent qu'une fois
+        approuvee = DeclarationDouaniere.objects.filter(pk=declaration.pk).exclude(statut='CLEARED').update(
+            statut='CLEARED', date_dedouanement=timezone.now()
+        )
+        if approuvee:
+            # Mettre à jour le statut du colis à "Prêt au Retrait" (409 si TRANSITIONS l'interdit)
+            colis = changer_statut(declaration.colis_id, 'PRET_RETRAIT')
+            # Suivi de l'historique (rejoué par logistics.evenements) ; son post_save recalcule le
+            # résumé, statut de la déclaration compris (update() n'émet pas post_save)
+            creer_suivi(colis_id=colis.pk, statut='PRET_RETRAIT', agent_operationnel=request.user,
+                        notes="Déclaration dédouanée.")
+            compter_dedouanement(colis.pk)
+            publier_colis(colis, 'dedouanement')
             
             return Response({'statut': 'CLEARED', 'message': 'Déclaration approuvée et Colis prêt au retrait.'}, status=status.HTTP_200_OK)
-        return Response({'detail': 'La déclaration est déjà dédouanée.'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({'detail': 'La déclaration est déjà dédouanée.'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+# --- Voyages (escales de navires) ---
+
+class ColisVoyagePagination(KeysetPagination):
+    """Pagination des colis d'un voyage (index colis_voyage_idx)."""
+    ordering = '-date_arrivee'
+
+
+class VoyageViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
+    """
+    Voyages et opérations sur l'ensemble de leurs colis. Le résumé d'un voyage
+    (compteurs par statut, poids, dédouanés) est lu sur sa seule ligne.
+    """
+    queryset = Voyage.objects.all()
+    ordering = '-date_creation'  # Clé de pagination (index voyage_date_creation_idx)
+    serializer_class = VoyageSerializer
+    permission_classes = [IsAuthenticated]
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response({"detail": "Le voyage a encore des colis rattachés."}, status=status.HTTP_409_CONFLICT)
+
+    @swagger_auto_schema(
+        method='get',
+        manual_parameters=[
+            Parameter('statut', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING, description="Filtre sur le statut actuel."),
+        ]
+    )
+    @action(detail=True, methods=['get'], url_path='colis')
+    def colis(self, request, pk=None):
+        """Colis du voyage, du plus récent au plus ancien, paginés par curseur (un parcours d'index)."""
+        try:
+            voyage_id = uuid.UUID(str(pk))
+        except ValueError:
+            raise Http404
+        queryset = Colis.objects.filter(voyage_id=voyage_id).only(*ColisVoyageSerializer.Meta.fields)
+        if request.query_params.get('statut'):
+            queryset = queryset.filter(statut_actuel=request.query_params['statut'])
+        pagination = ColisVoyagePagination()
+        page = pagination.paginate_queryset(queryset, request)
+        if not page and not Voyage.objects.filter(pk=voyage_id).exists():
+            raise Http404
+        return pagination.get_paginated_response(ColisVoyageSerializer(page, many=True).data)
+
+    @swagger_auto_schema(method='post', request_body=StatutVoyageSerializer)
+    @action(detail=True, methods=['post'], url_path='statut')
+    def statut(self, request, pk=None):
+        """
+        Applique un statut à tous les colis du voyage (ex: déchargement du
+        navire), comme suivi-statuts/bulk/ : transitions conditionnelles,
+        historique, notifications. Les colis refusés sont détaillés.
+        """
+        voyage = self.get_object()
+        entree = StatutVoyageSerializer(data=request.data)
+        entree.is_valid(raise_exception=True)
+        donnees = entree.validated_data
+        colis = Colis.objects.filter(voyage=voyage)
+        if 'statut_actuel' in donnees:
+            colis = colis.filter(statut_actuel=donnees['statut_actuel'])
+        resultats = appliquer_statut_en_masse(
+            [str(pk) for pk in colis.values_list('pk', flat=True)],
+            donnees['statut'], donnees['localisation'], request.user, donnees['notes'],
+        )
+        voyage.refresh_from_db()
+        return Response({
+            'statut': donnees['statut'],
+            'colis': len(resultats),
+            'appliques': sum(1 for resultat in resultats if resultat['succes']),
+            'refuses': [resultat for resultat in resultats if not resultat['succes']],
+            'voyage': VoyageSerializer(voyage).data,
+        })
+
+    @swagger_auto_schema(method='post', request_body=RattachementVoyageSerializer)
+    @action(detail=True, methods=['post'], url_path='rattacher')
+    def rattacher(self, request, pk=None):
+        """Rattache des colis (IDs) au voyage, en les retirant de leur voyage précédent."""
+        voyage = self.get_object()
+        entree = RattachementVoyageSerializer(data=request.data)
+        entree.is_valid(raise_exception=True)
+        demandes = set(entree.validated_data['colis'])
+        rattaches = rattacher_colis(voyage, demandes)
+        connus = set(Colis.objects.filter(pk__in=demandes).values_list('pk', flat=True))
+        voyage.refresh_from_db()
+        return Response({
+            'rattaches': len(rattaches),
+            'introuvables': sorted(str(pk) for pk in demandes - connus),
+            'voyage': VoyageSerializer(voyage).data,
+        })
+
+
+# --- Synchronisation différentielle (applications mobiles) ---
+
+class SyncView(APIView):
+    """
+    Renvoie les colis, suivis, factures et déclarations créés, modifiés ou
+    supprimés depuis le jeton fourni, limités aux colis de l'appelant (tous
+    pour le personnel). Sans jeton, tout le périmètre est transmis, par lots.
+
+    Tant que `suite` est vrai, le client rappelle l'endpoint avec le jeton
+    renvoyé ; il le conserve ensuite pour la prochaine synchronisation.
+    """
+    permission_classes = [IsAuthenticated]
+    taille_lot = 500
+    taille_lot_max = 1000
+    # Type d'objet -> (clé de la réponse, sérialiseur, champs exclus)
+    # (l'historique et le colis imbriqués sont synchronisés séparément)
+    serialiseurs = {
+        'colis': ('colis', ColisSerializer, ('historique_statuts',)),
+        'suivi': ('suivis', SuiviStatutSerializer, ()),
+        'facture': ('factures', FactureSerializer, ('colis_minimal',)),
+        'declaration': ('declarations', DeclarationDouaniereSerializer, ()),
+    }
+
+    @swagger_auto_schema(
+        manual_parameters=[
+            Parameter('jeton', in_=openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                      description="Jeton renvoyé par la synchronisation précédente (vide : synchronisation complète)."),
+            Parameter('limite', in_=openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                      description="Nombre maximal de changements par lot (500 par défaut, 1000 au plus)."),
+        ]
+    )
+    def get(self, request):
+        try:
+            limite = min(int(request.query_params.get('limite', self.taille_lot)), self.taille_lot_max)
+        except ValueError:
+            limite = 0
+        if limite < 1:
+            return Response({"detail": "Paramètre 'limite' invalide."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            changements, jeton, suite = lire_changements(request.user, request.query_params.get('jeton'), limite)
+        except JetonInvalide:
+            return Response({"detail": "Jeton de synchronisation invalide."}, status=status.HTTP_400_BAD_REQUEST)
+
+        modifies, supprimes = {}, {}
+        for type_objet, (cle, serializer_class, exclus) in self.serialiseurs.items():
+            ids = [c['objet_id'] for c in changements if c['type_objet'] == type_objet and not c['supprime']]
+            donnees = self._serialiser(serializer_class, exclus, ids) if ids else []
+            # Objet disparu entre-temps : transmis comme supprimé ; objet changé de client (personnel,
+            # qui reçoit aussi le tombstone de l'ancien propriétaire) : transmis comme modifié
+            trouves = {str(ligne['id']) for ligne in donnees}
+            modifies[cle] = donnees
+            supprimes[cle] = list(dict.fromkeys(
+                c['objet_id'] for c in changements
+                if c['type_objet'] == type_objet and c['objet_id'] not in trouves
+            ))
+        return Response({'jeton': jeton, 'suite': suite, 'modifies': modifies, 'supprimes': supprimes})
+
+    def _serialiser(self, serializer_class, exclus, ids):
+        serializer = serializer_class(fields=[f for f in serializer_class().fields if f not in exclus])
+        queryset = serializer_class.Meta.model.objects.filter(pk__in=ids).order_by('pk')
+        constructeur = constructeur_pour(serializer)
+        if constructeur is not None:
+            return constructeur.construire(constructeur.requete(queryset))
+        return serializer_class(queryset, many=True, fields=serializer.fields.keys()).data
@@ -0,0 +1,136 @@
+# logistics/voyages.py
+
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, F, Q, Sum
+
+from .models import Colis, DeclarationDouaniere, Voyage
+
+
+class Compteurs:
+    """
+    Incréments des compteurs de voyages accumulés pendant une écriture, puis
+    appliqués par appliquer() : un UPDATE par voyage touché, en F() (pas de
+    lecture, pas de mise à jour perdue entre transactions concurrentes).
+    """
+
+    def __init__(self):
+        self.increments = defaultdict(Counter)
+
+    def colis(self, voyage_id, statut, poids_kg, dedouane=False, signe=1):
+        """Ajoute (signe=1) ou retire (signe=-1) un colis des compteurs de son voyage."""
+        if voyage_id is None:
+            return
+        increments = self.increments[voyage_id]
+        increments[Voyage.CHAMPS_STATUT[statut]] += signe
+        increments['poids_total_kg'] += signe * Decimal(str(poids_kg))
+        if dedouane:
+            increments['colis_dedouanes'] += signe
+
+    def statut(self, voyage_id, ancien, nouveau):
+        if voyage_id is None or ancien == nouveau:
+            return
+        increments = self.increments[voyage_id]
+        increments[Voyage.CHAMPS_STATUT[ancien]] -= 1
+        increments[Voyage.CHAMPS_STATUT[nouveau]] += 1
+
+    def dedouanement(self, voyage_id, signe=1):
+        if voyage_id is not None:
+            self.increments[voyage_id]['colis_dedouanes'] += signe
+
+    def appliquer(self):
+        # Voyages dans un ordre fixe : deux transactions verrouillent leurs lignes dans le même ordre
+        for voyage_id in sorted(self.increments, key=str):
+            valeurs = {champ: F(champ) + n for champ, n in self.increments[voyage_id].items() if n}
+            if valeurs:
+                Voyage.objects.filter(pk=voyage_id).update(**valeurs)
+        self.increments.clear()
+
+
+def lire_statuts(queryset):
+    """
+    {pk: (voyage_id, statut_actuel)} des colis de `queryset` rattachés à un
+    voyage, verrouillés jusqu'à la fin de la transaction : lu juste avant un
+    changement de statut pour en reporter l'effet (voir reporter_statuts).
+    """
+    return {
+        pk: (voyage_id, statut_actuel)
+        for pk, voyage_id, statut_actuel in queryset.filter(voyage__isnull=False).select_for_update()
+        .values_list('pk', 'voyage_id', 'statut_actuel')
+    }
+
+
+def reporter_statuts(avant, nouveaux):
+    """Reporte sur les voyages les statuts écrits `nouveaux` ({pk: statut}) ; `avant` vient de lire_statuts()."""
+    compteurs = Compteurs()
+    for pk, statut in nouveaux.items():
+        if pk in avant:
+            voyage_id, ancien = avant[pk]
+            compteurs.statut(voyage_id, ancien, statut)
+    compteurs.appliquer()
+
+
+def compter_nouveaux(colis_list):
+    """Compteurs des colis créés par bulk_create (qui n'émet pas post_save)."""
+    compteurs = Compteurs()
+    for colis in colis_list:
+        compteurs.colis(colis.voyage_id, colis.statut_actuel, colis.poids_kg)
+    compteurs.appliquer()
+
+
+def compter_dedouanement(colis_id, signe=1):
+    """Reporte le dédouanement (signe=1) ou son annulation (signe=-1) d'un colis sur son voyage."""
+    voyage_id = Colis.objects.filter(pk=colis_id).values_list('voyage_id', flat=True).first()
+    if voyage_id is not None:
+        Voyage.objects.filter(pk=voyage_id).update(colis_dedouanes=F('colis_dedouanes') + signe)
+
+
+def rattacher_colis(voyage, colis_ids):
+    """
+    Rattache les colis `colis_ids` au voyage (en les retirant de leur voyage
+    précédent) en un UPDATE, compteurs des deux voyages mis à jour. Doit être
+    appelé dans une transaction ; retourne les pk des colis déplacés.
+    """
+    lignes = list(
+        Colis.objects.filter(pk__in=colis_ids).filter(Q(voyage__isnull=True) | ~Q(voyage=voyage))
+        .select_for_update().values_list('pk', 'voyage_id', 'statut_actuel', 'poids_kg')
+    )
+    if not lignes:
+        return []
+    dedouanes = set(
+        DeclarationDouaniere.objects.filter(colis_id__in=[pk for pk, *_ in lignes], statut='CLEARED')
+        .values_list('colis_id', flat=True)
+    )
+    compteurs = Compteurs()
+    for pk, voyage_id, statut, poids_kg in lignes:
+        compteurs.colis(voyage_id, statut, poids_kg, pk in dedouanes, signe=-1)
+        compteurs.colis(voyage.pk, statut, poids_kg, pk in dedouanes)
+    ids = [pk for pk, *_ in lignes]
+    # VersionedQuerySet.update() : version incrémentée, journal de synchronisation
+    Colis.objects.filter(pk__in=ids).update(voyage=voyage)
+    compteurs.appliquer()
+    return ids
+
+
+def recompter_voyages(voyage_ids):
+    """Recalcule entièrement les compteurs des voyages donnés (réparation, contrôle de cohérence)."""
+    voyage_ids = set(voyage_ids)
+    valeurs = {
+        voyage_id: {champ: 0 for champ in Voyage.CHAMPS_STATUT.values()} | {
+            'poids_total_kg': Decimal('0'), 'colis_dedouanes': 0,
+        }
+        for voyage_id in voyage_ids
+    }
+    for voyage_id, statut, nombre, poids_kg, dedouanes in (
+        Colis.objects.filter(voyage_id__in=voyage_ids).order_by().values('voyage_id', 'statut_actuel')
+        .annotate(nombre=Count('pk'), poids=Sum('poids_kg'),
+                  dedouanes=Count('pk', filter=Q(declaration_douaniere__statut='CLEARED')))
+        .values_list('voyage_id', 'statut_actuel', 'nombre', 'poids', 'dedouanes')
+    ):
+        compteurs = valeurs[voyage_id]
+        compteurs[Voyage.CHAMPS_STATUT[statut]] = nombre
+        compteurs['poids_total_kg'] += poids_kg
+        compteurs['colis_dedouanes'] += dedouanes
+    for voyage_id, compteurs in valeurs.items():
+        Voyage.objects.filter(pk=voyage_id).update(**compteurs)
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.7 on 2026-10-18 17:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0003_keyset_indexes'),
+        ('payments', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transactionpaiement',
+            index=models.Index(fields=['date_heure_paiement', 'id'], name='transaction_date_idx'),
+        ),
+    ]
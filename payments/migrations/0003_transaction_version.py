@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0002_transactionpaiement_transaction_date_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transactionpaiement',
+            name='date_modification',
+            field=models.DateTimeField(auto_now=True, verbose_name='Dernière Modification'),
+        ),
+        migrations.AddField(
+            model_name='transactionpaiement',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, verbose_name='Version'),
+        ),
+    ]
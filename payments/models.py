@@ -1,11 +1,11 @@
 from django.db import models
 from users.models import Utilisateur 
-from logistics.models import Colis 
+from logistics.models import Colis, VersionedModel
 import uuid
 
 # --- 1. Transaction de Paiement ---
 
-class TransactionPaiement(models.Model):
+class TransactionPaiement(VersionedModel):
     """Enregistrement de tous les frais et paiements associés à un colis."""
     STATUT_PAIEMENT_CHOICES = [
         ('EN_ATTENTE', 'En Attente'),
@@ -37,4 +37,7 @@ class TransactionPaiement(models.Model):
     class Meta:
         verbose_name = "Transaction de Paiement"
         verbose_name_plural = "Transactions de Paiement"
+        indexes = [
+            models.Index(fields=['date_heure_paiement', 'id'], name='transaction_date_idx'),
+        ]
 
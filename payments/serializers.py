@@ -1,13 +1,24 @@
 # payment/serializers.py
 from rest_framework import serializers
 from .models import TransactionPaiement
+from logistics.serializers import ColisMinimalSerializer
+from transit.fragments import FragmentCacheListSerializer
+from transit.sparse import SparseFieldsetMixin
+from users.serializers import ClientMinimalSerializer
 
-class TransactionPaiementSerializer(serializers.ModelSerializer):
-    colis_id = serializers.CharField(source='colis.id', read_only=True)
+class TransactionPaiementSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    # 'colis_id' est lu directement sur la ligne : aucune jointure vers Colis
+    colis_id = serializers.CharField(read_only=True)
     
     class Meta:
         model = TransactionPaiement
         fields = '__all__'
         read_only_fields = ('date_heure_paiement',)
+        expandable_fields = {
+            'colis': (ColisMinimalSerializer, {}),
+            'utilisateur_payeur': (ClientMinimalSerializer, {}),
+        }
+        list_serializer_class = FragmentCacheListSerializer
+        fragment_version_fields = ('version',)
 
 
@@ -0,0 +1,22 @@
+# payments/signals.py
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from logistics.read_models import synchroniser_resumes
+from logistics.signals import suppression_en_cascade
+from .models import TransactionPaiement
+
+
+# --- Total payé dans le résumé dénormalisé des colis ---
+
+@receiver(post_save, sender=TransactionPaiement)
+def transaction_enregistree(sender, instance, raw=False, **kwargs):
+    if not raw:
+        synchroniser_resumes([instance.colis_id])
+
+
+@receiver(post_delete, sender=TransactionPaiement)
+def transaction_supprimee(sender, instance, origin=None, **kwargs):
+    if not suppression_en_cascade(sender, instance, origin):
+        synchroniser_resumes([instance.colis_id])
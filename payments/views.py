@@ -4,9 +4,18 @@ from .models import TransactionPaiement
 from .serializers import TransactionPaiementSerializer
 
 from rest_framework.permissions import IsAuthenticated
+from transit.atomic import AtomicWritesMixin
+from transit.sparse import SparseFieldsetViewMixin
 
-class TransactionPaiementViewSet(viewsets.ModelViewSet):
+class TransactionPaiementViewSet(AtomicWritesMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
+    # Le sérialiseur ne lit que des colonnes locales (colis_id compris) :
+    # aucune jointure n'est nécessaire.
     queryset = TransactionPaiement.objects.all()
+    ordering = '-date_heure_paiement'
+    expand_plans = {
+        'colis': {'select_related': ('colis__client',)},
+        'utilisateur_payeur': {'select_related': ('utilisateur_payeur',)},
+    }
     serializer_class = TransactionPaiementSerializer
     permission_classes = [IsAuthenticated]
     # Nécessite des permissions pour initier/confirmer
\ No newline at end of file
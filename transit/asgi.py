@@ -13,4 +13,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "transit.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Importés après l'initialisation de Django (modèles)
+from logistics.realtime import CHEMIN_FLUX_COLIS, FluxColis  # noqa: E402
+from transit.sse import routeur  # noqa: E402
+
+# Flux temps réel (Server-Sent Events) servis hors de la pile Django ; le reste est délégué à Django
+application = routeur(django_application, {CHEMIN_FLUX_COLIS: FluxColis()})
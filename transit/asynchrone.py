@@ -0,0 +1,119 @@
+# transit/asynchrone.py
+
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse
+from django.urls import resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import APIException, AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .renderers import ORJSONRenderer
+
+# En-têtes Accept servis par les vues asynchrones (le reste passe par DRF :
+# API navigable, format en colonnes, JSON indenté...)
+ACCEPT_JSON = frozenset({'', '*/*', 'application/json'})
+
+_renderer = ORJSONRenderer()
+
+
+class JWTAuthentificationAsynchrone(JWTAuthentication):
+    """JWTAuthentication dont l'utilisateur est lu par l'ORM asynchrone (même contrôles)."""
+
+    async def aauthentifier(self, request):
+        """Retourne l'utilisateur du jeton, None sans en-tête ; lève AuthenticationFailed / InvalidToken."""
+        entete = self.get_header(request)
+        brut = self.get_raw_token(entete) if entete is not None else None
+        if brut is None:
+            return None
+        return await self.aget_user(self.get_validated_token(brut))
+
+    async def aget_user(self, jeton):
+        try:
+            utilisateur_id = jeton[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+        try:
+            utilisateur = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: utilisateur_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+        if api_settings.CHECK_USER_IS_ACTIVE and not utilisateur.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if jeton.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(utilisateur.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return utilisateur
+
+
+class Deleguer(Exception):
+    """La vue asynchrone ne sait pas servir la requête : la vue DRF habituelle s'en charge."""
+
+
+def reponse_json(donnees, statut=200):
+    """Réponse JSON rendue comme par l'ORJSONRenderer des vues DRF."""
+    reponse = HttpResponse(_renderer.render(donnees), content_type='application/json', status=statut)
+    patch_vary_headers(reponse, ('Accept',))
+    return reponse
+
+
+async def deleguer(request, *args, **kwargs):
+    """Sert la requête par la vue de l'urlconf principale (DRF, synchrone)."""
+    correspondance = resolve(request.path_info, urlconf=settings.ROOT_URLCONF)
+    return await sync_to_async(correspondance.func)(request, *correspondance.args, **correspondance.kwargs)
+
+
+def lecture_asynchrone(parametres=()):
+    """
+    Décorateur des vues de lecture asynchrones (ASGI). Seul le cas courant est
+    servi sans thread : GET en JSON, paramètres de `parametres` uniquement,
+    JWT valide (utilisateur lu par l'ORM asynchrone). Tout le reste — autres
+    méthodes, ?fields / ?expand / ?format, erreurs d'authentification ou de
+    pagination, ou exception Deleguer levée par la vue — est délégué à la vue
+    DRF, qui produit exactement la réponse habituelle.
+    """
+    permis = frozenset(parametres)
+
+    def decorateur(vue):
+        @wraps(vue)
+        async def envelopper(request, *args, **kwargs):
+            if (request.method != 'GET' or request.headers.get('Accept', '').strip() not in ACCEPT_JSON
+                    or not permis.issuperset(request.GET)):
+                return await deleguer(request)
+            try:
+                utilisateur = await JWTAuthentificationAsynchrone().aauthentifier(request)
+                if utilisateur is None:
+                    raise Deleguer
+                request.user = utilisateur
+                return await vue(request, *args, **kwargs)
+            except (Deleguer, APIException, InvalidToken, TokenError):
+                return await deleguer(request)
+        return envelopper
+    return decorateur
+
+
+class AsgiUrlconfMiddleware:
+    """
+    Sous ASGI, résout les requêtes avec `ASGI_ROOT_URLCONF` (vues de lecture
+    asynchrones en tête, puis l'urlconf principale). Sous WSGI, rien ne change.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.urlconf = getattr(settings, 'ASGI_ROOT_URLCONF', None)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.urlconf and isinstance(request, ASGIRequest):
+            request.urlconf = self.urlconf
+        return self.get_response(request)
@@ -0,0 +1,30 @@
+# transit/atomic.py
+
+from django.db import transaction
+from rest_framework.permissions import SAFE_METHODS
+
+
+class AtomicWritesMixin:
+    """
+    Exécute les requêtes d'écriture (POST, PUT, PATCH, DELETE) d'un ViewSet
+    dans une transaction : l'écriture principale et les mises à jour dérivées
+    (signaux, modèles de lecture) sont validées ou annulées ensemble.
+
+    Les lectures ne sont pas enveloppées (pas de BEGIN/COMMIT inutile),
+    contrairement à ATOMIC_REQUESTS, y compris les actions listées dans
+    `actions_lecture` (lectures exposées en POST, ex: corps trop long pour une URL).
+    Les actions de `actions_par_lots` gèrent leurs propres transactions
+    (ex: import validé lot par lot).
+    """
+    actions_lecture = ()
+    actions_par_lots = ()
+
+    def dispatch(self, request, *args, **kwargs):
+        action = getattr(self, 'action_map', {}).get(request.method.lower())
+        if request.method in SAFE_METHODS or action in self.actions_lecture or action in self.actions_par_lots:
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic():
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code >= 400:
+                transaction.set_rollback(True)
+            return response
@@ -0,0 +1,195 @@
+# transit/batch.py
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from django.db import connection, transaction
+from django.http import HttpRequest, QueryDict
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+PREFIXE_API = '/api/v1/'
+METHODES = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE')
+METHODES_LECTURE = ('GET', 'HEAD')
+# En-têtes des sous-réponses renvoyés au client (ex: pour ses GET conditionnels)
+ENTETES_REPONSE = ('ETag', 'Last-Modified', 'Location')
+
+
+class SousRequeteInvalide(ValueError):
+    """Sous-requête mal formée (méthode, url ou corps)."""
+
+
+class _SousRequete(HttpRequest):
+    """
+    Requête interne construite à partir de la requête du lot : même hôte,
+    même schéma et même identité (l'utilisateur déjà authentifié par le JWT
+    du lot est transmis à DRF, sans nouveau décodage du jeton).
+    """
+
+    def __init__(self, parent, methode, url, corps, entetes):
+        super().__init__()
+        morceaux = urlsplit(url)
+        donnees = b'' if corps is None else json.dumps(corps).encode()
+        self.method = methode
+        self.path = self.path_info = morceaux.path
+        self.META = {
+            **{cle: valeur for cle, valeur in parent.META.items() if isinstance(valeur, str)},
+            'REQUEST_METHOD': methode,
+            'PATH_INFO': morceaux.path,
+            'QUERY_STRING': morceaux.query,
+            'CONTENT_TYPE': 'application/json',
+            'CONTENT_LENGTH': str(len(donnees)),
+            'HTTP_ACCEPT': 'application/json',
+        }
+        for nom, valeur in (entetes or {}).items():
+            self.META['HTTP_' + nom.upper().replace('-', '_')] = str(valeur)
+        self.GET = QueryDict(morceaux.query)
+        self._stream = BytesIO(donnees)
+        self._read_started = False
+        self._schema = parent.scheme
+        self.user = parent.user
+        self._force_auth_user = parent.user
+        self._force_auth_token = parent.auth
+
+    def _get_scheme(self):
+        return self._schema
+
+
+def _lire_sous_requete(brute):
+    if not isinstance(brute, dict):
+        raise SousRequeteInvalide("Chaque sous-requête doit être un objet.")
+    methode = str(brute.get('methode', 'GET')).upper()
+    if methode not in METHODES:
+        raise SousRequeteInvalide(f"Méthode '{methode}' non prise en charge.")
+    url = brute.get('url')
+    if not isinstance(url, str) or not url.startswith(PREFIXE_API) or urlsplit(url).netloc:
+        raise SousRequeteInvalide(f"L'url doit être un chemin relatif commençant par '{PREFIXE_API}'.")
+    entetes = brute.get('entetes') or {}
+    if not isinstance(entetes, dict):
+        raise SousRequeteInvalide("'entetes' doit être un objet.")
+    if any(str(nom).lower() == 'idempotency-key' for nom in entetes):
+        # Les sous-requêtes ne passent pas par IdempotenceMiddleware : la clé serait ignorée
+        raise SousRequeteInvalide("Idempotency-Key se place sur la requête du lot, pas dans 'entetes'.")
+    return methode, url, brute.get('corps'), entetes
+
+
+class BatchView(APIView):
+    """
+    Exécute plusieurs appels de l'API en un seul aller-retour HTTP :
+
+        POST /api/v1/batch/
+        {"parallele": true,
+         "requetes": [{"methode": "GET", "url": "/api/v1/colis/?page_size=20"},
+                      {"methode": "PATCH", "url": "/api/v1/colis/<id>/", "corps": {...}}]}
+
+        -> {"reponses": [{"statut": 200, "entetes": {...}, "corps": {...}}, ...]}
+
+    Les sous-requêtes passent par les vues habituelles (permissions, filtres,
+    validation) sous l'identité de l'appelant ; chacune a son propre statut
+    et les écritures sont exécutées chacune dans sa transaction (l'échec de
+    l'une n'annule pas les autres). Avec `parallele`, les lectures
+    consécutives sont exécutées en parallèle ; les écritures restent
+    séquentielles et dans l'ordre.
+
+    Les sous-requêtes ne passent pas par les middlewares : pour rejouer un lot
+    sans double écriture, l'en-tête Idempotency-Key se place sur la requête
+    POST /api/v1/batch/ elle-même ; dans les `entetes` d'une sous-requête, il
+    est refusé (400).
+    """
+    permission_classes = [IsAuthenticated]
+    taille_max = 20
+    workers = 4
+
+    def post(self, request):
+        requetes = request.data.get('requetes') if isinstance(request.data, dict) else None
+        if not isinstance(requetes, list) or not requetes:
+            return Response({"detail": "Fournir une liste non vide 'requetes'."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(requetes) > self.taille_max:
+            return Response({"detail": f"Au plus {self.taille_max} sous-requêtes par lot."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            sous_requetes = [_lire_sous_requete(brute) for brute in requetes]
+        except SousRequeteInvalide as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        parallele = request.data.get('parallele') is True
+        reponses = [None] * len(sous_requetes)
+        lectures = []
+        for index, sous_requete in enumerate(sous_requetes):
+            if parallele and sous_requete[0] in METHODES_LECTURE:
+                lectures.append(index)
+                continue
+            self._executer_en_parallele(request, sous_requetes, lectures, reponses)
+            lectures = []
+            reponses[index] = self._executer(request, *sous_requete)
+        self._executer_en_parallele(request, sous_requetes, lectures, reponses)
+        return Response({'reponses': reponses})
+
+    def _executer_en_parallele(self, request, sous_requetes, indices, reponses):
+        if len(indices) < 2:
+            for index in indices:
+                reponses[index] = self._executer(request, *sous_requetes[index])
+            return
+
+        def executer(index):
+            try:
+                return self._executer(request, *sous_requetes[index])
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(indices))) as executor:
+            for index, reponse in zip(indices, executor.map(executer, indices)):
+                reponses[index] = reponse
+
+    def _executer(self, request, methode, url, corps, entetes):
+        sous_requete = _SousRequete(request, methode, url, corps, entetes)
+        try:
+            correspondance = resolve(sous_requete.path_info)
+        except Resolver404:
+            return {'statut': status.HTTP_404_NOT_FOUND, 'entetes': {}, 'corps': {"detail": "Introuvable."}}
+        if getattr(correspondance.func, 'view_class', None) is BatchView:
+            return {'statut': status.HTTP_400_BAD_REQUEST, 'entetes': {},
+                    'corps': {"detail": "Un lot ne peut pas contenir de lot."}}
+
+        try:
+            if methode in METHODES_LECTURE:
+                reponse = correspondance.func(sous_requete, *correspondance.args, **correspondance.kwargs)
+            else:
+                with transaction.atomic():
+                    reponse = correspondance.func(sous_requete, *correspondance.args, **correspondance.kwargs)
+                    if reponse.status_code >= 400:
+                        transaction.set_rollback(True)
+        except Exception:
+            logger.exception("Échec de la sous-requête %s %s du lot.", methode, url)
+            return {'statut': status.HTTP_500_INTERNAL_SERVER_ERROR, 'entetes': {},
+                    'corps': {"detail": "Erreur interne."}}
+        return {
+            'statut': reponse.status_code,
+            'entetes': {nom: reponse[nom] for nom in ENTETES_REPONSE if reponse.has_header(nom)},
+            'corps': self._corps(reponse, methode),
+        }
+
+    @staticmethod
+    def _corps(reponse, methode):
+        if methode == 'HEAD':
+            return None
+        if hasattr(reponse, 'data'):
+            # Réponse DRF : les données sont rendues une seule fois, avec la réponse du lot
+            return reponse.data
+        if hasattr(reponse, 'render'):
+            reponse.render()
+        contenu = reponse.content if not getattr(reponse, 'streaming', False) else b''.join(reponse.streaming_content)
+        if not contenu:
+            return None
+        try:
+            return json.loads(contenu)
+        except ValueError:
+            return contenu.decode(reponse.charset, errors='replace')
@@ -0,0 +1,188 @@
+# transit/cache.py
+
+import asyncio
+import logging
+import threading
+import time
+import zlib
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+
+try:
+    from redis.exceptions import RedisError
+except ImportError:  # redis est optionnel si le cache n'est pas Redis
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Erreurs qui déclenchent la bascule vers le cache local
+ERREURS_CACHE = (RedisError, OSError)
+
+
+class CacheResilient:
+    """
+    Cache principal (Redis) avec repli automatique sur un cache mémoire local.
+
+    En cas d'erreur de connexion, le cache local est utilisé pendant
+    `duree_coupure` secondes avant de retenter le cache principal (évite de
+    payer un timeout réseau à chaque requête quand Redis est tombé).
+    """
+
+    def __init__(self, alias_principal='default', alias_secours='local', duree_coupure=30):
+        self.alias_principal = alias_principal
+        self.alias_secours = alias_secours
+        self.duree_coupure = duree_coupure
+        self._coupe_jusqua = 0.0
+
+    def _appeler(self, methode, *args, **kwargs):
+        if time.monotonic() >= self._coupe_jusqua:
+            try:
+                return getattr(caches[self.alias_principal], methode)(*args, **kwargs)
+            except ERREURS_CACHE as e:
+                logger.warning("Cache '%s' indisponible (%s), repli sur '%s'.",
+                               self.alias_principal, e, self.alias_secours)
+                self._coupe_jusqua = time.monotonic() + self.duree_coupure
+        return getattr(caches[self.alias_secours], methode)(*args, **kwargs)
+
+    def get(self, key, default=None):
+        return self._appeler('get', key, default)
+
+    def get_many(self, keys):
+        return self._appeler('get_many', keys)
+
+    def set(self, key, value, timeout=None):
+        return self._appeler('set', key, value, timeout)
+
+    def set_many(self, data, timeout=None):
+        return self._appeler('set_many', data, timeout)
+
+    def add(self, key, value, timeout=None):
+        return self._appeler('add', key, value, timeout)
+
+    def delete(self, key):
+        return self._appeler('delete', key)
+
+    def delete_many(self, keys):
+        return self._appeler('delete_many', keys)
+
+    # Variantes asynchrones (vues ASGI) : l'appel réseau est exécuté dans le pool
+    # de threads par défaut, pas dans le thread partagé par l'ORM asynchrone.
+
+    async def aget(self, key, default=None):
+        return await sync_to_async(self.get, thread_sensitive=False)(key, default)
+
+    async def aget_many(self, keys):
+        return await sync_to_async(self.get_many, thread_sensitive=False)(keys)
+
+    async def aset(self, key, value, timeout=None):
+        return await sync_to_async(self.set, thread_sensitive=False)(key, value, timeout)
+
+    async def aset_many(self, data, timeout=None):
+        return await sync_to_async(self.set_many, thread_sensitive=False)(data, timeout)
+
+    async def aadd(self, key, value, timeout=None):
+        return await sync_to_async(self.add, thread_sensitive=False)(key, value, timeout)
+
+    async def adelete(self, key):
+        return await sync_to_async(self.delete, thread_sensitive=False)(key)
+
+
+cache = CacheResilient()
+
+
+# --- Lecture traversante avec protection contre l'effet de meute ---
+
+# Verrous locaux "rayés" : les threads d'un même processus qui ratent la même
+# clé sont sérialisés sans garder un verrou par clé en mémoire.
+_VERROUS_LOCAUX = [threading.Lock() for _ in range(64)]
+
+DUREE_VERROU = 10      # Durée de vie max (s) du verrou de reconstruction partagé
+ATTENTE_MAX = 5        # Attente max (s) d'un processus qui n'a pas obtenu le verrou
+INTERVALLE_ATTENTE = 0.05
+
+
+def lecture_cache(cle, construire, timeout=None):
+    """
+    Retourne la valeur en cache pour `cle`, ou la construit via `construire()`.
+
+    Les ratés concurrents sur une même clé ne déclenchent qu'une seule
+    reconstruction : verrou local entre threads, puis verrou partagé
+    (cache.add) entre processus/serveurs. Les perdants attendent la valeur
+    publiée par le gagnant. `construire` ne doit pas retourner None.
+    """
+    valeur = cache.get(cle)
+    if valeur is not None:
+        return valeur
+
+    with _VERROUS_LOCAUX[zlib.crc32(cle.encode()) % len(_VERROUS_LOCAUX)]:
+        valeur = cache.get(cle)
+        if valeur is not None:
+            return valeur
+
+        cle_verrou = f"{cle}:verrou"
+        if cache.add(cle_verrou, 1, DUREE_VERROU):
+            try:
+                valeur = construire()
+                cache.set(cle, valeur, timeout)
+            finally:
+                cache.delete(cle_verrou)
+            return valeur
+
+    # Reconstruction en cours dans un autre processus : attente hors du verrou local, qui
+    # bloquerait sinon toutes les clés de la même rayure
+    limite = time.monotonic() + ATTENTE_MAX
+    while time.monotonic() < limite:
+        time.sleep(INTERVALLE_ATTENTE)
+        valeur = cache.get(cle)
+        if valeur is not None:
+            return valeur
+
+    # Le détenteur du verrou est trop lent (ou a échoué) : on reconstruit soi-même
+    return construire()
+
+
+# Reconstructions asynchrones en cours dans ce processus : clé -> tâche
+_CONSTRUCTIONS = {}
+
+
+async def alecture_cache(cle, construire, timeout=None):
+    """
+    Variante asynchrone de lecture_cache : `construire()` est une coroutine.
+    Les ratés concurrents d'une même boucle attendent la même tâche de
+    reconstruction (au lieu d'un verrou de thread) ; entre processus, le même
+    verrou partagé (cache.add) est utilisé.
+    """
+    valeur = await cache.aget(cle)
+    if valeur is not None:
+        return valeur
+
+    tache = _CONSTRUCTIONS.get(cle)
+    if tache is None or tache.done() or tache.get_loop() is not asyncio.get_running_loop():
+        tache = _CONSTRUCTIONS[cle] = asyncio.ensure_future(_areconstruire(cle, construire, timeout))
+        tache.add_done_callback(lambda t: _CONSTRUCTIONS.pop(cle, None) if _CONSTRUCTIONS.get(cle) is t else None)
+    # shield : l'annulation d'un demandeur (client parti) n'annule pas la reconstruction des autres
+    return await asyncio.shield(tache)
+
+
+async def _areconstruire(cle, construire, timeout):
+    valeur = await cache.aget(cle)
+    if valeur is not None:
+        return valeur
+
+    cle_verrou = f"{cle}:verrou"
+    if await cache.aadd(cle_verrou, 1, DUREE_VERROU):
+        try:
+            valeur = await construire()
+            await cache.aset(cle, valeur, timeout)
+        finally:
+            await cache.adelete(cle_verrou)
+        return valeur
+
+    limite = time.monotonic() + ATTENTE_MAX
+    while time.monotonic() < limite:
+        await asyncio.sleep(INTERVALLE_ATTENTE)
+        valeur = await cache.aget(cle)
+        if valeur is not None:
+            return valeur
+    return await construire()
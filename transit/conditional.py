@@ -0,0 +1,115 @@
+# transit/conditional.py
+
+import hashlib
+import math
+import time
+
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+
+def calculer_validateurs(lignes, etag_fields, format_rendu, utilisateur_id, avec_date=True):
+    """
+    Retourne (ETag, Last-Modified en timestamp) pour les lignes données (dicts
+    portant 'pk' et `etag_fields`), propres au format de rendu et à l'utilisateur.
+
+    Last-Modified n'a qu'une précision d'une seconde : il n'est donné (et
+    If-Modified-Since n'est honoré) qu'une fois cette seconde écoulée, sans quoi
+    une écriture dans la même seconde produirait un faux 304. Il vaut None
+    si `avec_date` est faux (listes : les suppressions n'y changent aucune date).
+    """
+    empreinte = hashlib.md5(usedforsecurity=False)
+    empreinte.update(f"{format_rendu}:{utilisateur_id}".encode())
+    champ_date = next(f for f in etag_fields if f.endswith('date_modification'))
+    derniere = None
+    for ligne in lignes:
+        empreinte.update(b'|')
+        empreinte.update(':'.join(str(ligne[f]) for f in ('pk', *etag_fields)).encode())
+        date = ligne[champ_date]
+        if date is not None and (derniere is None or date > derniere):
+            derniere = date
+    etag = f'W/"{empreinte.hexdigest()}"'
+    if not avec_date or derniere is None:
+        return etag, None
+    # Seconde de la dernière modification encore en cours : Last-Modified serait ambigu
+    last_modified = math.floor(derniere.timestamp())
+    return etag, last_modified if time.time() >= last_modified + 1 else None
+
+
+def ajouter_validateurs(response, etag, last_modified):
+    response.headers['ETag'] = etag
+    if last_modified is not None:
+        response.headers['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Accept', 'Authorization'))
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    GET conditionnels (ETag / If-None-Match, Last-Modified / If-Modified-Since)
+    pour les ViewSets dont le modèle hérite de VersionedModel.
+
+    Les validateurs sont calculés à partir d'une requête légère qui ne lit que
+    les colonnes de version (`etag_fields`) : un 304 est renvoyé avant tout
+    chargement des relations et toute sérialisation, en détail comme en liste
+    (la liste utilise la même page que la pagination).
+
+    Les listes n'ont pas de Last-Modified (une suppression n'y change aucune
+    date) : seul If-None-Match y donne un 304. Voir calculer_validateurs.
+    """
+    # Colonnes dont dépend la représentation (ex: 'colis__version' pour un
+    # sérialiseur qui imbrique le colis). La première date sert de Last-Modified (détail).
+    etag_fields = ('version', 'date_modification')
+
+    def _requete_marqueurs(self, queryset, *extra):
+        champs = ['pk', *self.etag_fields, *[f for f in extra if f]]
+        return queryset.select_related(None).prefetch_related(None).values(*dict.fromkeys(champs))
+
+    def _validateurs(self, lignes, avec_date=True):
+        """Retourne (ETag, Last-Modified en timestamp) pour les lignes données."""
+        return calculer_validateurs(
+            lignes, self.etag_fields, self.request.accepted_renderer.format, self.request.user.pk, avec_date
+        )
+
+    def _reponse_conditionnelle(self, lignes, avec_date=True):
+        etag, last_modified = self._validateurs(lignes, avec_date)
+        self._etag, self._last_modified = etag, last_modified
+        response = get_conditional_response(self.request, etag=etag, last_modified=last_modified)
+        if response is not None:
+            self._ajouter_validateurs(response)
+        return response
+
+    def _ajouter_validateurs(self, response):
+        return ajouter_validateurs(response, self._etag, self._last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self._requete_marqueurs(self.filter_queryset(self.get_queryset()))
+        try:
+            ligne = queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]}).first()
+        except (TypeError, ValueError, ValidationError):
+            raise Http404
+        if ligne is None:
+            raise Http404
+
+        response = self._reponse_conditionnelle([ligne])
+        if response is not None:
+            return response
+        return self._ajouter_validateurs(super().retrieve(request, *args, **kwargs))
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = getattr(self, 'ordering', None)
+        if isinstance(ordering, (list, tuple)):
+            ordering = ordering[0]
+        marqueurs = self._requete_marqueurs(queryset, ordering.lstrip('-') if ordering else None)
+        lignes = self.paginate_queryset(marqueurs)
+        if lignes is None:
+            lignes = marqueurs
+
+        response = self._reponse_conditionnelle(lignes, avec_date=False)
+        if response is not None:
+            return response
+        return self._ajouter_validateurs(super().list(request, *args, **kwargs))
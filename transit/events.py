@@ -0,0 +1,178 @@
+# transit/events.py
+
+import asyncio
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+try:
+    import redis
+    import redis.asyncio as redis_async
+    from redis.exceptions import RedisError
+except ImportError:  # redis est optionnel avec le bus en mémoire
+    redis = redis_async = None
+    RedisError = OSError
+
+logger = logging.getLogger(__name__)
+
+# Messages en attente par abonné au-delà desquels les plus anciens sont abandonnés
+# (client trop lent : il recevra les suivants et peut relire l'état complet)
+FILE_MAX = 100
+
+
+class Abonnement:
+    """File d'événements d'un abonné, consommée dans sa boucle asyncio."""
+    __slots__ = ('canaux', 'file', 'boucle')
+
+    def __init__(self, canaux, boucle):
+        self.canaux = frozenset(canaux)
+        self.file = asyncio.Queue(FILE_MAX)
+        self.boucle = boucle
+
+    def _deposer(self, canal, message):
+        if self.file.full():
+            self.file.get_nowait()
+        self.file.put_nowait((canal, message))
+
+    def recevoir(self, canal, message):
+        """Appelable depuis n'importe quel thread."""
+        try:
+            self.boucle.call_soon_threadsafe(self._deposer, canal, message)
+        except RuntimeError:
+            pass  # Boucle fermée : l'abonné est en cours de déconnexion
+
+
+class Diffuseur:
+    """
+    Diffusion locale (par processus) des messages aux abonnés de chaque canal.
+    Un abonné inactif ne coûte qu'une file asyncio : aucun thread ni connexion.
+    """
+
+    def __init__(self):
+        self._abonnes = {}
+        self._verrou = threading.Lock()
+
+    def abonner(self, canaux):
+        abonnement = Abonnement(canaux, asyncio.get_running_loop())
+        with self._verrou:
+            for canal in abonnement.canaux:
+                self._abonnes.setdefault(canal, set()).add(abonnement)
+        return abonnement
+
+    def desabonner(self, abonnement):
+        with self._verrou:
+            for canal in abonnement.canaux:
+                abonnes = self._abonnes.get(canal)
+                if abonnes is not None:
+                    abonnes.discard(abonnement)
+                    if not abonnes:
+                        del self._abonnes[canal]
+
+    def distribuer(self, canal, message):
+        with self._verrou:
+            abonnes = list(self._abonnes.get(canal, ()))
+        for abonnement in abonnes:
+            abonnement.recevoir(canal, message)
+
+    def publier(self, canal, message):
+        raise NotImplementedError
+
+    def publier_plusieurs(self, messages):
+        """Publie une liste de (canal, message) ; les bus réseau l'envoient en un aller-retour."""
+        for canal, message in messages:
+            self.publier(canal, message)
+
+
+class BusMemoire(Diffuseur):
+    """Bus d'un seul processus (tests, développement) : la publication est distribuée directement."""
+
+    def publier(self, canal, message):
+        self.distribuer(canal, message)
+
+
+class BusRedis(Diffuseur):
+    """
+    Bus partagé entre workers via Redis pub/sub. Chaque processus n'ouvre
+    qu'une connexion d'abonnement (motif `<prefixe>*`) et redistribue
+    localement ; la publication utilise une connexion synchrone (vues WSGI
+    comme ASGI). Une panne de Redis n'interrompt pas l'écriture publiée.
+    """
+
+    def __init__(self, url, prefixe='transit:evenements:'):
+        super().__init__()
+        if redis is None:
+            raise ImportError("Le bus Redis nécessite le paquet 'redis'.")
+        self.url = url
+        self.prefixe = prefixe
+        self._client = redis.Redis.from_url(url, socket_connect_timeout=0.5, socket_timeout=0.5)
+        self._ecoutes = {}  # boucle asyncio -> tâche d'écoute
+
+    def publier(self, canal, message):
+        try:
+            self._client.publish(self.prefixe + canal, json.dumps(message))
+        except RedisError as e:
+            logger.warning("Publication de l'événement '%s' impossible (%s).", canal, e)
+
+    def publier_plusieurs(self, messages):
+        pipeline = self._client.pipeline(transaction=False)
+        for canal, message in messages:
+            pipeline.publish(self.prefixe + canal, json.dumps(message))
+        try:
+            pipeline.execute()
+        except RedisError as e:
+            logger.warning("Publication de %d événements impossible (%s).", len(messages), e)
+
+    def abonner(self, canaux):
+        abonnement = super().abonner(canaux)
+        boucle = abonnement.boucle
+        if boucle not in self._ecoutes or self._ecoutes[boucle].done():
+            self._ecoutes[boucle] = boucle.create_task(self._ecouter())
+        return abonnement
+
+    async def _ecouter(self):
+        while True:
+            try:
+                client = redis_async.Redis.from_url(self.url)
+                async with client.pubsub() as pubsub:
+                    await pubsub.psubscribe(self.prefixe + '*')
+                    async for brut in pubsub.listen():
+                        if brut['type'] != 'pmessage':
+                            continue
+                        canal = brut['channel'].decode()[len(self.prefixe):]
+                        self.distribuer(canal, json.loads(brut['data']))
+            except asyncio.CancelledError:
+                raise
+            except (RedisError, OSError) as e:
+                logger.warning("Abonnement Redis interrompu (%s), nouvelle tentative.", e)
+                await asyncio.sleep(1)
+
+
+_bus = None
+_verrou_bus = threading.Lock()
+
+
+def get_bus():
+    """
+    Bus d'événements du processus, configuré par `EVENEMENTS_TEMPS_REEL` :
+    {'BACKEND': 'transit.events.BusRedis', 'OPTIONS': {'url': ...}}.
+    """
+    global _bus
+    if _bus is None:
+        with _verrou_bus:
+            if _bus is None:
+                config = getattr(settings, 'EVENEMENTS_TEMPS_REEL', {})
+                backend = import_string(config.get('BACKEND', 'transit.events.BusMemoire'))
+                _bus = backend(**config.get('OPTIONS', {}))
+    return _bus
+
+
+@receiver(setting_changed)
+def _reinitialiser_bus(setting, **kwargs):
+    global _bus
+    if setting == 'EVENEMENTS_TEMPS_REEL':
+        _bus = None
@@ -0,0 +1,366 @@
+# transit/fastpath.py
+
+import threading
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import OuterRef, Subquery
+from django.db.models.query import ValuesListIterable
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+from .fragments import assembler, champs_version, prefixe_fragments
+
+
+class NonPrisEnCharge(Exception):
+    """Un champ du sérialiseur ne peut pas être produit par le chemin rapide."""
+
+
+# Méthodes de modèle que le chemin rapide sait appeler sans charger l'instance :
+# (label du modèle, méthode) -> colonnes qu'elle lit, portées par un DTO
+COLONNES_METHODES = {
+    ('users.Utilisateur', 'get_full_name'): ('prenoms', 'nom'),
+}
+
+# Nombre de constructeurs compilés gardés en mémoire (un par sérialiseur et combinaison ?fields= / ?expand=)
+CONSTRUCTEURS_MAX = 256
+
+# Champs dont la représentation DRF est str(valeur)
+_CHAMPS_TEXTE = (serializers.CharField, serializers.EmailField, serializers.URLField, serializers.SlugField)
+
+
+def _expression_valeur(field, variable, namespace):
+    """Expression Python produisant la représentation DRF de `variable` (jamais None)."""
+    type_champ = type(field)
+    if type_champ is PrimaryKeyRelatedField and field.pk_field is None:
+        # values_list() renvoie déjà la clé étrangère brute (PKOnlyObject.pk)
+        return variable
+    if type_champ in _CHAMPS_TEXTE:
+        return f'str({variable})'
+    if type_champ is serializers.UUIDField and field.uuid_format == 'hex_verbose':
+        return f'str({variable})'
+    if type_champ is serializers.IntegerField:
+        return f'int({variable})'
+    if type_champ is serializers.ChoiceField and all(isinstance(k, str) for k in field.choices):
+        # choice_strings_to_values renvoie la clé elle-même pour des choix textuels
+        return variable
+    if isinstance(field, (serializers.FileField, serializers.RelatedField, serializers.ManyRelatedField,
+                          serializers.SerializerMethodField, serializers.HiddenField)):
+        # Dépendent du contexte (request) ou de l'instance complète
+        raise NonPrisEnCharge(field.field_name)
+    # Dates, décimaux, booléens... : conversion DRF d'origine, sans get_attribute()
+    nom = f'_conv{len(namespace)}'
+    namespace[nom] = field.to_representation
+    return f'{nom}({variable})'
+
+
+def _classe_dto(nom, attributs):
+    """Classe DTO compacte (`__slots__`) construite positionnellement depuis un tuple values_list()."""
+    source = (
+        f"def __init__(self, {', '.join(attributs)}):\n"
+        + ''.join(f"    self.{a} = {a}\n" for a in attributs)
+    )
+    namespace = {}
+    exec(source, namespace)
+    return type(nom, (), {'__slots__': tuple(attributs), '__init__': namespace['__init__']})
+
+
+def limiter_par_parent(queryset, fk, limite):
+    """
+    Garde les `limite` premières lignes (dans l'ordre du modèle) de chaque parent,
+    par une sous-requête corrélée couverte par un index (fk, tri). Contrairement
+    à un queryset découpé ([:limite]), le résultat reste filtrable et peut être
+    utilisé dans un Prefetch.
+    """
+    model = queryset.model
+    premiers = (
+        model._default_manager.filter(**{fk: OuterRef(fk)})
+        .order_by(*(queryset.query.order_by or model._meta.ordering))
+        .values('pk')[:limite]
+    )
+    return queryset.filter(pk__in=Subquery(premiers))
+
+
+class _LignesIterable(ValuesListIterable):
+    """Itérable de QuerySet produisant des DTO au lieu de tuples."""
+    dto = None
+
+    def __iter__(self):
+        dto = self.dto
+        for ligne in super().__iter__():
+            yield dto(*ligne)
+
+
+class _Compilateur:
+    """Traduit les champs d'un sérialiseur en code Python lisant les colonnes d'un DTO."""
+
+    def __init__(self, model):
+        self.model = model
+        self.colonnes = {'pk': 'pk'}  # chemin ORM -> attribut du DTO
+        self.namespace = {}
+        self.enfants = []  # (nom du champ, colonne de la clé étrangère, constructeur, limite par parent)
+        self.lignes = []
+        self._compteur = 0
+
+    def colonne(self, chemin):
+        return 'r.' + self.colonnes.setdefault(chemin, chemin)
+
+    def variable(self):
+        self._compteur += 1
+        return f'v{self._compteur}'
+
+    def emettre(self, niveau, code):
+        self.lignes.append('    ' * niveau + code)
+
+    def compiler(self, serializer, model, prefixe='', cible='d', niveau=1):
+        """Émet le code remplissant le dict `cible` pour `serializer` (colonnes préfixées par `prefixe`)."""
+        opts = model._meta
+        for nom, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            cle = repr(nom)
+            if field.source == '*':
+                raise NonPrisEnCharge(nom)
+            attribut, _, reste = field.source.partition('.')
+            try:
+                model_field = opts.get_field(attribut)
+            except FieldDoesNotExist:
+                model_field = None
+
+            if isinstance(field, serializers.ListSerializer):
+                # Relation inverse imbriquée (ex: historique_statuts) : une requête groupée,
+                # limitée par parent si le ListSerializer a un attribut `limite`
+                if prefixe or reste or model_field is None or not model_field.one_to_many:
+                    raise NonPrisEnCharge(nom)
+                if not isinstance(field.child, serializers.ModelSerializer):
+                    raise NonPrisEnCharge(nom)
+                constructeur = constructeur_pour(field.child)
+                if constructeur is None:
+                    raise NonPrisEnCharge(nom)
+                index = len(self.enfants)
+                self.enfants.append((nom, model_field.field.name, constructeur, getattr(field, 'limite', None)))
+                self.emettre(niveau, f"{cible}[{cle}] = e[{index}].get(r.pk) or []")
+                continue
+
+            if isinstance(field, serializers.BaseSerializer):
+                # Relation directe imbriquée (ex: colis_details, ?expand=client) : jointure
+                if reste or model_field is None or not model_field.many_to_one and not model_field.one_to_one:
+                    raise NonPrisEnCharge(nom)
+                if not model_field.concrete:
+                    raise NonPrisEnCharge(nom)
+                fk = self.colonne(prefixe + attribut)
+                sous_cible = self.variable()
+                self.emettre(niveau, f"if {fk} is None:")
+                self.emettre(niveau + 1, f"{cible}[{cle}] = None")
+                self.emettre(niveau, "else:")
+                self.emettre(niveau + 1, f"{sous_cible} = {{}}")
+                self.compiler(field, model_field.related_model, f'{prefixe}{attribut}__', sous_cible, niveau + 1)
+                self.emettre(niveau + 1, f"{cible}[{cle}] = {sous_cible}")
+                continue
+
+            if reste:
+                # Attribut d'une relation (ex: 'client.get_full_name') : absent si la relation est nulle
+                if '.' in reste or model_field is None or not model_field.many_to_one and not model_field.one_to_one:
+                    raise NonPrisEnCharge(nom)
+                if not model_field.concrete:
+                    raise NonPrisEnCharge(nom)
+                if not (field.read_only and field.default is serializers.empty and not field.allow_null):
+                    raise NonPrisEnCharge(nom)
+                fk = self.colonne(prefixe + attribut)
+                self.emettre(niveau, f"if {fk} is not None:")
+                valeur = self._valeur(field, model_field.related_model, f'{prefixe}{attribut}__', reste, niveau + 1)
+                self.emettre(niveau + 1, f"{cible}[{cle}] = {valeur}")
+                continue
+
+            valeur = self._valeur(field, model, prefixe, attribut, niveau)
+            self.emettre(niveau, f"{cible}[{cle}] = {valeur}")
+
+    def _valeur(self, field, model, prefixe, attribut, niveau):
+        """Émet la lecture de `attribut` (colonne ou méthode de COLONNES_METHODES) et renvoie l'expression finale."""
+        opts = model._meta
+        variable = self.variable()
+        try:
+            model_field = opts.get_field(attribut)
+        except FieldDoesNotExist:
+            colonnes = COLONNES_METHODES.get((opts.label, attribut))
+            if colonnes is None:
+                raise NonPrisEnCharge(field.field_name)
+            methode = getattr(model, attribut)
+            # Méthode du modèle appelée sur un DTO portant uniquement les colonnes dont elle dépend
+            dto = f'_dto{len(self.namespace)}'
+            self.namespace[dto] = _classe_dto(f'{model.__name__}{attribut.title()}', colonnes)
+            fonction = f'_meth{len(self.namespace)}'
+            self.namespace[fonction] = methode
+            arguments = ', '.join(self.colonne(prefixe + c) for c in colonnes)
+            self.emettre(niveau, f"{variable} = {fonction}({dto}({arguments}))")
+        else:
+            if not model_field.concrete or model_field.many_to_many:
+                raise NonPrisEnCharge(field.field_name)
+            self.emettre(niveau, f"{variable} = {self.colonne(prefixe + attribut)}")
+        expression = _expression_valeur(field, variable, self.namespace)
+        if expression == variable:
+            return variable
+        return f"None if {variable} is None else {expression}"
+
+
+class ConstructeurLignes:
+    """
+    Constructeur de lignes précompilé pour un sérialiseur en lecture seule.
+
+    Les colonnes nécessaires sont lues par values_list() dans des DTO à
+    `__slots__`, puis une fonction générée une fois pour toutes construit le
+    dict de sortie, dans l'ordre et avec les conversions des champs DRF.
+    """
+    __slots__ = ('model', 'colonnes', 'enfants', 'construire_ligne', '_iterables')
+
+    def __init__(self, model, colonnes, enfants, construire_ligne):
+        self.model = model
+        self.colonnes = colonnes
+        self.enfants = enfants
+        self.construire_ligne = construire_ligne
+        self._iterables = {}
+
+    def requete(self, queryset, *extra):
+        """QuerySet de DTO (colonnes du sérialiseur + `extra`, ex: le champ de tri de la pagination)."""
+        colonnes = dict(self.colonnes)
+        for chemin in extra:
+            colonnes.setdefault(chemin, chemin)
+        cle = tuple(colonnes)
+        iterable = self._iterables.get(cle)
+        if iterable is None:
+            dto = _classe_dto(f'{self.model.__name__}Ligne', list(colonnes.values()))
+            iterable = self._iterables[cle] = type('LignesIterable', (_LignesIterable,), {'dto': dto})
+        queryset = queryset.select_related(None).prefetch_related(None).values_list(*cle)
+        queryset._iterable_class = iterable
+        return queryset
+
+    def construire(self, lignes):
+        """Construit les dicts de sortie ; une requête par relation inverse imbriquée."""
+        lignes = list(lignes)
+        groupes = []
+        ids = [ligne.pk for ligne in lignes]
+        for _, fk, constructeur, limite in self.enfants:
+            groupe = {}
+            if ids:
+                enfants = list(self._requete_enfants(fk, constructeur, limite, ids))
+                for enfant, donnees in zip(enfants, constructeur.construire(enfants)):
+                    groupe.setdefault(getattr(enfant, fk), []).append(donnees)
+            groupes.append(groupe)
+        construire_ligne = self.construire_ligne
+        return [construire_ligne(ligne, groupes) for ligne in lignes]
+
+    async def aconstruire(self, lignes):
+        """Variante asynchrone de construire (ORM asynchrone), pour les vues ASGI."""
+        lignes = list(lignes)
+        groupes = []
+        ids = [ligne.pk for ligne in lignes]
+        for _, fk, constructeur, limite in self.enfants:
+            groupe = {}
+            if ids:
+                enfants = [enfant async for enfant in self._requete_enfants(fk, constructeur, limite, ids)]
+                for enfant, donnees in zip(enfants, await constructeur.aconstruire(enfants)):
+                    groupe.setdefault(getattr(enfant, fk), []).append(donnees)
+            groupes.append(groupe)
+        construire_ligne = self.construire_ligne
+        return [construire_ligne(ligne, groupes) for ligne in lignes]
+
+    @staticmethod
+    def _requete_enfants(fk, constructeur, limite, ids):
+        requete = constructeur.model._default_manager.filter(**{f'{fk}__in': ids})
+        if limite is not None:
+            requete = limiter_par_parent(requete, fk, limite)
+        return constructeur.requete(requete, fk)
+
+
+# Cache LRU : les combinaisons de ?fields= sont choisies par le client
+_constructeurs = OrderedDict()
+_verrou_constructeurs = threading.Lock()
+
+
+def constructeur_pour(serializer):
+    """
+    Retourne le ConstructeurLignes (mis en cache) du sérialiseur de modèle
+    donné, avec ses champs effectifs (?fields / ?expand), ou None si l'un des
+    champs n'est pas pris en charge (le sérialiseur DRF est alors utilisé).
+    """
+    cle = (type(serializer), tuple((nom, type(f)) for nom, f in serializer.fields.items()))
+    with _verrou_constructeurs:
+        if cle in _constructeurs:
+            _constructeurs.move_to_end(cle)
+            return _constructeurs[cle]
+
+    model = serializer.Meta.model
+    compilateur = _Compilateur(model)
+    try:
+        compilateur.compiler(serializer, model)
+    except NonPrisEnCharge:
+        constructeur = None
+    else:
+        source = 'def construire_ligne(r, e):\n    d = {}\n' + '\n'.join(compilateur.lignes) + '\n    return d\n'
+        namespace = dict(compilateur.namespace)
+        exec(compile(source, f'<fastpath {type(serializer).__name__}>', 'exec'), namespace)
+        constructeur = ConstructeurLignes(
+            model, compilateur.colonnes, compilateur.enfants, namespace['construire_ligne']
+        )
+    with _verrou_constructeurs:
+        _constructeurs[cle] = constructeur
+        if len(_constructeurs) > CONSTRUCTEURS_MAX:
+            _constructeurs.popitem(last=False)
+    return constructeur
+
+
+class FastReadMixin:
+    """
+    Chemin de lecture rapide (opt-in : `fast_read = True` sur la vue) pour la
+    liste d'un ViewSet, en lecture seulement ; les actions qui réutilisent le
+    constructeur (ex: suivi des colis) suivent le même drapeau.
+
+    Les lignes sont lues par values_list() et construites par un constructeur
+    précompilé (voir ConstructeurLignes) au lieu d'instancier les modèles et
+    de passer par la mécanique des champs DRF. Le JSON produit est identique à
+    celui du sérialiseur ; si un champ n'est pas pris en charge (méthode absente
+    de COLONNES_METHODES, champ dépendant de la requête...), le sérialiseur est
+    utilisé.
+
+    Si le sérialiseur déclare `Meta.fragment_version_fields`, les lignes sont
+    assemblées depuis le cache de fragments (voir transit.fragments).
+    """
+    fast_read = False
+
+    def get_fast_builder(self):
+        if not self.fast_read or self.request.method not in SAFE_METHODS:
+            return None
+        return constructeur_pour(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        constructeur = self.get_fast_builder()
+        if constructeur is None:
+            return super().list(request, *args, **kwargs)
+
+        ordering = getattr(self, 'ordering', None)
+        if isinstance(ordering, (list, tuple)):
+            ordering = ordering[0]
+        extra = [ordering.lstrip('-')] if ordering else []
+        serializer = self.get_serializer()
+        chemins = champs_version(serializer)
+        construire = constructeur.construire
+        if chemins is not None:
+            # Cache de fragments : seules les lignes absentes ou périmées sont construites
+            # (et leurs relations imbriquées lues)
+            extra.extend(chemins)
+            prefixe = prefixe_fragments(serializer)
+
+            def construire(lignes):
+                return assembler(
+                    prefixe, lignes,
+                    lambda ligne: (ligne.pk, [getattr(ligne, chemin) for chemin in chemins]),
+                    constructeur.construire,
+                )
+        queryset = constructeur.requete(self.filter_queryset(self.get_queryset()), *extra)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(construire(page))
+        return Response(construire(queryset))
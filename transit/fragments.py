@@ -0,0 +1,120 @@
+# transit/fragments.py
+
+import hashlib
+
+from django.db import models
+from rest_framework import serializers
+
+from .cache import cache
+
+# Durée de vie (s) d'un fragment : les versions périmées ne sont jamais relues,
+# elles sont seulement évincées par expiration.
+DUREE_FRAGMENT = 3600
+
+
+def champs_version(serializer):
+    """
+    Chemins ORM des versions dont dépend la représentation du sérialiseur
+    (`Meta.fragment_version_fields`, ex: ('version', 'colis__version')), ou
+    None si ses fragments ne peuvent pas être mis en cache.
+    """
+    chemins = getattr(getattr(serializer, 'Meta', None), 'fragment_version_fields', None)
+    if not chemins:
+        return None
+    if getattr(serializer, 'champs_deplies', ()):
+        # Relations dépliées (?expand) : leurs versions ne sont pas suivies
+        return None
+    return tuple(chemins)
+
+
+def prefixe_fragments(serializer):
+    """Préfixe des clés : classe du sérialiseur + empreinte de ses champs effectifs (?fields)."""
+    classe = type(serializer)
+    signature = ','.join(f'{nom}:{type(f).__name__}' for nom, f in serializer.fields.items())
+    empreinte = hashlib.md5(signature.encode()).hexdigest()[:12]
+    return f'fragment:{classe.__module__}.{classe.__qualname__}:{empreinte}'
+
+
+def assembler(prefixe, objets, versions, construire, timeout=DUREE_FRAGMENT):
+    """
+    Retourne la représentation de chaque objet, dans l'ordre : les fragments
+    à jour sont lus en une seule lecture groupée (get_many) et seuls les
+    objets absents ou périmés sont passés, ensemble, à `construire(objets)`
+    puis écrits en une fois (set_many).
+
+    `versions(objet)` retourne (pk, versions) ; la clé d'un fragment change
+    avec chaque version, il n'y a donc jamais d'invalidation explicite.
+    """
+    objets = list(objets)
+    cles = _cles(prefixe, objets, versions)
+    en_cache = cache.get_many(cles) if cles else {}
+    manquants = [i for i, cle in enumerate(cles) if cle not in en_cache]
+    if manquants:
+        construits = construire([objets[i] for i in manquants])
+        nouveaux = {cles[i]: donnees for i, donnees in zip(manquants, construits)}
+        cache.set_many(nouveaux, timeout)
+        en_cache.update(nouveaux)
+    return [en_cache[cle] for cle in cles]
+
+
+async def aassembler(prefixe, objets, versions, construire, timeout=DUREE_FRAGMENT):
+    """Variante asynchrone d'assembler (vues ASGI) : `construire` est une coroutine."""
+    objets = list(objets)
+    cles = _cles(prefixe, objets, versions)
+    en_cache = await cache.aget_many(cles) if cles else {}
+    manquants = [i for i, cle in enumerate(cles) if cle not in en_cache]
+    if manquants:
+        construits = await construire([objets[i] for i in manquants])
+        nouveaux = {cles[i]: donnees for i, donnees in zip(manquants, construits)}
+        await cache.aset_many(nouveaux, timeout)
+        en_cache.update(nouveaux)
+    return [en_cache[cle] for cle in cles]
+
+
+def _cles(prefixe, objets, versions):
+    cles = []
+    for objet in objets:
+        pk, valeurs = versions(objet)
+        cles.append(f"{prefixe}:{pk}:{'.'.join(map(str, valeurs))}")
+    return cles
+
+
+def _lire_chemin(instance, chemin):
+    for attribut in chemin.split('__'):
+        if instance is None:
+            return None
+        instance = getattr(instance, attribut)
+    return instance
+
+
+class FragmentCacheListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer qui assemble la liste depuis le cache de fragments :
+    chaque objet est mis en cache sous (sérialiseur, champs, pk, versions).
+
+        class Meta:
+            list_serializer_class = FragmentCacheListSerializer
+            fragment_version_fields = ('version', 'colis__version')
+
+    Si une version locale n'est pas chargée (champ différé par ?fields), la
+    liste est sérialisée normalement ; les relations des versions (ex: colis)
+    doivent être jointes par la requête de la vue.
+    """
+
+    def to_representation(self, data):
+        chemins = champs_version(self.child)
+        objets = data.all() if isinstance(data, models.manager.BaseManager) else data
+        if chemins is None:
+            return super().to_representation(objets)
+        objets = list(objets)
+        locaux = [chemin for chemin in chemins if '__' not in chemin]
+        if any(chemin in objet.get_deferred_fields() for objet in objets for chemin in locaux):
+            return super().to_representation(objets)
+
+        child = self.child
+        return assembler(
+            prefixe_fragments(child),
+            objets,
+            lambda objet: (objet.pk, [_lire_chemin(objet, chemin) for chemin in chemins]),
+            lambda manquants: [child.to_representation(objet) for objet in manquants],
+        )
@@ -0,0 +1,172 @@
+# transit/idempotence.py
+
+import hashlib
+import time
+from inspect import iscoroutinefunction
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import CacheResilient
+
+METHODES = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+CLE_LONGUEUR_MAX = 255
+# En-têtes de la réponse d'origine rejoués avec elle
+ENTETES_REJOUES = ('Content-Type', 'Location', 'ETag', 'Last-Modified')
+# Statuts non conservés : la même requête peut aboutir plus tard (conflit, limitation, panne)
+STATUTS_TRANSITOIRES = frozenset({409, 429})
+
+DUREE_CONSERVATION = 24 * 3600  # Réponses rejouables pendant 24 h
+DUREE_VERROU = 60               # Durée de vie max (s) de la réservation d'une requête en cours
+ATTENTE_MAX = 10                # Attente max (s) d'un doublon concurrent
+INTERVALLE_ATTENTE = 0.05
+
+# Redis, avec repli sur la table de cache en base (créée par la migration logistics 0013) :
+# contrairement au cache mémoire local, elle est partagée par tous les workers
+store = CacheResilient(alias_secours='idempotence')
+
+
+def _empreinte(request):
+    """Empreinte de la requête : une même clé ne peut pas servir à une requête différente."""
+    empreinte = hashlib.sha256()
+    for partie in (request.method, request.get_full_path(), request.content_type,
+                   request.META.get('CONTENT_LENGTH', '')):
+        empreinte.update(f'{partie}\n'.encode())
+    # Les téléversements (multipart, gros corps) sont lus en flux par la vue : seule leur taille compte
+    longueur = int(request.META.get('CONTENT_LENGTH') or 0)
+    if not request.content_type.startswith('multipart/') and longueur <= settings.DATA_UPLOAD_MAX_MEMORY_SIZE:
+        empreinte.update(request.body)
+    return empreinte.hexdigest()
+
+
+def _utilisateur(request):
+    """Identifiant de l'appelant (JWT, sinon session), sans lecture en base ; None si anonyme."""
+    entete = request.META.get('HTTP_AUTHORIZATION', '').split()
+    if len(entete) == 2 and entete[0].lower() == 'bearer':
+        try:
+            return str(JWTAuthentication().get_validated_token(entete[1])[api_settings.USER_ID_CLAIM])
+        except (InvalidToken, TokenError, KeyError):
+            return None
+    utilisateur = getattr(request, 'user', None)
+    return str(utilisateur.pk) if utilisateur is not None and utilisateur.is_authenticated else None
+
+
+def _erreur(detail, statut):
+    return JsonResponse({'detail': detail}, status=statut)
+
+
+class IdempotenceMiddleware:
+    """
+    En-tête `Idempotency-Key` sur les requêtes d'écriture (POST, PUT, PATCH,
+    DELETE) : la réponse de la première exécution est conservée
+    DUREE_CONSERVATION secondes par appelant et par clé, puis rejouée telle
+    quelle (en-tête `Idempotent-Replayed: true`) pour toute nouvelle tentative,
+    sans exécuter la vue à nouveau.
+
+    La clé est réservée (cache.add) avant l'exécution : un doublon concurrent
+    attend la fin de la première requête au lieu de s'exécuter en parallèle.
+    Une clé réutilisée pour une autre requête est refusée (422). Les erreurs
+    serveur et les statuts de STATUTS_TRANSITOIRES ne sont pas conservés : la
+    tentative suivante exécute la requête.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.mode_asynchrone = iscoroutinefunction(get_response)
+        if self.mode_asynchrone:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.mode_asynchrone:
+            return self.__acall__(request)
+        requete = self._preparer(request)
+        if not isinstance(requete, tuple):
+            return requete if requete is not None else self.get_response(request)
+        cle, empreinte = requete
+        reponse = self._reserver(cle, empreinte)
+        if reponse is not None:
+            return reponse
+        try:
+            reponse = self.get_response(request)
+        except BaseException:
+            store.delete(cle)
+            raise
+        self._conserver(cle, empreinte, reponse)
+        return reponse
+
+    async def __acall__(self, request):
+        # Requêtes sans clé (toutes les lectures) : aucun thread
+        if request.method not in METHODES or 'Idempotency-Key' not in request.headers:
+            return await self.get_response(request)
+        requete = await sync_to_async(self._preparer)(request)
+        if not isinstance(requete, tuple):
+            return requete if requete is not None else await self.get_response(request)
+        cle, empreinte = requete
+        reponse = await sync_to_async(self._reserver, thread_sensitive=False)(cle, empreinte)
+        if reponse is not None:
+            return reponse
+        try:
+            reponse = await self.get_response(request)
+        except BaseException:
+            await store.adelete(cle)
+            raise
+        await sync_to_async(self._conserver, thread_sensitive=False)(cle, empreinte, reponse)
+        return reponse
+
+    def _preparer(self, request):
+        """(clé de stockage, empreinte) ; None sans idempotence ; réponse d'erreur si la clé est invalide."""
+        if request.method not in METHODES:
+            return None
+        cle = request.headers.get('Idempotency-Key')
+        if cle is None:
+            return None
+        if not cle or len(cle) > CLE_LONGUEUR_MAX:
+            return _erreur(f"Idempotency-Key doit faire de 1 à {CLE_LONGUEUR_MAX} caractères.", 400)
+        utilisateur = _utilisateur(request)
+        if utilisateur is None:
+            return None  # Requête anonyme : refusée par la vue, rien à conserver
+        condensat = hashlib.sha256(cle.encode()).hexdigest()
+        return f'idempotence:{utilisateur}:{condensat}', _empreinte(request)
+
+    def _reserver(self, cle, empreinte):
+        """None si la requête doit être exécutée (clé réservée), sinon la réponse à renvoyer."""
+        limite = time.monotonic() + ATTENTE_MAX
+        while True:
+            if store.add(cle, {'empreinte': empreinte}, DUREE_VERROU):
+                return None
+            entree = store.get(cle)
+            if entree is not None:
+                if entree['empreinte'] != empreinte:
+                    return _erreur("Idempotency-Key déjà utilisée pour une autre requête.", 422)
+                if 'statut' in entree:
+                    return self._rejouer(entree)
+            # Première requête en cours (ou réservation tout juste libérée) : on attend son résultat
+            if time.monotonic() >= limite:
+                return _erreur("Une requête avec cette Idempotency-Key est toujours en cours.", 409)
+            time.sleep(INTERVALLE_ATTENTE)
+
+    @staticmethod
+    def _conserver(cle, empreinte, reponse):
+        if reponse.status_code >= 500 or reponse.status_code in STATUTS_TRANSITOIRES or reponse.streaming:
+            store.delete(cle)
+            return
+        store.set(cle, {
+            'empreinte': empreinte,
+            'statut': reponse.status_code,
+            'entetes': {nom: reponse[nom] for nom in ENTETES_REJOUES if reponse.has_header(nom)},
+            'corps': reponse.content,
+        }, DUREE_CONSERVATION)
+
+    @staticmethod
+    def _rejouer(entree):
+        reponse = HttpResponse(entree['corps'], status=entree['statut'])
+        for nom, valeur in entree['entetes'].items():
+            reponse[nom] = valeur
+        reponse['Idempotent-Replayed'] = 'true'
+        return reponse
@@ -0,0 +1,151 @@
+# transit/pagination.py
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.encoding import force_str
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Pagination par curseur opaque (keyset) sur (champ indexé, pk).
+
+    Contrairement à CursorPagination de DRF, la position encode à la fois la
+    valeur du champ de tri ET la clé primaire : il n'y a jamais d'OFFSET, même
+    quand plusieurs lignes partagent la même date. Aucun COUNT(*) n'est émis.
+
+    Le champ de tri est lu sur l'attribut `ordering` de la vue (ex: '-date_arrivee'),
+    qui doit être couvert par un index composite (champ, id).
+    """
+    ordering = '-pk'
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    invalid_cursor_message = 'Curseur invalide.'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'ordering', None) or self.ordering
+        if isinstance(ordering, (list, tuple)):
+            ordering = ordering[0]
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._preparer(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._decouper(list(queryset[:self.page_size + 1]))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Variante asynchrone (ORM asynchrone) pour les vues ASGI ; `request` est une Request DRF."""
+        queryset = self._preparer(queryset, request, view)
+        if queryset is None:
+            return None
+        return self._decouper([ligne async for ligne in queryset[:self.page_size + 1]])
+
+    def _preparer(self, queryset, request, view):
+        """Trie et filtre le queryset à partir du curseur ; None si la pagination est désactivée."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        ordering = self.get_ordering(request, queryset, view)
+        self.field = ordering.lstrip('-')
+        self.descending = ordering.startswith('-')
+        self.model = queryset.model
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor['r'])
+
+        # Sens effectif du parcours (inversé pour remonter vers la page précédente)
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        keys = [self.field, 'pk'] if self.field != 'pk' else ['pk']
+        queryset = queryset.order_by(*[prefix + key for key in keys])
+
+        if self.cursor is not None:
+            lookup = 'lt' if descending else 'gt'
+            value, pk = self.cursor['v'], self.cursor['p']
+            condition = Q(**{f'pk__{lookup}': pk})
+            if self.field != 'pk':
+                condition = Q(**{f'{self.field}__{lookup}': value}) | (Q(**{self.field: value}) & condition)
+            queryset = queryset.filter(condition)
+        self._reverse = reverse
+        return queryset
+
+    def _decouper(self, results):
+        """Page à partir des page_size + 1 premières lignes (la dernière signale une suite)."""
+        reverse = self._reverse
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        if self.has_next or self.has_previous:
+            self.display_page_controls = True
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    # --- Encodage du curseur ---
+
+    def _position(self, row):
+        """Retourne (valeur du champ de tri, pk) d'une ligne (instance ou dict)."""
+        if isinstance(row, dict):
+            pk = row['pk'] if 'pk' in row else row[self.model._meta.pk.attname]
+            value = row[self.field] if self.field != 'pk' else pk
+        else:
+            pk = row.pk
+            value = getattr(row, self.field) if self.field != 'pk' else pk
+        return value, pk
+
+    def encode_cursor(self, row, reverse):
+        value, pk = self._position(row)
+        field = self.model._meta.pk if self.field == 'pk' else self.model._meta.get_field(self.field)
+        payload = {
+            'v': field.value_to_string(_ValueHolder(field.attname, value)),
+            'p': force_str(pk),
+            'r': 1 if reverse else 0,
+        }
+        encoded = base64.urlsafe_b64encode(json.dumps(payload, separators=(',', ':')).encode()).decode()
+        return replace_query_param(remove_query_param(self.base_url, self.cursor_query_param),
+                                   self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()).decode())
+            pk_field = self.model._meta.pk
+            field = pk_field if self.field == 'pk' else self.model._meta.get_field(self.field)
+            return {
+                'v': field.to_python(payload['v']),
+                'p': pk_field.to_python(payload['p']),
+                'r': bool(payload.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, AttributeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class _ValueHolder:
+    """Objet minimal permettant d'utiliser Field.value_to_string sur une valeur brute."""
+
+    def __init__(self, attname, value):
+        setattr(self, attname, value)
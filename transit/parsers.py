@@ -0,0 +1,62 @@
+# transit/parsers.py
+
+import io
+import json
+
+from django.conf import settings
+from rest_framework import parsers
+
+from .renderers import ORJSONRenderer, orjson
+
+
+class ORJSONParser(parsers.JSONParser):
+    """
+    Parser JSON basé sur orjson (corps UTF-8). Les corps qu'orjson refuse
+    (autre encodage, entiers hors 64 bits, JSON invalide) sont relus par le
+    JSONParser de DRF : mêmes données et mêmes messages d'erreur qu'avant.
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        corps = stream.read()
+        try:
+            return orjson.loads(corps)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(corps), media_type, parser_context)
+
+
+def lire_ndjson(lignes):
+    """
+    Lit un flux NDJSON (un objet JSON par ligne, en octets ou en texte) à la
+    demande, en mémoire constante. Produit (numéro de ligne, objet, erreur) ;
+    `objet` est None si la ligne est illisible. Les lignes vides sont ignorées.
+    """
+    charger = orjson.loads if orjson is not None else json.loads
+    for numero, brut in enumerate(lignes, start=1):
+        if not brut.strip():
+            continue
+        try:
+            objet = charger(brut)
+        except ValueError:  # orjson.JSONDecodeError et UnicodeDecodeError en héritent
+            yield numero, None, "JSON invalide."
+            continue
+        if isinstance(objet, dict):
+            yield numero, objet, None
+        else:
+            yield numero, None, "Chaque ligne doit être un objet JSON."
+
+
+class NDJSONParser(parsers.BaseParser):
+    """
+    application/x-ndjson : `request.data` est un itérateur (voir lire_ndjson)
+    consommé au fil de la lecture du corps, pour les lots d'événements.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return lire_ndjson(stream)
@@ -0,0 +1,141 @@
+# transit/renderers.py
+
+import math
+from decimal import Decimal
+
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:  # Dépendance optionnelle : repli sur le renderer DRF (json de la stdlib)
+    orjson = None
+
+_encodeur = encoders.JSONEncoder()
+
+
+def _defaut(obj):
+    """Types non natifs pour orjson, convertis comme le JSONEncoder de DRF."""
+    if isinstance(obj, Decimal):
+        valeur = float(obj)
+        if not math.isfinite(valeur) or 'e' in repr(valeur):
+            # NaN (refusé par DRF en JSON strict) ou exposant écrit autrement
+            # par orjson (1e16 / 1e+16) : rendu DRF
+            raise TypeError(obj)
+        return valeur
+    return _encodeur.default(obj)
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    Renderer JSON basé sur orjson, octet pour octet identique à JSONRenderer
+    (compact, UTF-8 non échappé, \\u2028 / \\u2029 échappés).
+
+    UUID et datetime sont encodés nativement (UTC en 'Z' comme DRF) ; les
+    autres types (Decimal -> float, timedelta, chaînes paresseuses, QuerySet...)
+    passent par le JSONEncoder de DRF. Le rendu indenté (?indent=, API
+    navigable), les entiers hors 64 bits, les Decimal en notation exponentielle
+    et l'absence d'orjson sont délégués au renderer DRF.
+
+    Note : les float Python natifs en notation exponentielle (>= 1e16) sont
+    écrits '1e16' au lieu de '1e+16' ; l'API n'expose que des Decimal.
+    """
+    options = 0 if orjson is None else orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or not self.compact or self.ensure_ascii:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_defaut, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Comme DRF : JSON strictement compatible JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+def _encoder_dictionnaire(valeurs, maximum):
+    """Retourne (dictionnaire, indices) si la colonne est textuelle et peu variée, sinon None."""
+    dictionnaire, indices = {}, []
+    for valeur in valeurs:
+        if valeur is not None and not isinstance(valeur, str):
+            return None
+        index = dictionnaire.get(valeur)
+        if index is None:
+            if len(dictionnaire) >= maximum:
+                return None
+            index = dictionnaire[valeur] = len(dictionnaire)
+        indices.append(index)
+    return list(dictionnaire), indices
+
+
+def en_colonnes(objets, dictionnaires=True, cardinalite_max=255):
+    """
+    Représentation colonnaire d'une liste de dicts :
+
+        {"colonnes": ["id", "statut_actuel"],
+         "lignes": [["a1", 0], ["b2", 1], ["c3", 0]],
+         "dictionnaires": {"statut_actuel": ["EN_TRANSIT", "DEDOUANEMENT"]},
+         "absents": {}}
+
+    Les colonnes textuelles peu variées (au plus la moitié des lignes et
+    `cardinalite_max` valeurs distinctes) sont remplacées par l'indice de leur
+    valeur dans `dictionnaires`. `absents` liste, par colonne, les lignes où la
+    clé n'existe pas (différent d'une valeur null). Les valeurs imbriquées
+    (ex: historique_statuts) sont conservées telles quelles.
+    """
+    colonnes = {}
+    for objet in objets:
+        for cle in objet:
+            colonnes.setdefault(cle, len(colonnes))
+    noms = list(colonnes)
+
+    absents = {}
+    lignes = []
+    for i, objet in enumerate(objets):
+        if len(objet) != len(noms):
+            for nom in noms:
+                if nom not in objet:
+                    absents.setdefault(nom, []).append(i)
+        lignes.append([objet.get(nom) for nom in noms])
+
+    encodes = {}
+    maximum = min(cardinalite_max, len(lignes) // 2)
+    if dictionnaires and maximum:
+        for j, nom in enumerate(noms):
+            resultat = _encoder_dictionnaire((ligne[j] for ligne in lignes), maximum)
+            if resultat is None:
+                continue
+            encodes[nom], indices = resultat
+            for ligne, index in zip(lignes, indices):
+                ligne[j] = index
+    return {'colonnes': noms, 'lignes': lignes, 'dictionnaires': encodes, 'absents': absents}
+
+
+class ColumnarRenderer(ORJSONRenderer):
+    """
+    Format colonnaire opt-in des listes (`?format=columnar` ou
+    `Accept: application/vnd.transit.columnar+json`) : les noms de champs ne
+    sont écrits qu'une fois, voir en_colonnes(). La page paginée conserve ses
+    liens (next / previous) et seuls ses `results` sont transformés ; les
+    autres réponses (détail, erreurs) sont rendues en JSON ordinaire.
+    `?dictionnaire=0` désactive l'encodage par dictionnaire.
+    """
+    media_type = 'application/vnd.transit.columnar+json'
+    format = 'columnar'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        request = (renderer_context or {}).get('request')
+        dictionnaires = request is None or request.query_params.get('dictionnaire') != '0'
+        if isinstance(data, list) and all(isinstance(objet, dict) for objet in data):
+            data = en_colonnes(data, dictionnaires)
+        elif isinstance(data, dict) and isinstance(data.get('results'), list):
+            if all(isinstance(objet, dict) for objet in data['results']):
+                data = {**data, 'results': en_colonnes(data['results'], dictionnaires)}
+        return super().render(data, accepted_media_type, renderer_context)
@@ -98,9 +98,14 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # Sous ASGI : vues de lecture asynchrones (transit/urls_asgi.py)
+    "transit.asynchrone.AsgiUrlconfMiddleware",
+    # Rejeu des écritures répétées avec le même en-tête Idempotency-Key
+    "transit.idempotence.IdempotenceMiddleware",
 ]
 
 ROOT_URLCONF = "transit.urls"
+ASGI_ROOT_URLCONF = "transit.urls_asgi"
 
 TEMPLATES = [
     {
@@ -216,6 +221,25 @@ REST_FRAMEWORK = {
         # Sécurité par défaut: refus total, à lever au cas par cas
         'rest_framework.permissions.IsAuthenticated',
     ),
+    # Pagination par curseur (keyset) sur toutes les listes : pas de COUNT(*),
+    # coût constant quelle que soit la profondeur de la page.
+    # Le client peut choisir ?page_size= (plafonné par KeysetPagination.max_page_size).
+    'DEFAULT_PAGINATION_CLASS': 'transit.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+    # JSON via orjson (même sortie que le JSONRenderer de DRF, encodage plus rapide).
+    # Remplacer par 'rest_framework.renderers.JSONRenderer' / 'rest_framework.parsers.JSONParser'
+    # pour revenir au module json de la stdlib.
+    'DEFAULT_RENDERER_CLASSES': (
+        'transit.renderers.ORJSONRenderer',
+        # Listes en colonnes, sur demande : ?format=columnar ou Accept: application/vnd.transit.columnar+json
+        'transit.renderers.ColumnarRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'transit.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
 }
 
 
@@ -269,6 +293,7 @@ CORS_ALLOW_HEADERS = [
     "authorization",
     "content-type",
     "dnt",
+    "idempotency-key",
     "origin",
     "user-agent",
     "x-csrftoken",
@@ -286,6 +311,49 @@ CSRF_TRUSTED_ORIGINS = [
 
 
 
+# -----------------------------------------------------------------
+# CACHE
+# -----------------------------------------------------------------
+# 'default' : Redis partagé entre les workers (payload de suivi des colis, verrous).
+# 'local'   : cache mémoire du processus, utilisé automatiquement si Redis est
+#             injoignable (voir transit/cache.py).
+# 'idempotence' : table en base (créée par migrate), repli partagé par les
+#             workers des réponses conservées pour Idempotency-Key (transit/idempotence.py).
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL', 'redis://localhost:6379/1')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_CACHE_URL,
+        'KEY_PREFIX': 'transit',
+        'OPTIONS': {
+            'socket_connect_timeout': 0.5,
+            'socket_timeout': 0.5,
+        },
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'transit-local',
+    },
+    'idempotence': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'transit_idempotence',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+
+# -----------------------------------------------------------------
+# ÉVÉNEMENTS TEMPS RÉEL (flux SSE, voir transit/events.py et transit/asgi.py)
+# -----------------------------------------------------------------
+# Redis pub/sub diffuse les changements de colis à tous les workers ASGI ;
+# 'transit.events.BusMemoire' suffit pour un seul processus (tests, développement).
+EVENEMENTS_TEMPS_REEL = {
+    'BACKEND': 'transit.events.BusRedis',
+    'OPTIONS': {'url': os.environ.get('REDIS_EVENEMENTS_URL', 'redis://localhost:6379/2')},
+}
+
+
 # pppi_core/settings.py (Ajouts Celery)
 
 # 1. Broker (Courtier) - URL de connexion à Redis ou RabbitMQ
@@ -0,0 +1,185 @@
+# transit/sparse.py
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import BaseSerializer
+
+
+def _liste_parametre(valeur):
+    return [nom.strip() for nom in valeur.split(',') if nom.strip()]
+
+
+class SparseFieldsetMixin:
+    """
+    Sérialiseur acceptant :
+    - `fields` : sous-ensemble des champs à produire ;
+    - `expand` : champs listés dans `Meta.expandable_fields` à remplacer par
+      leur représentation imbriquée, ex: {'client': (ClientMinimalSerializer, {})}.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        expand = kwargs.pop('expand', None)
+        super().__init__(*args, **kwargs)
+
+        expandable = getattr(self.Meta, 'expandable_fields', {})
+        self.champs_deplies = []
+        for name in expand or ():
+            if name in expandable:
+                serializer_class, options = expandable[name]
+                self.fields[name] = serializer_class(read_only=True, **options)
+                self.champs_deplies.append(name)
+
+        if fields is not None:
+            # Supprime les champs non demandés
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+
+class SparseFieldsetViewMixin:
+    """
+    Gère `?fields=a,b` et `?expand=c` sur les lectures d'un ViewSet dont le
+    sérialiseur hérite de SparseFieldsetMixin.
+
+    Les colonnes demandées sont poussées dans la requête (`.only()`) et seuls
+    les select_related / prefetch_related utiles aux champs demandés sont
+    appliqués. Les champs qui ne correspondent pas directement à une colonne
+    du modèle doivent être décrits dans `field_plans` (ou `expand_plans` pour
+    les champs dépliés) ; sinon la requête complète du ViewSet est conservée.
+
+        field_plans = {
+            'client_name': {'only': ('client__nom', 'client__prenoms'), 'select_related': ('client',)},
+            'historique_statuts': {'prefetch_related': (Prefetch(...),)},
+        }
+    """
+    field_plans = {}
+    expand_plans = {}
+
+    def _fieldset(self):
+        params = self.request.query_params
+        fields = _liste_parametre(params['fields']) if params.get('fields') else None
+        expand = _liste_parametre(params.get('expand', ''))
+        return fields, expand
+
+    def _sparse_actif(self):
+        request = getattr(self, 'request', None)
+        return (
+            request is not None
+            and request.method in SAFE_METHODS
+            and issubclass(self.get_serializer_class(), SparseFieldsetMixin)
+        )
+
+    def get_serializer(self, *args, **kwargs):
+        if self._sparse_actif():
+            fields, expand = self._fieldset()
+            if fields is not None:
+                kwargs.setdefault('fields', fields)
+            if expand:
+                kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self._sparse_actif():
+            return queryset
+        fields, expand = self._fieldset()
+        if fields is None and not expand:
+            return queryset
+
+        serializer = self.get_serializer_class()(fields=fields, expand=expand)
+        plan = self._plan_chargement(queryset.model, serializer.fields, expand)
+        if plan is None:
+            return queryset
+
+        only, select_related, prefetch_related = plan
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset.only(*only)
+
+    def _plan_chargement(self, model, champs, expand):
+        """Retourne (only, select_related, prefetch_related) ou None si un champ n'est pas résolu."""
+        opts = model._meta
+        only = {opts.pk.name}
+        ordering = getattr(self, 'ordering', None)
+        if isinstance(ordering, (list, tuple)):
+            ordering = ordering[0]
+        if ordering and ordering.lstrip('-') != 'pk':
+            only.add(ordering.lstrip('-'))
+        select_related, prefetch_related = [], []
+
+        for name, field in champs.items():
+            plan = self.expand_plans.get(name) if name in expand else None
+            plan = plan or self.field_plans.get(name)
+            if plan is None:
+                if field.source == '*':
+                    return None
+                attribut, _, reste = field.source.partition('.')
+                try:
+                    model_field = opts.get_field(attribut)
+                except FieldDoesNotExist:
+                    return None
+                if not model_field.concrete or isinstance(field, BaseSerializer):
+                    return None
+                plan = {'only': (attribut,)}
+                if reste:
+                    # Attribut d'une relation lu par le sérialiseur (ex: 'colis.id') : jointure
+                    if not model_field.is_relation:
+                        return None
+                    plan['select_related'] = (attribut,)
+            only.update(plan.get('only', ()))
+            select_related.extend(plan.get('select_related', ()))
+            prefetch_related.extend(plan.get('prefetch_related', ()))
+
+        # Versions du cache de fragments (transit.fragments) : jamais différées. Inutile de les
+        # nommer si leur relation est déjà jointe en entier (les restreindre la tronquerait)
+        for chemin in getattr(self.get_serializer_class().Meta, 'fragment_version_fields', ()):
+            relation = chemin.rpartition('__')[0]
+            if relation and _jointe_en_entier(relation, only, select_related):
+                continue
+            only.add(chemin)
+            if relation:
+                select_related.append(relation)
+
+        select_related = list(dict.fromkeys(select_related))
+        only.update(_chemins_joints(only, select_related))
+        return sorted(only), select_related, prefetch_related
+
+
+def _descendants(chemin, only):
+    prefixe = chemin + '__'
+    return any(nom.startswith(prefixe) for nom in only)
+
+
+def _jointe_en_entier(relation, only, select_related):
+    return (
+        any(chemin == relation or chemin.startswith(relation + '__') for chemin in select_related)
+        and not any(_descendants(prefixe, only) for prefixe in _prefixes(relation))
+    )
+
+
+def _prefixes(chemin):
+    parties = chemin.split('__')
+    return ['__'.join(parties[:n]) for n in range(1, len(parties) + 1)]
+
+
+def _chemins_joints(only, select_related):
+    """
+    Entrées à ajouter à `.only()` pour que les relations jointes soient lues
+    (pas différées). Une relation dont aucune colonne n'est nommée est lue en
+    entier : seul son premier niveau sans colonne nommée est ajouté ('colis'
+    pour 'colis__client'), car nommer 'colis__client' restreindrait le colis à
+    sa clé client (les sérialiseurs imbriqués relanceraient une requête par
+    ligne).
+    """
+    chemins = set()
+    for chemin in select_related:
+        prefixes = _prefixes(chemin)
+        niveau = 0
+        for n, prefixe in enumerate(prefixes[:-1], start=1):
+            if _descendants(prefixe, only):
+                niveau = n
+        chemins.add(prefixes[niveau])
+    return chemins
@@ -0,0 +1,136 @@
+# transit/sse.py
+
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from .asynchrone import JWTAuthentificationAsynchrone
+from .events import get_bus
+
+
+class RequeteFluxInvalide(ValueError):
+    """Paramètres d'abonnement refusés ; `statut` est le code HTTP renvoyé."""
+
+    def __init__(self, message, statut=400):
+        super().__init__(message)
+        self.statut = statut
+
+
+class FluxSSE:
+    """
+    Application ASGI de flux Server-Sent Events sur le bus d'événements
+    (transit.events). Le client s'authentifie par son JWT d'accès (en-tête
+    Authorization ou `?jeton=`, EventSource ne pouvant pas envoyer d'en-tête)
+    puis reçoit chaque message publié sur ses canaux :
+
+        id: 3
+        event: suivi
+        data: {"colis": "...", "statut_actuel": "EN_TRANSIT", ...}
+
+    Une connexion inactive ne coûte qu'une coroutine et une file : aucun
+    thread ni connexion à la base n'est réservé à un abonné. Un
+    commentaire `: ping` est envoyé toutes les `intervalle_ping` secondes
+    pour garder la connexion ouverte à travers les proxies.
+
+    Les sous-classes implémentent `canaux(utilisateur, parametres)`.
+    """
+    intervalle_ping = 15
+    # Délai de reconnexion suggéré au navigateur (ms)
+    reconnexion_ms = 5000
+
+    async def canaux(self, utilisateur, parametres):
+        raise NotImplementedError
+
+    async def __call__(self, scope, receive, send):
+        parametres = parse_qs(scope.get('query_string', b'').decode())
+        utilisateur = await self._authentifier(scope, parametres)
+        if utilisateur is None:
+            return await self._repondre(send, 401, "Jeton d'accès absent ou invalide.")
+        try:
+            canaux = await self.canaux(utilisateur, parametres)
+        except RequeteFluxInvalide as e:
+            return await self._repondre(send, e.statut, str(e))
+
+        bus = get_bus()
+        abonnement = bus.abonner(canaux)
+        deconnexion = asyncio.ensure_future(self._attendre_deconnexion(receive))
+        attente = None
+        try:
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream; charset=utf-8'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),  # Pas de mise en tampon par nginx
+            ]})
+            await self._envoyer(send, f'retry: {self.reconnexion_ms}\n\n')
+            numero = 0
+            while True:
+                attente = attente or asyncio.ensure_future(abonnement.file.get())
+                faits, _ = await asyncio.wait(
+                    {attente, deconnexion}, timeout=self.intervalle_ping, return_when=asyncio.FIRST_COMPLETED
+                )
+                if deconnexion in faits:
+                    break
+                if attente in faits:
+                    _, message = attente.result()
+                    attente = None
+                    numero += 1
+                    await self._envoyer(send, self.trame(numero, message))
+                else:
+                    await self._envoyer(send, ': ping\n\n')
+        except OSError:
+            pass  # Client parti pendant un envoi
+        finally:
+            bus.desabonner(abonnement)
+            deconnexion.cancel()
+            if attente is not None:
+                attente.cancel()
+
+    @staticmethod
+    def trame(numero, message):
+        evenement = message.get('evenement', 'message')
+        return f"id: {numero}\nevent: {evenement}\ndata: {json.dumps(message, separators=(',', ':'))}\n\n"
+
+    @staticmethod
+    async def _envoyer(send, texte):
+        await send({'type': 'http.response.body', 'body': texte.encode(), 'more_body': True})
+
+    @staticmethod
+    async def _attendre_deconnexion(receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    @staticmethod
+    async def _repondre(send, statut, detail):
+        await send({'type': 'http.response.start', 'status': statut,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': json.dumps({'detail': detail}).encode()})
+
+    async def _authentifier(self, scope, parametres):
+        entetes = dict(scope.get('headers', ()))
+        brut = None
+        autorisation = entetes.get(b'authorization', b'').split()
+        if len(autorisation) == 2 and autorisation[0].lower() == b'bearer':
+            brut = autorisation[1].decode()
+        elif parametres.get('jeton'):
+            brut = parametres['jeton'][0]
+        if not brut:
+            return None
+        authentification = JWTAuthentificationAsynchrone()
+        try:
+            return await authentification.aget_user(authentification.get_validated_token(brut))
+        except (InvalidToken, TokenError, AuthenticationFailed):
+            return None
+
+
+def routeur(application, flux):
+    """Application ASGI qui sert les chemins de `flux` ({chemin: FluxSSE}) et délègue le reste à Django."""
+
+    async def router(scope, receive, send):
+        if scope['type'] == 'http' and scope['path'] in flux:
+            return await flux[scope['path']](scope, receive, send)
+        return await application(scope, receive, send)
+
+    return router
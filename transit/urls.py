@@ -28,6 +28,8 @@ from rest_framework_simplejwt.authentication import JWTAuthentication # Importez
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from transit.batch import BatchView
+
 # Configuration du schéma Swagger
 schema_view = get_schema_view(
    openapi.Info(
@@ -46,6 +48,8 @@ urlpatterns = [
     path("admin/", admin.site.urls),
     
     # Chemins de l'API
+    # Plusieurs appels de l'API en un seul aller-retour (voir transit.batch)
+    path('api/v1/batch/', BatchView.as_view(), name='batch'),
     path('api/v1/', include('users.urls')),
     path('api/v1/', include('logistics.urls')),
     path('api/v1/', include('payments.urls')),
@@ -0,0 +1,10 @@
+# transit/urls_asgi.py
+
+from django.urls import include, path
+
+# Urlconf des requêtes ASGI (voir transit.asynchrone.AsgiUrlconfMiddleware) :
+# les vues de lecture asynchrones d'abord, puis toute l'urlconf principale.
+urlpatterns = [
+    path('api/v1/', include('logistics.urls_asgi')),
+    path('', include('transit.urls')),
+]
@@ -6,6 +6,7 @@ from django.contrib.auth import authenticate
 from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from django.core.mail import send_mail # Importez send_mail pour le mail de bienvenue
 from rest_framework import serializers, status
+from transit.sparse import SparseFieldsetMixin
 
 # --- Serializers de Sécurité et d'Authentification ---
 
@@ -86,7 +87,7 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 # --- Serializers de Gestion Utilisateur / Rôles ---
 
-class UtilisateurSerializer(serializers.ModelSerializer):
+class UtilisateurSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Sérielizeur complet pour la gestion des utilisateurs (CRUD par Admin)."""
     role_name = serializers.CharField(source='role.nom_role', read_only=True)
     
@@ -134,13 +135,13 @@ class RefreshTokenSerializer(serializers.Serializer):
         
 
 
-class RoleSerializer(serializers.ModelSerializer):
+class RoleSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Sérielizeur pour les Rôles."""
     class Meta:
         model = Role
         fields = '__all__'
         
-class PermissionSerializer(serializers.ModelSerializer):
+class PermissionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Sérielizeur pour les Permissions."""
     class Meta:
         model = Permission
@@ -18,6 +18,8 @@ from django.utils.decorators import method_decorator # Ajoutez cet import !
 
 from rest_framework.permissions import IsAuthenticated
 from .permissions import HasPermission
+from transit.atomic import AtomicWritesMixin
+from transit.sparse import SparseFieldsetViewMixin
 
 # --- IMPORTATION MANQUANTE ---
 from django.contrib.auth import authenticate
@@ -157,9 +159,11 @@ class AuthViewSet(viewsets.GenericViewSet):
 
 # --- 2. Gestion des Utilisateurs / Rôles (Admin CRUD) ---
 
-class UtilisateurViewSet(viewsets.ModelViewSet):
+class UtilisateurViewSet(AtomicWritesMixin, SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """CRUD complet pour les utilisateurs (nécessite la permission Admin)."""
-    queryset = Utilisateur.objects.all().order_by('nom')
+    # role_name en jointure
+    queryset = Utilisateur.objects.select_related('role').order_by('nom')
+    ordering = 'nom'
     serializer_class = UtilisateurSerializer
     permission_classes = [IsAuthenticated] # Exemple RBAC
     
@@ -209,14 +213,17 @@ class UtilisateurViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(clients, many=True)
         return Response(serializer.data)
 
-class RoleViewSet(viewsets.ModelViewSet):
+class RoleViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     """CRUD pour les rôles."""
-    queryset = Role.objects.all()
+    queryset = Role.objects.prefetch_related('permissions')
+    ordering = 'nom_role'
+    field_plans = {'permissions': {'prefetch_related': ('permissions',)}}
     serializer_class = RoleSerializer
     permission_classes = [IsAuthenticated]
     
-class PermissionViewSet(viewsets.ReadOnlyModelViewSet):
+class PermissionViewSet(SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     """Lecture seule des permissions disponibles."""
     queryset = Permission.objects.all()
+    ordering = 'code_permission'
     serializer_class = PermissionSerializer
     permission_classes = [IsAuthenticated]
\ No newline at end of file